@@ -1,14 +1,33 @@
+import asyncio
+import json
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.core.database import get_db
-from app.models.schemas import GenerateRequest, GenerateResponse, ChatRequest, ChatResponse, FileObject
+from sqlalchemy import select, update
+from app.core.config import settings
+from app.core.database import get_db, session_scope
+from app.core.telemetry import span
+from app.core.prompts import SYSTEM_PROMPT, EDIT_SYSTEM_PROMPT, REWRITE_SYSTEM_PROMPT
+from app.models.schemas import GenerateRequest, GenerateResponse, ChatRequest, ChatResponse, FileObject, PortfolioStatusResponse
 from app.models.models import Portfolio, WebPage
 from app.services.llm_service import llm_service
+from app.services.llm_router import llm_router
 from app.services.vector_service import vector_service
 from app.services.snippet_service import snippet_service
+from app.services.snippet_index import snippet_index
+from app.services.embedding_cache import embedding_cache
+from app.services.stream_parser import JSONArrayStreamParser
+from app.services.generation_service import generation_service
+from app.services.job_queue import job_queue
+from app.services.page_service import page_service
+from app.services.page_embedder import page_embedder
+from app.services.context_builder import context_builder
+from app.services.patch_service import patch_service
+from app.services.response_cache import response_cache
+from app.services.embedding_registry import embedding_registry
+from app.services.embedding_migration import embedding_migrator
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
 
 router = APIRouter()
 
@@ -16,7 +35,13 @@ router = APIRouter()
 class SnippetSearchRequest(BaseModel):
     query: str
     category: Optional[str] = None
+    subcategory: Optional[str] = None
+    framework: Optional[str] = None
+    tags: List[str] = []
     limit: int = 5
+    ef_search: Optional[int] = None  # HNSW recall/latency knob
+    probes: Optional[int] = None  # IVFFlat recall/latency knob
+    mode: Optional[Literal["hybrid", "vector", "lexical"]] = None  # default SNIPPET_SEARCH_MODE
 
 class SnippetResponse(BaseModel):
     id: int
@@ -30,7 +55,8 @@ class SnippetResponse(BaseModel):
 @router.post("/generate", response_model=GenerateResponse)
 async def generate_portfolio(request: GenerateRequest, db: AsyncSession = Depends(get_db)):
     """
-    Generate a new portfolio based on GitHub data and prompt.
+    Queue a new portfolio generation based on GitHub data and prompt.
+    Returns immediately; poll /portfolios/{portfolio_id}/status for progress.
     """
     # 1. Create Portfolio Entry
     portfolio = Portfolio(
@@ -38,105 +64,248 @@ async def generate_portfolio(request: GenerateRequest, db: AsyncSession = Depend
         github_username=request.github_username,
         template_id=request.template_id,
         custom_prompt=request.custom_prompt,
-        status='generating'
+        status='queued'
     )
     db.add(portfolio)
     await db.flush() # Get ID
     
-    # 2. Search for relevant code snippets
-    snippet_query = f"{request.template_id} portfolio {request.custom_prompt or ''}"
-    relevant_snippets = await snippet_service.search_snippets(db, snippet_query, limit=3)
-    
-    # 3. Build context from snippets
-    snippet_context = "\n\n".join([
-        f"Example {i+1} ({s.name}):\n{s.code}" 
-        for i, s in enumerate(relevant_snippets)
-    ])
-    
-    # 4. Generate Code with snippet context
-    prompt = f"Generate a portfolio for {request.github_username}. "
-    if request.custom_prompt:
-        prompt += f"User request: {request.custom_prompt}"
-        
-    generated_files = await llm_service.generate_code(prompt, context=snippet_context)
-    
-    file_objects = []
-    
-    # 5. Save Files to DB
-    for file_data in generated_files:
-        filename = file_data.get("filename")
-        content = file_data.get("content")
-        
-        if filename and content:
-            web_page = WebPage(
-                portfolio_id=portfolio.id,
-                file_path=filename,
-                content=content,
-                file_type=filename.split('.')[-1] if '.' in filename else None
-            )
-            db.add(web_page)
-            file_objects.append(FileObject(filename=filename, content=content))
-    
-    # Update portfolio status
-    portfolio.status = 'ready'
-    await db.commit()
+    # 2. Enqueue the generation job (runs on the background worker pool)
+    with span("generate.enqueue"):
+        job = await job_queue.enqueue(db, portfolio.id, portfolio.user_id, request.model_dump())
+        await db.commit()
     
     return GenerateResponse(
-        message="Portfolio generated successfully",
+        message="Portfolio generation queued",
         portfolio_id=portfolio.id,
         preview_url=f"/preview?id={portfolio.id}",
-        files=file_objects
+        status=portfolio.status,
+        job_id=job.id
     )
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_edit(request: ChatRequest, db: AsyncSession = Depends(get_db)):
+@router.get("/portfolios/{portfolio_id}/status", response_model=PortfolioStatusResponse)
+async def portfolio_status(portfolio_id: int, db: AsyncSession = Depends(get_db)):
     """
-    Chat with the AI to edit the portfolio.
+    Generation status and progress for a portfolio.
     """
-    # 1. Fetch Context (Existing Files)
-    stmt = select(WebPage).where(WebPage.portfolio_id == request.portfolio_id)
-    result = await db.execute(stmt)
-    existing_files = result.scalars().all()
-    
-    context_str = ""
-    for file in existing_files:
-        context_str += f"Filename: {file.file_path}\nContent:\n{file.content}\n\n"
+    portfolio = await db.get(Portfolio, portfolio_id)
+    if portfolio is None:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
     
-    # 2. Search for relevant snippets based on user message
-    relevant_snippets = await snippet_service.search_snippets(db, request.message, limit=2)
-    snippet_context = "\n\n".join([
-        f"Reference ({s.name}):\n{s.code}" 
-        for s in relevant_snippets
-    ])
+    job = await job_queue.get_latest_for_portfolio(db, portfolio_id)
+    result = await db.execute(
+        select(WebPage.file_path)
+        .where(WebPage.portfolio_id == portfolio_id, WebPage.is_active.is_(True))
+        .order_by(WebPage.file_path)
+    )
     
-    full_context = f"{context_str}\n\nRelevant Examples:\n{snippet_context}"
+    return PortfolioStatusResponse(
+        portfolio_id=portfolio_id,
+        status=portfolio.status,
+        stage=job.stage if job else None,
+        progress=job.progress if job else (100 if portfolio.status == 'ready' else 0),
+        attempts=job.attempts if job else 0,
+        error=job.error if job and portfolio.status == 'failed' else None,
+        files=list(result.scalars().all())
+    )
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_edit(request: ChatRequest):
+    """
+    Chat with the AI to edit the portfolio.
+    Each DB phase runs in its own short transaction; no connection is held
+    while the model is generating.
+    """
+    # 1-2. Fetch existing files and relevant snippets
+    with span("chat.context"):
+        embeddings = await context_builder.embed_chat_query(request.message)
+        async with session_scope() as db:
+            full_context = await _chat_context(db, request, embeddings)
         
-    # 3. Generate Changes
-    generated_files = await llm_service.generate_code(request.message, context=full_context)
+    # 3. Generate Changes (search/replace edits in patch mode, resolved against the active files)
+    if settings.CHAT_EDIT_MODE == "patch":
+        with span("chat.llm", mode="patch"):
+            items = await llm_service.generate_code(request.message, context=full_context, system_prompt=EDIT_SYSTEM_PROMPT)
+        with span("chat.patch", items=len(items)):
+            async with session_scope() as db:
+                current = await patch_service.current_contents(db, request.portfolio_id, patch_service.edited_paths(items))
+            generated_files = await patch_service.resolve(request.message, current, items)
+    else:
+        with span("chat.llm", mode="rewrite"):
+            generated_files = await llm_service.generate_code(request.message, context=full_context, system_prompt=REWRITE_SYSTEM_PROMPT)
     
-    file_objects = []
-    
-    # 4. Update DB
-    for file_data in generated_files:
-        filename = file_data.get("filename")
-        content = file_data.get("content")
-        
-        if filename and content:
-            web_page = WebPage(
-                portfolio_id=request.portfolio_id,
-                file_path=filename,
-                content=content
-            )
-            db.add(web_page)
-            file_objects.append(FileObject(filename=filename, content=content))
-            
-    await db.commit()
+    # 4. Update DB (new versions for changed files only)
+    with span("chat.save"):
+        async with session_scope() as db:
+            written = await page_service.save_files(db, request.portfolio_id, generated_files)
+            file_objects = [FileObject(filename=p.file_path, content=p.content) for p in written]
+    page_embedder.schedule(request.portfolio_id, [p.file_path for p in written])
     
     return ChatResponse(
         reply="Changes applied successfully",
         files=file_objects
     )
 
+@router.post("/generate/stream")
+async def generate_portfolio_stream(request: GenerateRequest):
+    """
+    Streaming variant of /generate. Returns NDJSON events:
+    `portfolio` (id, first), one `file` per generated file as soon as it is
+    complete, then `done` (or `error`). Files are saved as they arrive.
+    """
+    async def events():
+        # 1. Create Portfolio Entry (committed so the id is visible immediately)
+        async with session_scope() as db:
+            portfolio = Portfolio(
+                user_id=request.github_username,
+                github_username=request.github_username,
+                template_id=request.template_id,
+                custom_prompt=request.custom_prompt,
+                status='generating'
+            )
+            db.add(portfolio)
+            await db.flush()
+            portfolio_id = portfolio.id
+        yield _ndjson({
+            "type": "portfolio",
+            "portfolio_id": portfolio_id,
+            "preview_url": f"/preview?id={portfolio_id}"
+        })
+
+        count = 0
+        status = 'failed'
+        try:
+            # 2-3. A cached generation, else the snippet context
+            with span("generate.context"):
+                async with session_scope() as db:
+                    cached = await response_cache.lookup(
+                        db, request.template_id, request.custom_prompt, request.github_username
+                    )
+                    if not cached:
+                        prompt, snippet_context = await generation_service.build_inputs(
+                            db, request.github_username, request.template_id, request.custom_prompt
+                        )
+
+            # 4. Stream the completion (or replay a cached one), saving each file as it completes
+            saved: List[Dict[str, str]] = []
+            source = _iterate(cached) if cached else _stream_files(prompt, snippet_context)
+            async for file_data in source:
+                if not await _save_file(portfolio_id, file_data):
+                    continue  # duplicate of a file already emitted (or not a full file)
+                count += 1
+                saved.append(file_data)
+                yield _ndjson({"type": "file", "filename": file_data["filename"], "content": file_data["content"]})
+            status = 'ready' if count else 'failed'
+            if saved and not cached:
+                async with session_scope() as db:
+                    await response_cache.store(
+                        db, request.template_id, request.custom_prompt, request.github_username, saved
+                    )
+        except Exception as e:
+            print(f"Error streaming generation: {e}")
+            status = 'failed'
+            yield _ndjson({"type": "error", "message": "Generation failed"})
+        finally:
+            # Also runs when the client disconnects (GeneratorExit / CancelledError);
+            # shielded so a cancelled request still leaves no 'generating' row
+            await asyncio.shield(_set_status(portfolio_id, status))
+        yield _ndjson({"type": "done", "portfolio_id": portfolio_id, "status": status, "files": count})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@router.post("/chat/stream")
+async def chat_edit_stream(request: ChatRequest):
+    """
+    Streaming variant of /chat. Emits one NDJSON `file` event per changed
+    file as soon as it is complete, then `done` (or `error`).
+    """
+    async def events():
+        with span("chat.context"):
+            embeddings = await context_builder.embed_chat_query(request.message)
+            async with session_scope() as db:
+                full_context = await _chat_context(db, request, embeddings)
+
+        patch_mode = settings.CHAT_EDIT_MODE == "patch"
+        system_prompt = EDIT_SYSTEM_PROMPT if patch_mode else REWRITE_SYSTEM_PROMPT
+        count = 0
+        try:
+            # Apply each file's edits as soon as its object is complete;
+            # files whose edits fail are rewritten in one call at the end
+            failed: List[str] = []
+            async for item in _stream_files(request.message, full_context, system_prompt):
+                if patch_mode and item.get("edits"):
+                    async with session_scope() as db:
+                        current = await patch_service.current_contents(db, request.portfolio_id, [item["filename"]])
+                    result = patch_service.apply_items(current, [item])
+                    failed.extend(result.failed)
+                    files = result.files
+                else:
+                    files = [item]
+                for file_data in files:
+                    if not await _save_file(request.portfolio_id, file_data):
+                        continue  # unchanged
+                    count += 1
+                    yield _ndjson({"type": "file", **file_data})
+
+            if failed:
+                async with session_scope() as db:
+                    current = await patch_service.current_contents(db, request.portfolio_id, failed)
+                for file_data in await patch_service.rewrite_files(request.message, current, failed):
+                    if not await _save_file(request.portfolio_id, file_data):
+                        continue
+                    count += 1
+                    yield _ndjson({"type": "file", **file_data})
+        except Exception as e:
+            print(f"Error streaming chat edit: {e}")
+            yield _ndjson({"type": "error", "message": "Edit failed"})
+        yield _ndjson({"type": "done", "files": count})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+async def _set_status(portfolio_id: int, status: str):
+    async with session_scope() as db:
+        await db.execute(update(Portfolio).where(Portfolio.id == portfolio_id).values(status=status))
+
+async def _save_file(portfolio_id: int, file_data: Dict[str, Any]) -> bool:
+    """Save one streamed file in its own transaction. False if nothing changed."""
+    with span("stream.save_file"):
+        async with session_scope() as db:
+            written = await page_service.save_files(db, portfolio_id, [file_data])
+    if written:
+        page_embedder.schedule(portfolio_id, [file_data["filename"]])
+    return bool(written)
+
+async def _chat_context(db: AsyncSession, request: ChatRequest, embeddings: tuple) -> str:
+    """Token-budgeted existing files plus relevant snippets for a chat edit."""
+    return await context_builder.build_chat_context(
+        db, request.portfolio_id, request.message, request.context_files, embeddings=embeddings
+    )
+
+async def _stream_files(prompt: str, context: str, system_prompt: str = SYSTEM_PROMPT) -> AsyncIterator[Dict[str, Any]]:
+    """Yield each {filename, content} or {filename, edits} object as soon as it is complete."""
+    parser = JSONArrayStreamParser()
+    deltas = llm_service.stream_code(prompt, context=context, system_prompt=system_prompt)
+    try:
+        async for delta in deltas:
+            for file_data in parser.feed(delta):
+                filename = file_data.get("filename")
+                content = file_data.get("content")
+                edits = file_data.get("edits")
+                if filename and content:
+                    yield {"filename": filename, "content": content}
+                elif filename and isinstance(edits, list) and edits:
+                    yield {"filename": filename, "edits": edits}
+            if parser.done:
+                break
+    finally:
+        await deltas.aclose()
+
+async def _iterate(items: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    for item in items:
+        yield item
+
+def _ndjson(event: dict) -> str:
+    return json.dumps(event) + "\n"
+
 @router.post("/snippets/search", response_model=List[SnippetResponse])
 async def search_snippets(request: SnippetSearchRequest, db: AsyncSession = Depends(get_db)):
     """
@@ -146,7 +315,13 @@ async def search_snippets(request: SnippetSearchRequest, db: AsyncSession = Depe
         db, 
         request.query, 
         category=request.category,
-        limit=request.limit
+        subcategory=request.subcategory,
+        framework=request.framework,
+        tags=request.tags,
+        limit=request.limit,
+        ef_search=request.ef_search,
+        probes=request.probes,
+        mode=request.mode
     )
     
     return [
@@ -161,3 +336,34 @@ async def search_snippets(request: SnippetSearchRequest, db: AsyncSession = Depe
         )
         for s in snippets
     ]
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss/eviction counters for the embedding and response caches, and
+    the state of the in-process snippet index.
+    """
+    return {
+        **embedding_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "snippet_index": snippet_index.stats(),
+    }
+
+@router.get("/embeddings/status")
+async def embeddings_status():
+    """
+    Embedding model and vector column each collection is served from in
+    this process, and the registry rows (including migration progress).
+    """
+    return {
+        "active": embedding_registry.stats(),
+        "collections": await embedding_migrator.status(),
+    }
+
+@router.get("/llm/stats")
+async def llm_stats():
+    """
+    Per-provider circuit state, latency and error rate used for routing.
+    """
+    return llm_router.stats()
+
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "GitFolio AI Backend"
@@ -7,10 +7,156 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str
+    DB_ECHO: bool = False  # log every SQL statement (debugging only)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10  # extra connections allowed under burst
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0  # wait for a free connection before erroring
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True  # detect connections dropped by the server/proxy
+    DB_QUERY_CACHE_SIZE: int = 500  # SQLAlchemy compiled statement cache
+    DB_PREPARED_STATEMENTS: bool = True  # set False behind PgBouncer transaction pooling
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100  # asyncpg prepared statements per connection
     
     # AI
     OPENROUTER_API_KEY: Optional[str] = None
+    OPENROUTER_BASE_URL: str = "https://openrouter.ai/api/v1"
     OLLAMA_BASE_URL: str = "http://localhost:11434"
+    # Model and dimension for collections not yet in embedding_collections;
+    # once a collection is registered its row is authoritative (change models
+    # with app.scripts.migrate_embeddings, not by editing these)
+    EMBEDDING_MODEL: str = "snowflake-arctic-embed:33m"
+    EMBEDDING_DIM: int = 1024
+
+    # Embedding batching: concurrent single-text calls are coalesced into one
+    # /api/embed request of up to EMBED_BATCH_MAX_SIZE texts, waiting at most
+    # EMBED_BATCH_MAX_WAIT_MS for the batch to fill.
+    EMBED_COALESCE: bool = True
+    EMBED_BATCH_MAX_SIZE: int = 64
+    EMBED_BATCH_MAX_WAIT_MS: float = 5.0
+    EMBED_RETRY_AFTER_SECONDS: float = 30.0  # after a failed /api/embed, searches go lexical-only this long
+
+    # Embedding cache: in-memory LRU (bounded in MB) backed by a SQLite file
+    # shared by all workers on the host. Empty path disables the disk tier.
+    EMBEDDING_CACHE_MEMORY_MB: float = 64.0
+    EMBEDDING_CACHE_PATH: str = ".cache/embeddings.sqlite3"
+
+    # Online embedding model migration: rows are re-embedded into each
+    # table's spare vector column in batches, throttled to
+    # EMBED_MIGRATION_ROWS_PER_SECOND (0 = unthrottled) so the embedder keeps
+    # serving queries. Processes re-read the active model/column this often.
+    EMBED_MIGRATION_BATCH_SIZE: int = 64
+    EMBED_MIGRATION_ROWS_PER_SECOND: float = 50.0
+    EMBEDDING_REGISTRY_REFRESH_SECONDS: float = 10.0
+
+    # HTTP client pools (one long-lived client per upstream backend)
+    OLLAMA_MAX_CONNECTIONS: int = 32
+    OLLAMA_MAX_KEEPALIVE: int = 16
+    OLLAMA_HTTP2: bool = False  # Ollama only speaks HTTP/1.1
+    OPENROUTER_MAX_CONNECTIONS: int = 64
+    OPENROUTER_MAX_KEEPALIVE: int = 32
+    OPENROUTER_HTTP2: bool = True
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+
+    # Vector search
+    VECTOR_INDEX_TYPE: str = "hnsw"  # hnsw, ivfflat
+    VECTOR_METRIC: str = "cosine"  # l2, cosine, inner_product (must match the embedding model)
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 64
+    HNSW_EF_SEARCH: int = 40
+    IVFFLAT_LISTS: int = 100
+    IVFFLAT_PROBES: int = 10
+    # Filtered search: pgvector >= 0.8 iterative index scans keep scanning the
+    # index until enough rows pass the filter ("off" for older pgvector).
+    VECTOR_ITERATIVE_SCAN: str = "relaxed_order"  # off, relaxed_order, strict_order
+    VECTOR_MAX_SCAN_TUPLES: int = 20000
+    # Quantized ANN indexes: "halfvec" (half the index size) or "binary" (1/32)
+    # index a compact copy; the top limit * VECTOR_RERANK_FACTOR candidates
+    # are then re-ranked on the full-precision vectors.
+    VECTOR_QUANTIZATION: str = "none"  # none, halfvec, binary
+    VECTOR_RERANK_FACTOR: int = 0  # 0 = per-quantization default (halfvec 2, binary 10)
+    # Categories that get their own partial ANN index (e.g. ["component", "layout"])
+    VECTOR_PARTIAL_INDEX_CATEGORIES: List[str] = []
+
+    # Snippet retrieval: "hybrid" fuses vector and full-text ranks with
+    # reciprocal rank fusion (score = sum 1 / (SNIPPET_RRF_K + rank)); identifier-
+    # like queries and searches while the embedder is down use full text only.
+    SNIPPET_SEARCH_MODE: str = "hybrid"  # hybrid, vector, lexical
+    SNIPPET_TEXT_SEARCH_CONFIG: str = "english"  # Postgres text search configuration
+    SNIPPET_RRF_K: int = 60
+    SNIPPET_HYBRID_CANDIDATES: int = 20  # taken from each ranking before fusion
+
+    # In-process snippet index (needs numpy): exact top-k in memory instead of
+    # a pgvector query per search. Reloads changed rows when ingestion bumps
+    # the code_snippets version; larger corpora stay on pgvector.
+    SNIPPET_INDEX_ENABLED: bool = True
+    SNIPPET_INDEX_MAX_ROWS: int = 20000
+    SNIPPET_INDEX_REFRESH_SECONDS: float = 30.0
+
+    # Snippet usage_count write-behind
+    USAGE_FLUSH_INTERVAL_SECONDS: float = 10.0
+    USAGE_FLUSH_MAX_PENDING: int = 1000
+
+    # Background generation jobs
+    JOB_WORKERS: int = 2  # in-process workers per API process (0 = run app.scripts.run_worker instead)
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BASE_SECONDS: float = 5.0
+    JOB_USER_CONCURRENCY: int = 1  # running jobs allowed per user
+    JOB_LOCK_TIMEOUT_SECONDS: float = 600.0  # requeue jobs from crashed workers after this
+
+    # Chat edit context (estimated tokens)
+    CHAT_CONTEXT_TOKEN_BUDGET: int = 12000
+    CHAT_SNIPPET_TOKEN_BUDGET: int = 2000
+
+    # Chat edit output: "patch" asks for search/replace edits (full rewrite only
+    # for files whose edits fail to apply), "rewrite" asks for whole files
+    CHAT_EDIT_MODE: str = "patch"
+    PATCH_FUZZY_THRESHOLD: float = 0.85  # min similarity for a fuzzy search anchor
+
+    # Portfolio file versions kept per file (older inactive versions are deleted; 0 keeps all)
+    WEBPAGE_KEEP_VERSIONS: int = 20
+
+    # Background chunk embedding of portfolio files
+    PAGE_EMBED_CONCURRENCY: int = 2  # portfolios embedded at once
+    PAGE_CHUNK_MAX_LINES: int = 80  # longer components are split at nested declarations/blank lines
+    PAGE_EMBED_RETRY_SECONDS: float = 60.0  # first backoff after a failed pass; doubles per failure, up to an hour
+    CHAT_RELEVANT_CHUNKS: int = 8  # nearest file regions considered per chat edit
+
+    # Knowledge-base (code_context) documents are chunked on component/
+    # function/CSS rule boundaries; each chunk is embedded and a document
+    # ranks by its best-matching chunk.
+    CONTEXT_CHUNK_MAX_LINES: int = 60
+    CONTEXT_CHUNK_MAX_CHARS: int = 2000  # keeps chunks inside the embedder's input window
+    CONTEXT_CHUNK_OVERLAP_LINES: int = 5  # lines repeated before each split piece
+    CONTEXT_CHUNK_CANDIDATES: int = 4  # chunk hits fetched per requested document
+    CHUNK_WORKERS: int = 0  # processes for chunking large trees (0 = CPU count)
+
+    # Chat completion providers, tried in this order (openrouter, ollama, openai)
+    LLM_PROVIDERS: List[str] = ["openrouter"]
+    OPENROUTER_MODEL: str = "openrouter/meta-llama/llama-3.3-70b-instruct:free"
+    OLLAMA_CHAT_MODEL: str = "qwen2.5-coder:7b"
+    OPENAI_COMPAT_BASE_URL: str = "http://localhost:8000/v1"  # any OpenAI-compatible server
+    OPENAI_COMPAT_API_KEY: Optional[str] = None
+    OPENAI_COMPAT_MODEL: str = ""
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    LLM_READ_TIMEOUT_SECONDS: float = 120.0  # max gap between streamed chunks
+    LLM_FIRST_TOKEN_TIMEOUT_SECONDS: float = 60.0  # fall back to the next provider after this
+    LLM_HEDGE_AFTER_MS: float = 0.0  # start the next provider too if no first token by then (0 = off)
+    LLM_BREAKER_FAILURES: int = 3  # consecutive failures that open a provider's circuit
+    LLM_BREAKER_COOLDOWN_SECONDS: float = 30.0
+
+    # Semantic response cache for portfolio generation: a request whose
+    # template matches and whose prompt embedding is at least this cosine-
+    # similar to a cached one reuses its files. Evicts least-used entries.
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MIN_SIMILARITY: float = 0.95
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2000
+    RESPONSE_CACHE_TTL_HOURS: float = 168.0
+
+    # Observability: Prometheus /metrics (needs prometheus-client) and
+    # OpenTelemetry spans (needs opentelemetry-api plus an SDK/exporter)
+    METRICS_ENABLED: bool = False
+    TRACING_ENABLED: bool = False
 
     class Config:
         case_sensitive = True
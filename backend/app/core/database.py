@@ -1,8 +1,36 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+from uuid import uuid4
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from app.core.config import settings
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+
+def _connect_args() -> Dict[str, Any]:
+    """asyncpg options; other drivers get none."""
+    if "+asyncpg" not in settings.DATABASE_URL:
+        return {}
+    if not settings.DB_PREPARED_STATEMENTS:
+        # PgBouncer in transaction mode: no server-side statement reuse, and
+        # unique names so statements never collide across pooled backends
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {"prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE}
+
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=settings.DB_ECHO,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+    connect_args=_connect_args()
+)
 AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
@@ -10,3 +38,28 @@ Base = declarative_base()
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[AsyncSession]:
+    """
+    One short transaction: commits on success, rolls back on error, and
+    returns the connection to the pool on exit. Routes open one per DB
+    phase so no connection is held while awaiting the LLM.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+
+def pool_status() -> Dict[str, Any]:
+    """Connection usage of the engine's pool."""
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checked_in": pool.checkedin(),
+    }
@@ -0,0 +1,179 @@
+import time
+from typing import Any, Callable, Dict, Optional
+from app.core.config import settings
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+try:
+    from opentelemetry import trace as otel_trace
+    OTEL_AVAILABLE = True
+except ImportError:
+    OTEL_AVAILABLE = False
+
+METRICS_ENABLED = settings.METRICS_ENABLED and PROMETHEUS_AVAILABLE
+TRACING_ENABLED = settings.TRACING_ENABLED and OTEL_AVAILABLE
+
+if settings.METRICS_ENABLED and not PROMETHEUS_AVAILABLE:
+    print("METRICS_ENABLED is set but prometheus_client is not installed; metrics are disabled")
+if settings.TRACING_ENABLED and not OTEL_AVAILABLE:
+    print("TRACING_ENABLED is set but opentelemetry-api is not installed; tracing is disabled")
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+if METRICS_ENABLED:
+    STAGE_SECONDS = Histogram(
+        "gitfolio_stage_duration_seconds", "Duration of instrumented request stages",
+        ["stage", "outcome"], buckets=_LATENCY_BUCKETS
+    )
+    EMBEDDING_SECONDS = Histogram(
+        "gitfolio_embedding_request_duration_seconds", "Embedding backend request latency",
+        ["model"], buckets=_LATENCY_BUCKETS
+    )
+    EMBEDDING_TEXTS = Counter("gitfolio_embedding_texts_total", "Texts sent to the embedding backend", ["model"])
+    LLM_SECONDS = Histogram(
+        "gitfolio_llm_duration_seconds", "LLM latency per provider (first token and full completion)",
+        ["provider", "phase"], buckets=_LATENCY_BUCKETS
+    )
+    LLM_REQUESTS = Counter("gitfolio_llm_requests_total", "LLM provider calls", ["provider", "outcome"])
+    LLM_TOKENS = Counter("gitfolio_llm_tokens_total", "LLM tokens as reported by the provider", ["provider", "kind"])
+
+tracer = otel_trace.get_tracer("gitfolio") if TRACING_ENABLED else None
+
+
+class _NoopSpan:
+    """Returned by span() when telemetry is off: no clock reads, no allocation."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "attributes", "_start", "_otel_cm", "_otel_span")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self._otel_cm = None
+        self._otel_span = None
+
+    def __enter__(self):
+        if tracer is not None:
+            self._otel_cm = tracer.start_as_current_span(self.name, attributes=self.attributes or None)
+            self._otel_span = self._otel_cm.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if METRICS_ENABLED:
+            STAGE_SECONDS.labels(self.name, "error" if exc_type else "ok").observe(time.perf_counter() - self._start)
+        if self._otel_cm is not None:
+            return self._otel_cm.__exit__(exc_type, exc, tb)
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        if self._otel_span is not None:
+            self._otel_span.set_attribute(key, value)
+
+
+def span(name: str, **attributes: Any):
+    """
+    Time a stage: `with span("snippets.search", limit=5): ...`.
+    Feeds gitfolio_stage_duration_seconds and, when tracing is on, an
+    OpenTelemetry span. A shared no-op when both are disabled.
+    """
+    if not (METRICS_ENABLED or TRACING_ENABLED):
+        return _NOOP_SPAN
+    return _Span(name, attributes)
+
+def observe_embedding(model: str, seconds: float, texts: int):
+    if METRICS_ENABLED:
+        EMBEDDING_SECONDS.labels(model).observe(seconds)
+        EMBEDDING_TEXTS.labels(model).inc(texts)
+
+def observe_llm(provider: str, ok: bool, first_token_seconds: Optional[float] = None,
+                total_seconds: Optional[float] = None, usage: Optional[Dict[str, int]] = None):
+    if not METRICS_ENABLED:
+        return
+    LLM_REQUESTS.labels(provider, "ok" if ok else "error").inc()
+    if first_token_seconds is not None:
+        LLM_SECONDS.labels(provider, "first_token").observe(first_token_seconds)
+    if total_seconds is not None:
+        LLM_SECONDS.labels(provider, "total").observe(total_seconds)
+    for kind, count in (usage or {}).items():
+        if count:
+            LLM_TOKENS.labels(provider, kind).inc(count)
+
+def register_gauge(name: str, documentation: str, labels: Dict[str, Callable[[], float]], label_name: str):
+    """
+    A gauge whose values are read from callbacks at scrape time, one per
+    label value (e.g. cache -> hit ratio), so nothing runs between scrapes.
+    """
+    if not METRICS_ENABLED:
+        return
+    gauge = Gauge(name, documentation, [label_name])
+    for value, callback in labels.items():
+        gauge.labels(value).set_function(callback)
+
+def install(app):
+    """Add /metrics, request timing and the scrape-time gauges to the app."""
+    if not METRICS_ENABLED:
+        return
+    from fastapi import Response
+    from app.core.database import engine
+    from app.services.embedding_cache import embedding_cache
+    from app.services.llm_service import llm_service
+    from app.services.response_cache import response_cache
+
+    pool = engine.pool
+    capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+
+    def ratio(stats: Dict[str, int]) -> float:
+        lookups = stats["hits"] + stats["misses"] + stats.get("shared", 0)
+        return (lookups - stats["misses"]) / lookups if lookups else 0.0
+
+    register_gauge("gitfolio_cache_hit_ratio", "Cache hit ratio since start", {
+        "embedding": lambda: embedding_cache.stats()["hit_ratio"],
+        "llm_response": lambda: ratio(llm_service.generate_code.stats),
+        "semantic_response": lambda: response_cache.stats()["hit_ratio"],
+    }, "cache")
+    register_gauge("gitfolio_db_pool_connections", "DB pool connections by state", {
+        "checked_out": lambda: pool.checkedout(),
+        "checked_in": lambda: pool.checkedin(),
+        "overflow": lambda: max(0, pool.overflow()),
+    }, "state")
+    register_gauge("gitfolio_db_pool_utilization", "Checked-out share of pool size + max overflow", {
+        "default": lambda: pool.checkedout() / capacity if capacity else 0.0,
+    }, "pool")
+
+    request_seconds = Histogram(
+        "gitfolio_http_request_duration_seconds", "HTTP request latency",
+        ["method", "route", "status"], buckets=_LATENCY_BUCKETS
+    )
+
+    @app.middleware("http")
+    async def time_requests(request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        route = request.scope.get("route")
+        request_seconds.labels(
+            request.method, getattr(route, "path", "unmatched"), str(response.status_code)
+        ).observe(time.perf_counter() - start)
+        return response
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(prometheus_client.generate_latest(), media_type=prometheus_client.CONTENT_TYPE_LATEST)
@@ -0,0 +1,226 @@
+import math
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+from sqlalchemy import Index, cast, column, func, literal, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+
+EMBEDDING_DIM = settings.EMBEDDING_DIM
+
+# metric -> (pgvector operator class, pgvector.sqlalchemy comparator method)
+METRICS = {
+    "l2": ("vector_l2_ops", "l2_distance"),
+    "cosine": ("vector_cosine_ops", "cosine_distance"),
+    "inner_product": ("vector_ip_ops", "max_inner_product"),
+}
+
+INDEX_TYPES = ("hnsw", "ivfflat")
+
+# Quantized ANN indexes are expression indexes: the table keeps float32
+# vectors for exact re-ranking, the index stores the compact copy.
+# halfvec: 2 bytes/dim, same metric. binary: 1 bit/dim, Hamming distance.
+QUANTIZATIONS = ("none", "halfvec", "binary")
+HALFVEC_OPS = {"l2": "halfvec_l2_ops", "cosine": "halfvec_cosine_ops", "inner_product": "halfvec_ip_ops"}
+# Candidates per result when VECTOR_RERANK_FACTOR is 0: halfvec ranks almost
+# exactly, sign bits lose far more (see app/scripts/bench_quantization.py)
+RERANK_FACTORS = {"halfvec": 2, "binary": 10}
+
+
+def _metric(metric: Optional[str] = None) -> str:
+    metric = metric or settings.VECTOR_METRIC
+    if metric not in METRICS:
+        raise ValueError(f"Unknown VECTOR_METRIC '{metric}', expected one of {list(METRICS)}")
+    return metric
+
+def _quantization(quantization: Optional[str] = None) -> str:
+    quantization = quantization or settings.VECTOR_QUANTIZATION
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown VECTOR_QUANTIZATION '{quantization}', expected one of {QUANTIZATIONS}")
+    return quantization
+
+def is_quantized(quantization: Optional[str] = None) -> bool:
+    return _quantization(quantization) != "none"
+
+def quantize(expr, quantization: Optional[str] = None, dim: int = EMBEDDING_DIM):
+    """The expression a quantized index is built on (`expr` itself for "none")."""
+    quantization = _quantization(quantization)
+    if quantization == "halfvec":
+        return cast(expr, HALFVEC(dim))
+    if quantization == "binary":
+        return cast(func.binary_quantize(expr), BIT(dim))
+    return expr
+
+def vector_index(table_name: str, column_name: str = "vector", where: Optional[str] = None,
+                 suffix: str = "", quantization: Optional[str] = None, dim: int = EMBEDDING_DIM) -> Index:
+    """
+    ANN index for a vector column, built from the configured index type,
+    metric and quantization. The name encodes all three, so changing any
+    yields a new index rather than silently reusing an incompatible one.
+    """
+    index_type = settings.VECTOR_INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown VECTOR_INDEX_TYPE '{index_type}', expected one of {INDEX_TYPES}")
+    metric = _metric()
+    opclass = METRICS[metric][0]
+    quantization = _quantization(quantization)
+
+    if index_type == "hnsw":
+        options = {"m": settings.HNSW_M, "ef_construction": settings.HNSW_EF_CONSTRUCTION}
+    else:
+        options = {"lists": settings.IVFFLAT_LISTS}
+
+    name = f"ix_{table_name}_{column_name}_{index_type}_{metric}{suffix}"
+    indexed = column_name
+    if quantization != "none":
+        name = f"ix_{table_name}_{column_name}_{index_type}_{quantization}_{metric}{suffix}"
+        opclass = HALFVEC_OPS[metric] if quantization == "halfvec" else "bit_hamming_ops"
+        indexed = quantize(column(column_name), quantization, dim).label(f"{column_name}_q")
+
+    return Index(
+        name,
+        indexed,
+        postgresql_using=index_type,
+        postgresql_with=options,
+        postgresql_ops={getattr(indexed, "name", column_name): opclass},
+        postgresql_where=text(where) if where else None,
+    )
+
+def partial_vector_indexes(table_name: str, filter_column: str, values: List[str],
+                           column_name: str = "vector", quantization: Optional[str] = None,
+                           dim: int = EMBEDDING_DIM) -> List[Index]:
+    """
+    One partial ANN index per filter value (WHERE filter_column = value), so
+    filtered searches walk a graph that only contains matching rows.
+    """
+    indexes = []
+    for value in values:
+        slug = "".join(c if c.isalnum() else "_" for c in value.lower())
+        literal = value.replace("'", "''")
+        indexes.append(vector_index(
+            table_name, column_name,
+            where=f"{filter_column} = '{literal}'",
+            suffix=f"_{filter_column}_{slug}",
+            quantization=quantization,
+            dim=dim
+        ))
+    return indexes
+
+def mean_vector(vectors: List[List[float]]) -> Optional[List[float]]:
+    """Mean of unit-normalized vectors (a document-level embedding from its chunks)."""
+    vectors = [v for v in vectors if v]
+    if not vectors:
+        return None
+    total = [0.0] * len(vectors[0])
+    for v in vectors:
+        norm = math.sqrt(sum(x * x for x in v)) or 1.0
+        for i, x in enumerate(v):
+            total[i] += x / norm
+    return [x / len(vectors) for x in total]
+
+def distance(column, embedding, metric: Optional[str] = None):
+    """
+    Distance expression for ORDER BY that matches the configured index
+    (smaller is closer for every metric, including inner product).
+    """
+    return getattr(column, METRICS[_metric(metric)][1])(embedding)
+
+def coarse_distance(column, embedding, quantization: Optional[str] = None, metric: Optional[str] = None,
+                    dim: int = EMBEDDING_DIM):
+    """
+    Distance on the quantized expression, so ORDER BY uses the quantized
+    index. Same as distance() when quantization is off.
+    """
+    quantization = _quantization(quantization)
+    if quantization == "binary":
+        query_bits = quantize(cast(literal(embedding, Vector(dim)), Vector(dim)), "binary", dim)
+        return quantize(column, "binary", dim).hamming_distance(query_bits)
+    return distance(quantize(column, quantization, dim), embedding, metric)
+
+def rerank_candidates(limit: int, quantization: Optional[str] = None) -> int:
+    """Rows fetched from the quantized index before exact re-ranking."""
+    quantization = _quantization(quantization)
+    if quantization == "none":
+        return limit
+    return limit * (settings.VECTOR_RERANK_FACTOR or RERANK_FACTORS[quantization])
+
+def nearest_subquery(id_column, vector_column, embedding, limit: int, filters: Optional[list] = None,
+                     quantization: Optional[str] = None, exact: bool = False,
+                     candidates: Optional[int] = None, dim: int = EMBEDDING_DIM):
+    """
+    (id, distance) of the `limit` nearest rows, as a subquery to join on.
+
+    With quantization, a coarse pass takes rerank_candidates(limit) rows
+    (or `candidates`) from the quantized index and they are re-ranked by
+    exact distance on the full-precision column. `exact=True` skips the coarse pass (for
+    exact-scan fallbacks). The inner LIMIT also lets callers re-sort by
+    exact distance after relaxed-order iterative scans. `dim` is the
+    column's dimension (binary quantization casts to bit(dim)).
+    """
+    filters = filters or []
+    dist = distance(vector_column, embedding)
+    if exact or not is_quantized(quantization):
+        return (
+            select(id_column.label("id"), dist.label("distance"))
+            .where(*filters)
+            .order_by(dist)
+            .limit(limit)
+            .subquery()
+        )
+    candidates = (
+        select(id_column)
+        .where(*filters)
+        .order_by(coarse_distance(vector_column, embedding, quantization, dim=dim))
+        .limit(candidates or rerank_candidates(limit, quantization))
+    )
+    return (
+        select(id_column.label("id"), dist.label("distance"))
+        .where(id_column.in_(candidates.scalar_subquery()))
+        .order_by(dist)
+        .limit(limit)
+        .subquery()
+    )
+
+async def apply_search_params(
+    session: AsyncSession,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    filtered: bool = False,
+    candidates: int = 0
+):
+    """
+    Set per-query ANN knobs for the current transaction (SET LOCAL), so
+    they reset on commit and never leak to other pooled connections.
+    Filtered queries also enable iterative index scans when configured.
+    HNSW returns at most ef_search rows, so it is raised to `candidates`.
+    """
+    index_type = settings.VECTOR_INDEX_TYPE
+    if index_type == "hnsw":
+        value = max(int(ef_search or settings.HNSW_EF_SEARCH), candidates)
+        await session.execute(text(f"SET LOCAL hnsw.ef_search = {value}"))
+    else:
+        value = int(probes or settings.IVFFLAT_PROBES)
+        await session.execute(text(f"SET LOCAL ivfflat.probes = {value}"))
+
+    mode = settings.VECTOR_ITERATIVE_SCAN
+    if filtered and mode != "off":
+        if mode not in ("relaxed_order", "strict_order"):
+            raise ValueError(f"Unknown VECTOR_ITERATIVE_SCAN '{mode}'")
+        # IVFFlat only supports relaxed ordering
+        if index_type == "ivfflat":
+            mode = "relaxed_order"
+        await session.execute(text(f"SET LOCAL {index_type}.iterative_scan = {mode}"))
+        if index_type == "hnsw":
+            await session.execute(text(f"SET LOCAL hnsw.max_scan_tuples = {int(settings.VECTOR_MAX_SCAN_TUPLES)}"))
+
+@asynccontextmanager
+async def exact_scan(session: AsyncSession):
+    """
+    Force exact (non-ANN) plans for queries inside the block. Used as the
+    fallback when a filtered ANN scan could not produce enough rows.
+    """
+    await session.execute(text("SET LOCAL enable_indexscan = off"))
+    try:
+        yield
+    finally:
+        await session.execute(text("SET LOCAL enable_indexscan = on"))
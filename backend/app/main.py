@@ -1,13 +1,43 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.core.config import settings
 from app.api.routes import router as api_router
+from app.core import telemetry
+from app.services.http_client import http_pool
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_registry import embedding_registry
+from app.services.usage_tracker import usage_tracker
+from app.services.snippet_index import snippet_index
+from app.services.job_queue import job_worker
+from app.services.page_embedder import page_embedder
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Before anything embeds: which model and vector column each collection uses
+    await embedding_registry.start()
+    usage_tracker.start()
+    snippet_index.start()
+    if settings.JOB_WORKERS > 0:
+        job_worker.start()
+    yield
+    # Shutdown: requeue in-flight jobs, finish page embeddings, persist buffered usage counts,
+    # close pooled upstream connections
+    await job_worker.stop()
+    await page_embedder.stop()
+    await snippet_index.stop()
+    await embedding_registry.stop()
+    await usage_tracker.stop()
+    await http_pool.aclose()
+    embedding_cache.close()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 app.include_router(api_router, prefix="/api")
+telemetry.install(app)
 
 @app.get("/")
 async def root():
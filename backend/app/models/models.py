@@ -1,7 +1,10 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, func
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Column, Computed, Integer, String, Text, DateTime, Float, Boolean, Index, func, text
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import deferred
 from pgvector.sqlalchemy import Vector
+from app.core.config import settings
 from app.core.database import Base
+from app.core.vector_index import EMBEDDING_DIM, vector_index, partial_vector_indexes
 
 class Portfolio(Base):
     __tablename__ = "portfolios"
@@ -9,7 +12,7 @@ class Portfolio(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String, index=True) # GitHub User ID
     github_username = Column(String, index=True)
-    status = Column(String, default='generating')  # generating, ready, failed
+    status = Column(String, default='generating')  # queued, generating, ready, failed
     template_id = Column(String, nullable=True)
     custom_prompt = Column(Text, nullable=True)
     deployment_url = Column(String, nullable=True)
@@ -20,20 +23,71 @@ class Portfolio(Base):
 class WebPage(Base):
     """Stores the generated web pages for the portfolio"""
     __tablename__ = "web_pages"
+    __table_args__ = (
+        vector_index("web_pages"),
+        # Loads the current file tree of a portfolio in one index scan
+        Index("ix_web_pages_active", "portfolio_id", "file_path", "is_active"),
+        # Enforces one active version per file; row locks can't cover a file's first write
+        Index("ux_web_pages_one_active", "portfolio_id", "file_path", unique=True,
+              postgresql_where=text("is_active")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     portfolio_id = Column(Integer, index=True)
     file_path = Column(String) # e.g., 'app/page.tsx'
     content = Column(Text)
     file_type = Column(String, nullable=True)  # tsx, css, json
+    content_hash = Column(String(64), nullable=True)  # sha256 of content; unchanged saves are skipped
     version = Column(Integer, default=1)
-    is_active = Column(Boolean, default=True)
-    vector = Column(Vector(1024), nullable=True) # Embedding of the content
+    is_active = Column(Boolean, default=True)  # exactly one active version per file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Embedding slots are deferred: loaded explicitly (active slot only), and a
+    # migration can retype the spare slot without invalidating cached statements
+    vector = deferred(Column(Vector(EMBEDDING_DIM), nullable=True)) # Mean of the file's chunk embeddings (set in the background)
+    vector_alt = deferred(Column(Vector(), nullable=True))  # spare slot for embedding model migrations (see EmbeddingCollection)
+    embedded_with = Column(String, nullable=True)  # model of the last complete embedding pass, even one with no chunks
+
+class WebPageChunk(Base):
+    """Component/function-level regions of an active portfolio file, embedded for chat retrieval"""
+    __tablename__ = "web_page_chunks"
+    # No ANN index: lookups are always scoped to one portfolio, where an exact
+    # scan over its few hundred chunks beats an ANN scan plus post-filter.
+    __table_args__ = (Index("ix_web_page_chunks_file", "portfolio_id", "file_path"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    portfolio_id = Column(Integer)
+    page_id = Column(Integer, index=True)  # active WebPage version the chunk was cut from
+    file_path = Column(String)
+    chunk_index = Column(Integer)
+    symbol = Column(String, nullable=True)  # component/function name or CSS selector
+    start_line = Column(Integer)
+    end_line = Column(Integer)
+    content = Column(Text)
+    content_hash = Column(String(64))  # unchanged chunks keep their vector across versions
+    vector = deferred(Column(Vector(EMBEDDING_DIM), nullable=True))
+    vector_alt = deferred(Column(Vector(), nullable=True))
+
+def _snippet_search_text(config: str) -> str:
+    """Weighted tsvector: name and tags (A), description (B), code (D)."""
+    return (
+        f"setweight(to_tsvector('{config}', coalesce(name, '')), 'A') || "
+        f"setweight(to_tsvector('{config}', coalesce(tags::text, '')), 'A') || "
+        f"setweight(to_tsvector('{config}', coalesce(description, '')), 'B') || "
+        f"setweight(to_tsvector('{config}', coalesce(code, '')), 'D')"
+    )
 
 class CodeSnippet(Base):
     """Stores reusable code snippets for portfolio generation"""
     __tablename__ = "code_snippets"
-    
+    __table_args__ = (
+        vector_index("code_snippets"),
+        *partial_vector_indexes("code_snippets", "category", settings.VECTOR_PARTIAL_INDEX_CATEGORIES),
+        Index("ix_code_snippets_tags", "tags", postgresql_using="gin", postgresql_ops={"tags": "jsonb_path_ops"}),
+        Index("ix_code_snippets_search", "search_vector", postgresql_using="gin"),
+        # Ingestion upserts on source_path (ON CONFLICT needs a unique index)
+        Index("ux_code_snippets_source_path", "source_path", unique=True),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     category = Column(String, index=True)  # component, layout, style, animation, seo
@@ -42,17 +96,109 @@ class CodeSnippet(Base):
     description = Column(Text)
     tags = Column(JSONB, default=[])  # ["react", "tailwind", "responsive"]
     framework = Column(String, default="nextjs")  # nextjs, react, vue
-    vector = Column(Vector(1024))
+    vector = deferred(Column(Vector(EMBEDDING_DIM)))
+    vector_alt = deferred(Column(Vector(), nullable=True))
     usage_count = Column(Integer, default=0)
     quality_score = Column(Float, default=0.0)
+    # Ingestion manifest (file-based snippets only)
+    source_path = Column(String, nullable=True)  # relative to snippets/
+    content_hash = Column(String(64), nullable=True)  # sha256 of the file content
+    source_mtime = Column(Float, nullable=True)
+    # Full-text search (lexical/hybrid retrieval); deferred so ORM loads skip it
+    search_vector = deferred(Column(TSVECTOR, Computed(_snippet_search_text(settings.SNIPPET_TEXT_SEARCH_CONFIG), persisted=True)))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+class ResponseCacheEntry(Base):
+    """Generated file sets reused for similar generation requests"""
+    __tablename__ = "llm_response_cache"
+    # No ANN index: the table is capped at RESPONSE_CACHE_MAX_ENTRIES rows and
+    # lookups are filtered to one template, so an exact scan is cheap.
+    __table_args__ = (Index("ix_llm_response_cache_lookup", "variant", "template_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    key_hash = Column(String(64), unique=True)  # sha256 of variant, template and normalized prompt
+    variant = Column(String(16))  # hash of the system prompt the files were generated with
+    template_id = Column(String, nullable=True)
+    subject = Column(String, nullable=True)  # GitHub username the files were generated for
+    vector = deferred(Column(Vector(EMBEDDING_DIM)))  # embedding of template id + normalized prompt
+    vector_alt = deferred(Column(Vector(), nullable=True))
+    files = Column(JSONB)  # [{"filename", "content"}]
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_hit_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class CodeContext(Base):
     """Stores general knowledge base/snippets for the AI"""
     __tablename__ = "code_context"
-    
+    __table_args__ = (vector_index("code_context"),)
+
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text)
     metadata_ = Column(JSONB)
-    vector = Column(Vector(1024))
+    vector = deferred(Column(Vector(EMBEDDING_DIM)))  # Mean of the chunk embeddings (whole-content embedding for unchunked rows)
+    vector_alt = deferred(Column(Vector(), nullable=True))
+
+class CodeContextChunk(Base):
+    """Component/function/CSS rule regions of a CodeContext document, embedded separately"""
+    __tablename__ = "code_context_chunks"
+    __table_args__ = (vector_index("code_context_chunks"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    context_id = Column(Integer, index=True)  # parent CodeContext row
+    chunk_index = Column(Integer)
+    symbol = Column(String, nullable=True)  # component/function name or CSS selector
+    start_line = Column(Integer)
+    end_line = Column(Integer)
+    content = Column(Text)
+    content_hash = Column(String(64))
+    vector = deferred(Column(Vector(EMBEDDING_DIM)))
+    vector_alt = deferred(Column(Vector(), nullable=True))
+
+class EmbeddingCollection(Base):
+    """
+    Embedding model, dimension and active vector column of a group of tables
+    searched with the same query embedding, plus any migration in progress
+    """
+    __tablename__ = "embedding_collections"
+
+    name = Column(String, primary_key=True)  # e.g. "snippets" (see embedding_registry.COLLECTIONS)
+    model = Column(String)
+    dim = Column(Integer)
+    active_column = Column(String, default="vector")  # "vector" or "vector_alt"
+    status = Column(String, default="ready")  # ready, backfilling, indexing, switched
+    target_model = Column(String, nullable=True)  # set while migrating
+    target_dim = Column(Integer, nullable=True)
+    checkpoint = Column(JSONB, default={})  # {table: last re-embedded id} of the current pass
+    rows_done = Column(Integer, default=0)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    switched_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class IndexVersion(Base):
+    """Version markers bumped by writers so in-process indexes know to refresh"""
+    __tablename__ = "index_versions"
+
+    name = Column(String, primary_key=True)  # e.g. "code_snippets"
+    version = Column(Integer, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class GenerationJob(Base):
+    """Queued portfolio generation, claimed by workers with FOR UPDATE SKIP LOCKED"""
+    __tablename__ = "generation_jobs"
+    __table_args__ = (Index("ix_generation_jobs_claim", "status", "run_after"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    portfolio_id = Column(Integer, index=True)
+    user_id = Column(String, index=True)
+    payload = Column(JSONB, default={})  # GenerateRequest fields
+    status = Column(String, default='queued')  # queued, running, done, failed
+    stage = Column(String, nullable=True)  # human-readable progress step
+    progress = Column(Integer, default=0)  # 0-100
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_after = Column(DateTime(timezone=True), server_default=func.now())
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -15,8 +15,19 @@ class GenerateResponse(BaseModel):
     message: str
     portfolio_id: int
     preview_url: Optional[str] = None
+    status: Optional[str] = None
+    job_id: Optional[int] = None
     files: List[FileObject] = []
 
+class PortfolioStatusResponse(BaseModel):
+    portfolio_id: int
+    status: str
+    stage: Optional[str] = None
+    progress: int = 0
+    attempts: int = 0
+    error: Optional[str] = None
+    files: List[str] = []
+
 class ChatRequest(BaseModel):
     portfolio_id: int
     message: str
@@ -0,0 +1,72 @@
+"""
+Benchmark: per-call httpx.AsyncClient vs the shared pooled client.
+Runs against the local stub server, so no Ollama/OpenRouter is needed.
+
+Usage:
+    python -m app.scripts.bench_http_client --requests 500 --concurrency 16
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from app.scripts.stub_server import StubServer
+from app.services.http_client import HTTPClientPool
+
+
+async def per_call(url: str, payload: dict):
+    async with httpx.AsyncClient() as client:
+        response = await client.post(url, json=payload, timeout=30.0)
+        response.raise_for_status()
+
+
+async def run(label: str, call, total: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{label:<10} {total / elapsed:>9.1f} req/s   "
+        f"p50 {statistics.median(latencies):>7.2f} ms   p99 {p99:>7.2f} ms"
+    )
+
+
+async def main(total: int, concurrency: int, latency_ms: float):
+    async with StubServer(latency_ms=latency_ms) as server:
+        url = f"{server.base_url}/api/embeddings"
+        payload = {"model": "bench", "prompt": "hello world"}
+
+        await run("per-call", lambda: per_call(url, payload), total, concurrency)
+        per_call_connections = server.connections
+
+        pool = HTTPClientPool()
+
+        async def pooled():
+            response = await pool.get("ollama").post(url, json=payload, timeout=30.0)
+            response.raise_for_status()
+
+        await run("pooled", pooled, total, concurrency)
+        await pool.aclose()
+
+        print()
+        print(f"TCP connections opened: per-call={per_call_connections}, "
+              f"pooled={server.connections - per_call_connections}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-call vs pooled HTTP clients")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated upstream latency")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.latency_ms))
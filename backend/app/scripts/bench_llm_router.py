@@ -0,0 +1,87 @@
+"""
+Exercise the LLM provider router against local stub servers: a slow,
+flaky primary (OpenAI-compatible API) and a fast fallback (Ollama
+/api/chat). Compares plain fallback with first-token hedging, then shows
+the primary's circuit breaker opening when it fails outright.
+
+Usage:
+    python -m app.scripts.bench_llm_router --requests 100 --concurrency 8 --hedge-ms 150
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from app.scripts.stub_server import StubServer
+from app.services.http_client import http_pool
+from app.services.llm_router import LLMProvider, LLMRouter, OllamaProvider
+
+MESSAGES = [{"role": "user", "content": "Generate a portfolio"}]
+
+
+async def run(label: str, router: LLMRouter, total: int, concurrency: int):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await router.complete(MESSAGES)
+            except Exception:
+                errors += 1
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(total)))
+    latencies.sort()
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)] if latencies else float("nan")
+    p50 = statistics.median(latencies) if latencies else float("nan")
+    print(f"{label:<10} p50 {p50:>7.1f} ms   p99 {p99:>7.1f} ms   errors {errors}")
+    for name, stats in router.stats().items():
+        print(f"   {name:<9} {stats}")
+
+
+def make_router(primary: StubServer, fallback: StubServer, hedge_ms: float) -> LLMRouter:
+    return LLMRouter(
+        [
+            LLMProvider("primary", f"{primary.base_url}/v1", "stub-model", pool="bench-primary"),
+            OllamaProvider("fallback", fallback.base_url, "stub-model"),
+        ],
+        hedge_after_ms=hedge_ms,
+        first_token_timeout=5.0,
+        breaker_failures=3,
+        breaker_cooldown=30.0
+    )
+
+
+async def main(total: int, concurrency: int, hedge_ms: float, primary_ms: float, fallback_ms: float,
+               fail_rate: float):
+    async with StubServer(latency_ms=primary_ms, fail_rate=fail_rate, seed=1) as primary, \
+            StubServer(latency_ms=fallback_ms) as fallback:
+        print(f"Primary: {primary_ms:.0f} ms, {fail_rate:.0%} errors. Fallback: {fallback_ms:.0f} ms.\n")
+        for label, hedge in (("fallback", 0.0), ("hedged", hedge_ms)):
+            before = primary.requests
+            await run(label, make_router(primary, fallback, hedge), total, concurrency)
+            print(f"   primary received {primary.requests - before} of {total} requests")
+
+    async with StubServer(latency_ms=primary_ms, fail_rate=1.0) as primary, \
+            StubServer(latency_ms=fallback_ms) as fallback:
+        print("\nPrimary down:")
+        await run("breaker", make_router(primary, fallback, 0.0), total, concurrency)
+        print(f"   primary received {primary.requests} of {total} requests")
+
+    await http_pool.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark LLM provider fallback, hedging and circuit breaking")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--hedge-ms", type=float, default=150.0)
+    parser.add_argument("--primary-ms", type=float, default=400.0, help="Primary first-token latency")
+    parser.add_argument("--fallback-ms", type=float, default=50.0, help="Fallback first-token latency")
+    parser.add_argument("--fail-rate", type=float, default=0.1, help="Share of primary requests that fail")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.hedge_ms, args.primary_ms, args.fallback_ms,
+                     args.fail_rate))
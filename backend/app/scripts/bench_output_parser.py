@@ -0,0 +1,101 @@
+"""
+Check the LLM output parser against the fixture corpus, then benchmark it
+on synthetic multi-megabyte responses (fenced, with defects, truncated)
+against the old fence-strip + json.loads approach.
+
+Usage:
+    python -m app.scripts.bench_output_parser --files 200 --file-kb 16 --repeat 5
+"""
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+from app.services.output_parser import parse_files
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "llm_output"
+SNIPPETS_DIR = Path(__file__).resolve().parents[2] / "snippets"
+
+
+def legacy_parse(content: str):
+    """What generate_code did before the parser module."""
+    try:
+        clean_content = re.sub(r"^```json\s*|\s*```$", "", content.strip(), flags=re.MULTILINE | re.DOTALL)
+        parsed = json.loads(clean_content)
+        return parsed if isinstance(parsed, list) else []
+    except json.JSONDecodeError:
+        return []
+
+
+def check_corpus() -> bool:
+    expected = json.loads((FIXTURES_DIR / "expected.json").read_text())
+    ok = True
+    print(f"📂 Fixture corpus ({len(expected)} cases)")
+    for name, want in expected.items():
+        text = (FIXTURES_DIR / name).read_text()
+        report = parse_files(text)
+        got = [f["filename"] for f in report.files]
+        passed = got == want["files"] and len(report.dropped) == want["dropped"]
+        ok &= passed
+        legacy = len(legacy_parse(text))
+        print(f"   {'✅' if passed else '❌'} {name:<28} {len(got)} file(s) (legacy: {legacy})   {report.summary()}")
+        if not passed:
+            print(f"      expected {want['files']} with {want['dropped']} dropped")
+    return ok
+
+
+def sample_sources():
+    sources = [p.read_text() for p in sorted(SNIPPETS_DIR.rglob("*.tsx"))]
+    return sources or ["export default function Component() {\n  return <div className=\"p-4\">Hello</div>;\n}\n"]
+
+
+def build_response(files: int, file_kb: int) -> str:
+    sources = sample_sources()
+    objects = []
+    for i in range(files):
+        source = sources[i % len(sources)]
+        content = (source * (file_kb * 1024 // len(source) + 1))[:file_kb * 1024]
+        objects.append({"filename": f"components/Generated{i}.tsx", "content": content})
+    return "Here are your files:\n```json\n" + json.dumps(objects, indent=2) + "\n```\n"
+
+
+def with_defects(response: str) -> str:
+    """Raw newlines instead of \\n and some unescaped quotes, as weaker models emit."""
+    broken = response.replace("\\n", "\n")
+    return broken.replace('className=\\"', 'className="', 50)
+
+
+def bench(label: str, text: str, repeat: int):
+    size_mb = len(text.encode("utf-8")) / 1e6
+    for name, fn in (("legacy", legacy_parse), ("parser", lambda t: parse_files(t).files)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            files = fn(text)
+        elapsed = (time.perf_counter() - start) / repeat
+        print(
+            f"   {label:<11} {name:<7} {size_mb:>6.2f} MB  {elapsed * 1000:>8.1f} ms  "
+            f"{size_mb / elapsed:>7.1f} MB/s  {len(files):>4} file(s) recovered"
+        )
+
+
+def main(files: int, file_kb: int, repeat: int):
+    corpus_ok = check_corpus()
+
+    response = build_response(files, file_kb)
+    print(f"\n⏱️  Synthetic response: {files} files x {file_kb} KB")
+    bench("fenced", response, repeat)
+    bench("defects", with_defects(response), repeat)
+    bench("truncated", response[: len(response) * 2 // 3], repeat)
+
+    if not corpus_ok:
+        raise SystemExit("❌ Fixture corpus failed")
+    print("\n✅ Fixture corpus passed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the LLM output parser")
+    parser.add_argument("--files", type=int, default=200, help="Files in the synthetic response")
+    parser.add_argument("--file-kb", type=int, default=16, help="Size of each synthetic file")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.files, args.file_kb, args.repeat)
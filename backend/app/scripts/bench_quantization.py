@@ -0,0 +1,134 @@
+"""
+Recall@k, latency and index size of full-precision vs quantized ANN
+indexes (halfvec, binary) with exact re-ranking.
+
+For each quantization the matching expression index is created if missing
+(and dropped again afterwards unless --keep-indexes), then queries are run
+through the same two-phase search the services use, sweeping the number
+of re-ranked candidates (k * factor). Ground truth is an exact scan.
+Query vectors are existing rows with a little Gaussian noise.
+
+Usage:
+    python -m app.scripts.bench_quantization --table code_snippets --k 10 --factors 1,2,4,10,20
+    python -m app.scripts.bench_quantization --modes halfvec,binary --keep-indexes
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+from sqlalchemy import func, select, text
+from sqlalchemy.schema import CreateIndex
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, engine
+from app.core.vector_index import QUANTIZATIONS, nearest_subquery, vector_index
+from app.scripts.bench_vector_search import MODELS, recall, sample_queries
+
+
+async def run_queries(model, queries, k: int, quantization: str, candidates: int, setup_sql: List[str],
+                      exact: bool = False):
+    latencies, results = [], []
+    async with AsyncSessionLocal() as session:
+        for query in queries:
+            async with session.begin():
+                for sql in setup_sql:
+                    await session.execute(text(sql))
+                nearest = nearest_subquery(
+                    model.id, model.vector, query, k,
+                    quantization=quantization, exact=exact, candidates=candidates
+                )
+                start = time.perf_counter()
+                result = await session.execute(select(nearest.c.id))
+                ids = set(result.scalars().all())
+                latencies.append((time.perf_counter() - start) * 1000)
+            results.append(ids)
+    return latencies, results
+
+async def ensure_index(table: str, quantization: str) -> tuple:
+    """Create the index for `quantization` if needed. Returns (name, created, bytes)."""
+    index = vector_index(table, quantization=quantization)
+    async with engine.begin() as conn:
+        exists = (await conn.execute(
+            text("SELECT 1 FROM pg_indexes WHERE schemaname = current_schema() AND indexname = :name"),
+            {"name": index.name}
+        )).first() is not None
+        if not exists:
+            print(f"   building {index.name}...")
+            await conn.execute(CreateIndex(index))
+            await conn.execute(text(f'ANALYZE "{table}"'))
+        size = (await conn.execute(text("SELECT pg_relation_size(CAST(:name AS regclass))"), {"name": index.name})).scalar_one()
+    return index.name, not exists, size
+
+async def drop_index(name: str):
+    async with engine.begin() as conn:
+        await conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+
+def report(label: str, latencies: List[float], score: float, index_bytes: int, rows: int):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    size = f"{index_bytes / 1024 / 1024:8.1f} MB  {index_bytes / max(rows, 1):7.0f} B/row" if index_bytes else " " * 24
+    print(
+        f"{label:<24} recall {score:6.3f}   p50 {statistics.median(latencies):7.2f} ms   "
+        f"p95 {p95:7.2f} ms   {size}"
+    )
+
+async def main(table: str, queries: int, k: int, factors: List[int], modes: List[str], noise: float,
+               keep_indexes: bool):
+    model = MODELS[table]
+    index_type = settings.VECTOR_INDEX_TYPE
+
+    query_vectors = await sample_queries(model, queries, noise)
+    if not query_vectors:
+        print(f"⚠️  {table} has no vectors to benchmark")
+        return
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(select(func.count()).where(model.vector.is_not(None)))).scalar_one()
+        heap = (await session.execute(select(func.avg(func.pg_column_size(model.vector))))).scalar_one() or 0
+    print(
+        f"{table}: {rows} vectors ({float(heap):.0f} B each in the table), {len(query_vectors)} queries, "
+        f"k={k}, index={index_type}, metric={settings.VECTOR_METRIC}\n"
+    )
+
+    _, truth = await run_queries(
+        model, query_vectors, k, "none", k,
+        ["SET LOCAL enable_indexscan = off", "SET LOCAL enable_bitmapscan = off"], exact=True
+    )
+
+    created: List[str] = []
+    try:
+        for mode in modes:
+            name, was_created, size = await ensure_index(table, mode)
+            if was_created:
+                created.append(name)
+            for factor in (factors if mode != "none" else [1]):
+                candidates = k * factor
+                setup = ["SET LOCAL enable_seqscan = off"]
+                if index_type == "hnsw":
+                    setup.append(f"SET LOCAL hnsw.ef_search = {max(settings.HNSW_EF_SEARCH, candidates)}")
+                else:
+                    setup.append(f"SET LOCAL ivfflat.probes = {int(settings.IVFFLAT_PROBES)}")
+                latencies, found = await run_queries(model, query_vectors, k, mode, candidates, setup)
+                label = mode if mode == "none" else f"{mode} x{factor} ({candidates})"
+                report(label, latencies, recall(truth, found), size, rows)
+    finally:
+        if not keep_indexes:
+            for name in created:
+                await drop_index(name)
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantized ANN index recall/latency/size benchmark")
+    parser.add_argument("--table", choices=sorted(MODELS), default="code_snippets")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--factors", default="1,2,4,10,20", help="Re-ranked candidates as multiples of k")
+    parser.add_argument("--modes", default=",".join(QUANTIZATIONS), help="Quantizations to compare")
+    parser.add_argument("--noise", type=float, default=0.01)
+    parser.add_argument("--keep-indexes", action="store_true", help="Keep indexes this run created")
+    args = parser.parse_args()
+    modes = [m for m in args.modes.split(",") if m]
+    unknown = [m for m in modes if m not in QUANTIZATIONS]
+    if unknown:
+        raise SystemExit(f"Unknown modes {unknown}, expected some of {QUANTIZATIONS}")
+    asyncio.run(main(args.table, args.queries, args.k, [int(f) for f in args.factors.split(",")],
+                     modes, args.noise, args.keep_indexes))
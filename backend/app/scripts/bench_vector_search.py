@@ -0,0 +1,116 @@
+"""
+Recall-vs-latency benchmark for the ANN indexes against exact brute force.
+
+Query vectors are existing rows with a little Gaussian noise. Ground truth
+comes from the same ORDER BY with index scans disabled (exact seq scan).
+
+Pass --category to benchmark filtered search on code_snippets (iterative
+index scans, plus partial indexes if VECTOR_PARTIAL_INDEX_CATEGORIES
+includes the category).
+
+Usage:
+    python -m app.scripts.bench_vector_search --table code_snippets --k 10 --values 10,20,40,80,160
+    python -m app.scripts.bench_vector_search --category component
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import List, Optional, Set
+from sqlalchemy import select, func, text
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, engine
+from app.core.vector_index import distance
+from app.models.models import CodeSnippet, CodeContext, CodeContextChunk, WebPage
+from app.services.snippet_service import snippet_service
+
+MODELS = {
+    "code_snippets": CodeSnippet,
+    "code_context": CodeContext,
+    "code_context_chunks": CodeContextChunk,
+    "web_pages": WebPage,
+}
+
+
+async def sample_queries(model, count: int, noise: float) -> List[List[float]]:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(model.vector).where(model.vector.is_not(None)).order_by(func.random()).limit(count)
+        )
+        vectors = [list(v) for v in result.scalars().all()]
+    return [[x + random.gauss(0.0, noise) for x in v] for v in vectors]
+
+async def run_queries(model, queries, k: int, setup_sql: List[str], filters: list):
+    latencies, results = [], []
+    async with AsyncSessionLocal() as session:
+        for query in queries:
+            async with session.begin():
+                for sql in setup_sql:
+                    await session.execute(text(sql))
+                start = time.perf_counter()
+                result = await session.execute(
+                    select(model.id).where(*filters).order_by(distance(model.vector, query)).limit(k)
+                )
+                ids = set(result.scalars().all())
+                latencies.append((time.perf_counter() - start) * 1000)
+            results.append(ids)
+    return latencies, results
+
+def recall(truth: List[Set[int]], found: List[Set[int]]) -> float:
+    scores = [len(t & f) / len(t) for t, f in zip(truth, found) if t]
+    return statistics.mean(scores) if scores else 0.0
+
+def report(label: str, latencies: List[float], score: float):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{label:<22} recall {score:6.3f}   p50 {statistics.median(latencies):8.2f} ms   p95 {p95:8.2f} ms")
+
+async def main(table: str, queries: int, k: int, values: List[int], noise: float, category: Optional[str]):
+    model = MODELS[table]
+    index_type = settings.VECTOR_INDEX_TYPE
+    knob = "hnsw.ef_search" if index_type == "hnsw" else "ivfflat.probes"
+
+    filters, filter_sql = [], []
+    if category:
+        if model is not CodeSnippet:
+            raise SystemExit("--category only applies to code_snippets")
+        filters = snippet_service.build_filters(category=category)
+        if settings.VECTOR_ITERATIVE_SCAN != "off":
+            mode = settings.VECTOR_ITERATIVE_SCAN if index_type == "hnsw" else "relaxed_order"
+            filter_sql = [f"SET LOCAL {index_type}.iterative_scan = {mode}"]
+
+    query_vectors = await sample_queries(model, queries, noise)
+    if not query_vectors:
+        print(f"⚠️  {table} has no vectors to benchmark")
+        return
+    print(f"{table}: {len(query_vectors)} queries, k={k}, "
+          f"index={index_type}, metric={settings.VECTOR_METRIC}"
+          + (f", category={category}" if category else ""))
+    print()
+
+    exact_latencies, truth = await run_queries(
+        model, query_vectors, k,
+        ["SET LOCAL enable_indexscan = off", "SET LOCAL enable_bitmapscan = off"], filters
+    )
+    report("brute force", exact_latencies, 1.0)
+
+    for value in values:
+        latencies, found = await run_queries(
+            model, query_vectors, k, [f"SET LOCAL {knob} = {int(value)}", *filter_sql], filters
+        )
+        report(f"{knob}={value}", latencies, recall(truth, found))
+
+    await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ANN recall vs latency benchmark")
+    parser.add_argument("--table", choices=sorted(MODELS), default="code_snippets")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--values", default="10,20,40,80,160", help="ef_search (HNSW) or probes (IVFFlat) to sweep")
+    parser.add_argument("--noise", type=float, default=0.01)
+    parser.add_argument("--category", default=None, help="Benchmark filtered search on this category")
+    args = parser.parse_args()
+    values = [int(v) for v in args.values.split(",")]
+    asyncio.run(main(args.table, args.queries, args.k, values, args.noise, args.category))
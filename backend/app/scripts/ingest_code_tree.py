@@ -0,0 +1,156 @@
+"""
+Code tree ingestion into the code_context knowledge base.
+
+Walks a directory, chunks every supported file on component/function/CSS
+rule boundaries in a pool of worker processes (chunking is pure Python and
+CPU-bound, so threads would serialize on the GIL), then embeds the chunks
+in batches and stores each file as a CodeContext document with its chunks.
+
+Incremental: documents record their source path and content hash in
+metadata; unchanged files are skipped and changed ones are replaced.
+
+Usage:
+    python -m app.scripts.ingest_code_tree ../src --root-name frontend
+    python -m app.scripts.ingest_code_tree ../src --workers 8 --batch-size 16 --prune
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.models import CodeContext
+from app.services.chunker import chunk_files
+from app.services.embedding_registry import embedding_registry
+from app.services.http_client import http_pool
+from app.services.vector_service import vector_service
+
+SUPPORTED_EXTENSIONS = {".tsx", ".ts", ".jsx", ".js", ".mjs", ".cjs", ".css", ".scss"}
+SKIP_DIRS = {"node_modules", ".git", ".next", "dist", "build", "out", "coverage", "__pycache__"}
+
+
+def iter_code_files(base_dir: Path):
+    """Yield supported files under base_dir in a stable order."""
+    for root, dirs, files in os.walk(base_dir):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        for name in sorted(files):
+            file_path = Path(root) / name
+            if file_path.suffix in SUPPORTED_EXTENSIONS:
+                yield file_path
+
+def read_file(file_path: Path) -> Tuple[str, str]:
+    raw = file_path.read_bytes()
+    return raw.decode("utf-8", errors="replace"), hashlib.sha256(raw).hexdigest()
+
+async def load_manifest(root_name: str) -> Dict[str, Tuple[int, str]]:
+    """source_path -> (document id, content hash) of documents from this tree."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(CodeContext.id, CodeContext.metadata_)
+            .where(CodeContext.metadata_["root"].astext == root_name)
+        )
+        return {
+            meta["source_path"]: (doc_id, meta.get("content_hash"))
+            for doc_id, meta in result.all()
+            if meta and meta.get("source_path")
+        }
+
+async def ingest_tree(base_dir: Path, root_name: str, workers: int, batch_size: int, prune: bool):
+    if not base_dir.is_dir():
+        print(f"❌ Directory not found: {base_dir}")
+        return
+
+    start = time.perf_counter()
+    await embedding_registry.refresh()
+    manifest = await load_manifest(root_name)
+
+    # 1. Read files and keep new or changed ones
+    files: List[Tuple[str, str, str]] = []  # (source_path, content, content_hash)
+    seen = set()
+    for file_path in iter_code_files(base_dir):
+        source_path = file_path.relative_to(base_dir).as_posix()
+        seen.add(source_path)
+        try:
+            content, content_hash = await asyncio.to_thread(read_file, file_path)
+        except OSError as e:
+            print(f"❌ Failed to read {source_path}: {e}")
+            continue
+        known = manifest.get(source_path)
+        if known is None or known[1] != content_hash:
+            files.append((source_path, content, content_hash))
+    print(f"📂 {len(seen)} files in {base_dir}, {len(files)} new or changed")
+
+    # 2. Chunk in worker processes
+    chunk_start = time.perf_counter()
+    items = [(content, vector_service.file_type({"source_path": path})) for path, content, _ in files]
+    with ProcessPoolExecutor(max_workers=workers or None) as executor:
+        chunked = await chunk_files(
+            items,
+            max_lines=settings.CONTEXT_CHUNK_MAX_LINES,
+            overlap_lines=settings.CONTEXT_CHUNK_OVERLAP_LINES,
+            max_chars=settings.CONTEXT_CHUNK_MAX_CHARS,
+            executor=executor
+        )
+    total_chunks = sum(len(c) for c in chunked)
+    print(f"✂️  {total_chunks} chunks in {time.perf_counter() - chunk_start:.2f}s")
+
+    # 3. Embed and write, one transaction per batch (replaced documents go in the same one)
+    written = failed = 0
+    try:
+        for i in range(0, len(files), batch_size):
+            batch = files[i:i + batch_size]
+            documents = [
+                (content, {"root": root_name, "source_path": path, "content_hash": content_hash}, chunks)
+                for (path, content, content_hash), chunks in zip(batch, chunked[i:i + batch_size])
+                if chunks
+            ]
+            async with AsyncSessionLocal() as session:
+                try:
+                    docs = await vector_service.ingest_chunked(session, documents)
+                    stored = {doc.metadata_["source_path"] for doc in docs}
+                    await vector_service.delete_documents(
+                        session, [manifest[path][0] for path in stored if path in manifest]
+                    )
+                    await session.commit()
+                except Exception as e:
+                    await session.rollback()
+                    print(f"❌ Failed to write batch of {len(documents)}: {e}")
+                    failed += len(documents)
+                    continue
+            written += len(docs)
+            failed += len(documents) - len(docs)
+            for path in sorted(stored):
+                print(f"✅ Ingested: {path}")
+
+        # 4. Drop documents whose file is gone (only after a non-empty scan)
+        deleted = 0
+        if prune and seen:
+            gone = [doc_id for path, (doc_id, _) in manifest.items() if path not in seen]
+            async with AsyncSessionLocal() as session:
+                await vector_service.delete_documents(session, gone)
+                await session.commit()
+            deleted = len(gone)
+    finally:
+        await http_pool.aclose()
+
+    print()
+    print(f"✨ Done in {time.perf_counter() - start:.2f}s: {written} documents written, "
+          f"{len(seen) - len(files)} unchanged, {deleted} deleted, {failed} failed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunk, embed and store a code tree as knowledge-base documents")
+    parser.add_argument("path", help="Directory to ingest")
+    parser.add_argument("--root-name", help="Name recorded on the documents (default: directory name)")
+    parser.add_argument("--workers", type=int, default=settings.CHUNK_WORKERS, help="Chunking processes (0 = CPU count)")
+    parser.add_argument("--batch-size", type=int, default=16, help="Files per embedding call and per commit")
+    parser.add_argument("--prune", action="store_true", help="Delete documents whose source file is gone")
+    args = parser.parse_args()
+
+    base_dir = Path(args.path).resolve()
+    asyncio.run(ingest_tree(base_dir, args.root_name or base_dir.name, max(0, args.workers),
+                            max(1, args.batch_size), args.prune))
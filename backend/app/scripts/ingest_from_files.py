@@ -2,14 +2,31 @@
 File-based snippet ingestion script.
 Scans the snippets/ directory and ingests all code files.
 
+Files stream through a pipeline of stages connected by bounded queues:
+discovery -> metadata parsing -> batched embedding (bounded concurrency)
+-> bulk upsert with one commit per batch.
+
+Ingestion is incremental: each row records its source path, content hash
+and mtime. Files whose mtime is unchanged are skipped without being read,
+files whose content hash is unchanged only get their mtime refreshed, and
+only new or modified files are embedded.
+
 Usage:
-    python -m app.scripts.ingest_from_files
+    python -m app.scripts.ingest_from_files [--workers 4] [--batch-size 32] [--prune]
 """
+import argparse
 import asyncio
+import hashlib
 import os
 import re
+import time
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Dict, Iterator, Optional, Set, Tuple
 from app.core.database import AsyncSessionLocal
+from app.services.embedding_registry import EmbeddingState, embedding_registry
+from app.services.http_client import http_pool
+from app.services.llm_service import llm_service
 from app.services.snippet_service import snippet_service
 
 # Base directory for snippets
@@ -27,6 +44,9 @@ CATEGORY_MAP = {
 # Supported file extensions
 SUPPORTED_EXTENSIONS = {".tsx", ".ts", ".jsx", ".js", ".css", ".json"}
 
+# Queue sentinel marking the end of a stage's output
+_DONE = None
+
 def parse_metadata_from_content(content: str) -> dict:
     """
     Extract metadata from comment block at the top of the file.
@@ -111,78 +131,234 @@ def infer_metadata_from_path(file_path: Path, base_dir: Path) -> dict:
     
     return metadata
 
-async def ingest_file(session, file_path: Path, base_dir: Path):
-    """Ingest a single code file."""
-    try:
-        # Read file content
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code = f.read()
-        
-        # Parse metadata from content
-        content_metadata = parse_metadata_from_content(code)
-        
-        # Infer metadata from path
-        path_metadata = infer_metadata_from_path(file_path, base_dir)
-        
-        # Merge metadata (content takes precedence)
-        metadata = {**path_metadata, **content_metadata}
-        
-        # Default description if not provided
-        if 'description' not in metadata:
-            metadata['description'] = f"A {metadata['subcategory']} {metadata['category']}"
-        
-        # Ingest snippet
-        snippet = await snippet_service.ingest_snippet(
-            session=session,
-            name=metadata['name'],
-            category=metadata['category'],
-            subcategory=metadata['subcategory'],
-            code=code,
-            description=metadata['description'],
-            tags=metadata.get('tags', []),
-            framework=metadata.get('framework', 'nextjs')
-        )
-        
-        print(f"✅ Ingested: {metadata['name']} ({file_path.relative_to(base_dir)})")
-        return snippet
-        
-    except Exception as e:
-        print(f"❌ Failed to ingest {file_path}: {e}")
-        return None
+def iter_snippet_files(base_dir: Path) -> Iterator[Path]:
+    """Yield supported files under base_dir in a stable order."""
+    for root, dirs, files in os.walk(base_dir):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = Path(root) / name
+            if file_path.suffix in SUPPORTED_EXTENSIONS:
+                yield file_path
+
+def parse_file(file_path: Path, base_dir: Path) -> dict:
+    """Read a code file and build the snippet record to ingest."""
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+        mtime = os.fstat(f.fileno()).st_mtime
+    code = raw.decode('utf-8')
+    
+    # Parse metadata from content
+    content_metadata = parse_metadata_from_content(code)
+    
+    # Infer metadata from path
+    path_metadata = infer_metadata_from_path(file_path, base_dir)
+    
+    # Merge metadata (content takes precedence)
+    metadata = {**path_metadata, **content_metadata}
+    
+    # Default description if not provided
+    if 'description' not in metadata:
+        metadata['description'] = f"A {metadata['subcategory']} {metadata['category']}"
+    
+    return {
+        'source_path': file_path.relative_to(base_dir).as_posix(),
+        'content_hash': hashlib.sha256(raw).hexdigest(),
+        'source_mtime': mtime,
+        'name': metadata['name'],
+        'category': metadata['category'],
+        'subcategory': metadata['subcategory'],
+        'code': code,
+        'description': metadata['description'],
+        'tags': metadata.get('tags', []),
+        'framework': metadata.get('framework', 'nextjs'),
+    }
+
+Manifest = Dict[str, Tuple[Optional[str], Optional[float]]]
+
+@dataclass
+class IngestStats:
+    discovered: int = 0
+    unchanged: int = 0
+    touched: int = 0
+    parsed: int = 0
+    embedded: int = 0
+    upserted: int = 0
+    deleted: int = 0
+    skipped: int = 0  # vanished or unreadable between listing and reading
+    failed: int = 0
+    batches: int = 0
+    embed_seconds: float = 0.0
+    db_seconds: float = 0.0
+
+async def discover_stage(base_dir: Path, out_q: asyncio.Queue, manifest: Manifest,
+                         seen: Set[str], stats: IngestStats):
+    for file_path in iter_snippet_files(base_dir):
+        stats.discovered += 1
+        source_path = file_path.relative_to(base_dir).as_posix()
+        seen.add(source_path)
+        # Fast path: same mtime as last run, don't even read the file
+        known = manifest.get(source_path)
+        try:
+            mtime = file_path.stat().st_mtime
+        except OSError as e:
+            print(f"⚠️  Skipping {file_path}: {e}")
+            stats.skipped += 1
+            continue
+        if known and known[1] == mtime:
+            stats.unchanged += 1
+            continue
+        await out_q.put(file_path)
+    await out_q.put(_DONE)
+
+async def parse_stage(base_dir: Path, in_q: asyncio.Queue, out_q: asyncio.Queue, manifest: Manifest,
+                      touched: Dict[str, float], batch_size: int, workers: int, stats: IngestStats):
+    batch = []
+    while (file_path := await in_q.get()) is not _DONE:
+        try:
+            record = await asyncio.to_thread(parse_file, file_path, base_dir)
+        except OSError as e:
+            print(f"⚠️  Skipping {file_path}: {e}")
+            stats.skipped += 1
+            continue
+        except Exception as e:
+            print(f"❌ Failed to read {file_path}: {e}")
+            stats.failed += 1
+            continue
+        stats.parsed += 1
+
+        # Content unchanged (e.g. file was touched): only refresh the mtime
+        known = manifest.get(record['source_path'])
+        if known and known[0] == record['content_hash']:
+            touched[record['source_path']] = record['source_mtime']
+            stats.touched += 1
+            continue
+
+        batch.append(record)
+        if len(batch) >= batch_size:
+            await out_q.put(batch)
+            batch = []
+    if batch:
+        await out_q.put(batch)
+    # One sentinel per embedding worker
+    for _ in range(workers):
+        await out_q.put(_DONE)
 
-async def scan_and_ingest():
-    """Scan the snippets directory and ingest all files."""
+async def embed_stage(in_q: asyncio.Queue, out_q: asyncio.Queue, state: EmbeddingState, stats: IngestStats):
+    while (batch := await in_q.get()) is not _DONE:
+        texts = [
+            snippet_service.build_embedding_text(r['name'], r['description'], r['code'])
+            for r in batch
+        ]
+        start = time.perf_counter()
+        vectors = await llm_service.get_embeddings(texts, model=state.model)
+        stats.embed_seconds += time.perf_counter() - start
+
+        embedded = []
+        for record, vector in zip(batch, vectors):
+            if vector:
+                record['vector'] = vector
+                embedded.append(record)
+            else:
+                print(f"❌ Failed to embed {record['source_path']}")
+                stats.failed += 1
+        stats.embedded += len(embedded)
+        if embedded:
+            await out_q.put(embedded)
+    await out_q.put(_DONE)
+
+async def write_stage(in_q: asyncio.Queue, workers: int, state: EmbeddingState, stats: IngestStats):
+    remaining = workers
+    async with AsyncSessionLocal() as session:
+        while remaining:
+            batch = await in_q.get()
+            if batch is _DONE:
+                remaining -= 1
+                continue
+
+            start = time.perf_counter()
+            try:
+                ids = await snippet_service.upsert_snippets(session, batch, state)
+            except Exception as e:
+                await session.rollback()
+                print(f"❌ Failed to write batch of {len(batch)}: {e}")
+                stats.failed += len(batch)
+                continue
+            finally:
+                stats.db_seconds += time.perf_counter() - start
+
+            stats.upserted += len(ids)
+            stats.batches += 1
+            for record in batch:
+                print(f"✅ Ingested: {record['name']} ({record['source_path']})")
+
+def print_stats(stats: IngestStats, elapsed: float):
+    rate = stats.discovered / elapsed if elapsed > 0 else 0.0
+    print()
+    print(f"✨ Ingestion complete! {stats.upserted} new or modified files ingested, "
+          f"{stats.unchanged + stats.touched} unchanged.")
+    print(f"   discovered={stats.discovered} unchanged={stats.unchanged} touched={stats.touched} "
+          f"parsed={stats.parsed} embedded={stats.embedded} deleted={stats.deleted} "
+          f"skipped={stats.skipped} failed={stats.failed} batches={stats.batches}")
+    print(f"   elapsed={elapsed:.2f}s throughput={rate:.1f} files/s "
+          f"embed={stats.embed_seconds:.2f}s db={stats.db_seconds:.2f}s")
+
+async def scan_and_ingest(workers: int = 4, batch_size: int = 32, prune: bool = False):
+    """Scan the snippets directory and ingest new or modified files."""
     if not SNIPPETS_DIR.exists():
         print(f"❌ Snippets directory not found: {SNIPPETS_DIR}")
         print(f"Please create the directory and add your code files.")
         return
     
-    # Find all supported files
-    files_to_ingest = []
-    for ext in SUPPORTED_EXTENSIONS:
-        files_to_ingest.extend(SNIPPETS_DIR.rglob(f"*{ext}"))
-    
-    if not files_to_ingest:
+    workers = max(1, workers)
+    batch_size = max(1, batch_size)
+    stats = IngestStats()
+    seen: Set[str] = set()
+    touched: Dict[str, float] = {}
+
+    # Embed with the snippets collection's registered model for the whole run
+    await embedding_registry.refresh()
+    state = embedding_registry.state("snippets")
+    async with AsyncSessionLocal() as session:
+        manifest = await snippet_service.load_manifest(session)
+
+    paths_q: asyncio.Queue = asyncio.Queue(maxsize=batch_size * workers * 2)
+    records_q: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    embedded_q: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(
+            discover_stage(SNIPPETS_DIR, paths_q, manifest, seen, stats),
+            parse_stage(SNIPPETS_DIR, paths_q, records_q, manifest, touched, batch_size, workers, stats),
+            *(embed_stage(records_q, embedded_q, state, stats) for _ in range(workers)),
+            write_stage(embedded_q, workers, state, stats),
+        )
+    finally:
+        await http_pool.aclose()
+
+    async with AsyncSessionLocal() as session:
+        await snippet_service.touch_snippets(session, touched)
+        # Only prune after a complete scan, never on an empty/missing tree
+        if prune and seen:
+            stats.deleted = await snippet_service.delete_missing_sources(session, seen)
+    elapsed = time.perf_counter() - start
+
+    if stats.discovered == 0:
         print(f"⚠️  No code files found in {SNIPPETS_DIR}")
         print(f"Supported extensions: {', '.join(SUPPORTED_EXTENSIONS)}")
         return
-    
-    print(f"Found {len(files_to_ingest)} files to ingest...")
-    print()
-    
-    async with AsyncSessionLocal() as session:
-        ingested_count = 0
-        for file_path in files_to_ingest:
-            result = await ingest_file(session, file_path, SNIPPETS_DIR)
-            if result:
-                ingested_count += 1
-        
-        print()
-        print(f"✨ Ingestion complete! {ingested_count}/{len(files_to_ingest)} files ingested successfully.")
+
+    print_stats(stats, elapsed)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest snippet files into the database")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent embedding batches")
+    parser.add_argument("--batch-size", type=int, default=32, help="Snippets per embedding call and per commit")
+    parser.add_argument("--prune", action="store_true", help="Delete snippets whose source file is gone")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("GitFolio AI - File-Based Snippet Ingestion")
     print("=" * 60)
     print()
-    asyncio.run(scan_and_ingest())
+    asyncio.run(scan_and_ingest(args.workers, args.batch_size, args.prune))
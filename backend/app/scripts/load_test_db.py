@@ -0,0 +1,101 @@
+"""
+Load test: database connection usage of a chat-edit style request under
+concurrency, with the session held across the (simulated) LLM call versus
+short scoped transactions before and after it.
+
+Each request does a short query, awaits a fake LLM call, then does a short
+write-sized query. The pool is sampled throughout; holding the session
+pins a connection for the whole LLM wait, so concurrency beyond
+DB_POOL_SIZE + DB_MAX_OVERFLOW queues on the pool or times out.
+Needs only a reachable DATABASE_URL (no schema).
+
+Usage:
+    python -m app.scripts.load_test_db --requests 200 --concurrency 50 --llm-ms 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, engine, session_scope
+
+
+async def held(query_s: float, llm_s: float):
+    async with AsyncSessionLocal() as session:
+        await session.execute(text("SELECT pg_sleep(:s)"), {"s": query_s})
+        await asyncio.sleep(llm_s)  # LLM call with the transaction open
+        await session.execute(text("SELECT pg_sleep(:s)"), {"s": query_s})
+        await session.commit()
+
+
+async def scoped(query_s: float, llm_s: float):
+    async with session_scope() as session:
+        await session.execute(text("SELECT pg_sleep(:s)"), {"s": query_s})
+    await asyncio.sleep(llm_s)  # no connection held
+    async with session_scope() as session:
+        await session.execute(text("SELECT pg_sleep(:s)"), {"s": query_s})
+
+
+async def run(label: str, handler, total: int, concurrency: int, query_s: float, llm_s: float):
+    samples, latencies = [], []
+    timeouts = errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+
+    async def sample():
+        while not stop.is_set():
+            samples.append(engine.pool.checkedout())
+            await asyncio.sleep(0.01)
+
+    async def one():
+        nonlocal timeouts, errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await handler(query_s, llm_s)
+            except PoolTimeoutError:
+                timeouts += 1
+                return
+            except Exception as e:
+                errors += 1
+                print(f"   request failed: {e}")
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    sampler = asyncio.create_task(sample())
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+
+    latencies.sort()
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)] if latencies else float("nan")
+    print(
+        f"{label:<7} {total / elapsed:>7.1f} req/s   p50 {statistics.median(latencies) if latencies else float('nan'):>8.1f} ms   "
+        f"p99 {p99:>8.1f} ms   connections peak {max(samples, default=0):>3} "
+        f"mean {statistics.fmean(samples) if samples else 0:>5.1f}   pool timeouts {timeouts}   errors {errors}"
+    )
+
+
+async def main(total: int, concurrency: int, query_ms: float, llm_ms: float):
+    print(
+        f"Pool: size {settings.DB_POOL_SIZE} + overflow {settings.DB_MAX_OVERFLOW}, "
+        f"timeout {settings.DB_POOL_TIMEOUT_SECONDS:.0f}s. "
+        f"{total} requests at concurrency {concurrency}, LLM {llm_ms:.0f} ms.\n"
+    )
+    await run("held", held, total, concurrency, query_ms / 1000, llm_ms / 1000)
+    await run("scoped", scoped, total, concurrency, query_ms / 1000, llm_ms / 1000)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare DB connection usage: held vs scoped sessions")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--query-ms", type=float, default=5.0, help="Duration of each DB phase")
+    parser.add_argument("--llm-ms", type=float, default=2000.0, help="Simulated LLM call between DB phases")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.query_ms, args.llm_ms))
@@ -0,0 +1,71 @@
+"""
+Move an embedding collection to another model without downtime (see
+app/services/embedding_migration.py). Rows are re-embedded into the spare
+vector column while the app keeps serving the current model; the switch is
+a single registry update picked up by every process within
+EMBEDDING_REGISTRY_REFRESH_SECONDS. Interrupted runs resume where they
+stopped when started again.
+
+Collections: snippets, context, pages, response_cache.
+
+Usage:
+    python -m app.scripts.migrate_embeddings --status
+    python -m app.scripts.migrate_embeddings snippets --model mxbai-embed-large --dim 1024
+    python -m app.scripts.migrate_embeddings context --model nomic-embed-text --rows-per-second 20
+    python -m app.scripts.migrate_embeddings context              # resume
+    python -m app.scripts.migrate_embeddings context --abort
+"""
+import argparse
+import asyncio
+import time
+from typing import Optional
+from app.core.config import settings
+from app.core.database import engine
+from app.services.embedding_migration import embedding_migrator
+from app.services.embedding_registry import COLLECTIONS
+from app.services.http_client import http_pool
+
+
+async def print_status():
+    for row in await embedding_migrator.status():
+        line = f"{row['name']:<16} {row['model']} ({row['dim']}d) in {row['column']}: {row['status']}"
+        if row["target_model"]:
+            line += f" -> {row['target_model']} ({row['target_dim']}d), {row['rows_done']} rows re-embedded"
+        skipped = row["checkpoint"].get("skipped")
+        if skipped:
+            line += f", could not embed: {skipped}"
+        print(line)
+
+async def main(collection: Optional[str], model: Optional[str], dim: Optional[int], status: bool, abort: bool):
+    start = time.perf_counter()
+    try:
+        if status or not collection:
+            await print_status()
+        elif abort:
+            await embedding_migrator.abort(collection)
+        else:
+            await embedding_migrator.run(collection, model, dim)
+            print(f"✨ Done in {time.perf_counter() - start:.1f}s")
+            await print_status()
+    except ValueError as e:
+        print(f"❌ {e}")
+    finally:
+        await http_pool.aclose()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-embed a collection with another model and switch to it online")
+    parser.add_argument("collection", nargs="?", choices=list(COLLECTIONS), help="Collection to migrate")
+    parser.add_argument("--model", help="Target embedding model (omit to resume a migration in progress)")
+    parser.add_argument("--dim", type=int, help="Expected dimension (checked against the model's output)")
+    parser.add_argument("--batch-size", type=int, default=settings.EMBED_MIGRATION_BATCH_SIZE,
+                        help="Rows per embedding call and per commit")
+    parser.add_argument("--rows-per-second", type=float, default=settings.EMBED_MIGRATION_ROWS_PER_SECOND,
+                        help="Re-embedding throttle (0 = unthrottled)")
+    parser.add_argument("--status", action="store_true", help="Show every collection's model and migration state")
+    parser.add_argument("--abort", action="store_true", help="Cancel a migration that has not switched yet")
+    args = parser.parse_args()
+
+    embedding_migrator.batch_size = max(1, args.batch_size)
+    embedding_migrator.rows_per_second = max(0.0, args.rows_per_second)
+    asyncio.run(main(args.collection, args.model, args.dim, args.status, args.abort))
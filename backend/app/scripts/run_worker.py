@@ -0,0 +1,45 @@
+"""
+Standalone generation worker. Run any number of these (on any hosts) next
+to API processes started with JOB_WORKERS=0; jobs are shared through the
+generation_jobs table.
+
+Usage:
+    python -m app.scripts.run_worker [--concurrency 4]
+"""
+import argparse
+import asyncio
+from app.core.config import settings
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_registry import embedding_registry
+from app.services.http_client import http_pool
+from app.services.job_queue import JobWorker
+from app.services.page_embedder import page_embedder
+from app.services.snippet_index import snippet_index
+from app.services.usage_tracker import usage_tracker
+
+async def run(concurrency: int):
+    worker = JobWorker(concurrency=concurrency, poll_interval=settings.JOB_POLL_INTERVAL_SECONDS)
+    await embedding_registry.start()
+    usage_tracker.start()
+    snippet_index.start()
+    worker.start()
+    print(f"Generation worker running with {concurrency} slot(s). Press Ctrl+C to stop.")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker.stop()
+        await page_embedder.stop()
+        await snippet_index.stop()
+        await embedding_registry.stop()
+        await usage_tracker.stop()
+        await http_pool.aclose()
+        embedding_cache.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background portfolio generation workers")
+    parser.add_argument("--concurrency", type=int, default=max(1, settings.JOB_WORKERS))
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.concurrency))
+    except KeyboardInterrupt:
+        pass
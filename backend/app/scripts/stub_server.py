@@ -0,0 +1,177 @@
+"""
+Local stub for the upstream AI backends (Ollama + OpenAI-compatible APIs).
+Used by the benchmark scripts so they can run without network access.
+
+Usage:
+    python -m app.scripts.stub_server --port 11500 --latency-ms 5
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from typing import List, Optional
+
+EMBEDDING_DIM = 1024
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    """Deterministic pseudo-embedding so repeated texts map to the same vector."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    return [rng.uniform(-1.0, 1.0) for _ in range(dim)]
+
+
+class StubServer:
+    """
+    Minimal HTTP/1.1 server with keep-alive support.
+
+    Routes:
+        POST /api/embeddings          Ollama single embedding
+        POST /api/embed               Ollama batch embedding
+        POST /v1/chat/completions     OpenAI-compatible completion (SSE when "stream": true)
+        POST /api/chat                Ollama chat (NDJSON unless "stream": false)
+
+    `fail_rate` makes that share of requests answer 500, for exercising
+    fallbacks and circuit breakers.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0,
+                 completion: Optional[str] = None, fail_rate: float = 0.0, seed: int = 0):
+        self.host = host
+        self.port = port
+        self.latency = latency_ms / 1000.0
+        self.fail_rate = fail_rate
+        self._random = random.Random(seed)
+        self.completion = completion or json.dumps([
+            {"filename": "app/page.tsx", "content": "export default function Page() { return <main />; }"}
+        ])
+        self.connections = 0
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = b""
+                if "content-length" in headers:
+                    body = await reader.readexactly(int(headers["content-length"]))
+
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if self.fail_rate and self._random.random() < self.fail_rate:
+                    status, payload = "500 Internal Server Error", {"error": "injected failure"}
+                elif method == "POST" and path == "/v1/chat/completions" and json.loads(body or b"{}").get("stream"):
+                    await self._stream_completion(writer)
+                    break
+                elif method == "POST" and path == "/api/chat" and json.loads(body or b"{}").get("stream", True):
+                    await self._stream_ollama_chat(writer)
+                    break
+                else:
+                    status, payload = self._route(method, path, body)
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\nConnection: keep-alive\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _stream_completion(self, writer: asyncio.StreamWriter, chunk_size: int = 16):
+        """OpenAI-style SSE stream; the connection closes when it ends."""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n\r\n"
+            b": keep-alive comment\n\n"
+        )
+        for i in range(0, len(self.completion), chunk_size):
+            event = {"choices": [{"delta": {"content": self.completion[i:i + chunk_size]}}]}
+            writer.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            await writer.drain()
+            await asyncio.sleep(0)
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
+
+    async def _stream_ollama_chat(self, writer: asyncio.StreamWriter, chunk_size: int = 16):
+        """Ollama-style NDJSON stream; the connection closes when it ends."""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n")
+        for i in range(0, len(self.completion), chunk_size):
+            event = {"message": {"role": "assistant", "content": self.completion[i:i + chunk_size]}, "done": False}
+            writer.write((json.dumps(event) + "\n").encode("utf-8"))
+            await writer.drain()
+            await asyncio.sleep(0)
+        writer.write((json.dumps({"message": {"role": "assistant", "content": ""}, "done": True}) + "\n").encode("utf-8"))
+        await writer.drain()
+
+    def _route(self, method: str, path: str, body: bytes):
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            return "400 Bad Request", {"error": "invalid json"}
+
+        if method == "POST" and path == "/api/embeddings":
+            return "200 OK", {"embedding": fake_embedding(payload.get("prompt", ""))}
+        if method == "POST" and path == "/api/embed":
+            inputs = payload.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            return "200 OK", {"model": payload.get("model"), "embeddings": [fake_embedding(t) for t in inputs]}
+        if method == "POST" and path == "/api/chat":
+            return "200 OK", {"message": {"role": "assistant", "content": self.completion}, "done": True}
+        if method == "POST" and path == "/v1/chat/completions":
+            return "200 OK", {
+                "choices": [{"message": {"role": "assistant", "content": self.completion}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0}
+            }
+        return "404 Not Found", {"error": f"no route for {method} {path}"}
+
+
+async def serve(port: int, latency_ms: float, fail_rate: float):
+    server = StubServer(port=port, latency_ms=latency_ms, fail_rate=fail_rate)
+    await server.start()
+    print(f"Stub server listening on {server.base_url}")
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub for Ollama/OpenRouter")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    args = parser.parse_args()
+    asyncio.run(serve(args.port, args.latency_ms, args.fail_rate))
@@ -0,0 +1,124 @@
+"""
+Bring an existing database up to the models: create missing tables, add
+columns the models gained since the tables were created (manifest and
+content-hash columns, generated search columns such as
+code_snippets.search_vector, the spare vector_alt columns used by embedding
+model migrations, ...), then create the ANN (and supporting GIN) indexes
+declared on the models (see app/core/vector_index.py) and optionally drop
+vector indexes left over from another index type/metric. Plain and unique
+indexes declared on the models (e.g. one active web_pages version per file)
+are created too. Every step is idempotent.
+
+Tables whose collection was migrated to vector_alt (see
+embedding_collections) get their ANN indexes on that column instead.
+
+Usage:
+    python -m app.scripts.sync_vector_indexes [--drop-stale]
+"""
+import argparse
+import asyncio
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn, CreateIndex
+from app.core.database import engine, Base
+from app.models import models  # noqa: F401  (registers tables on Base.metadata)
+from app.core.vector_index import EMBEDDING_DIM
+from app.services.embedding_migration import ann_indexes
+from app.services.embedding_registry import COLLECTIONS, SLOTS, spare_column
+
+VECTOR_INDEX_METHODS = ("hnsw", "ivfflat")
+SEARCH_INDEX_METHODS = VECTOR_INDEX_METHODS + ("gin",)
+
+
+def declared_search_indexes():
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.dialect_options["postgresql"]["using"] in SEARCH_INDEX_METHODS:
+                yield table, index
+
+def declared_btree_indexes():
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if not index.dialect_options["postgresql"]["using"]:
+                yield table, index
+
+def declared_columns():
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            if not column.primary_key:
+                yield table, column
+
+async def registry_slots(conn) -> tuple:
+    """
+    (table -> (column, dim) for tables not served from the declared
+    Vector(EMBEDDING_DIM) "vector" column, names of indexes a migration in
+    progress has built or will build on the spare column).
+    """
+    exists = (await conn.execute(text("SELECT to_regclass('embedding_collections')"))).scalar_one()
+    if exists is None:
+        return {}, set()
+    result = await conn.execute(text(
+        "SELECT name, active_column, dim, status, target_dim FROM embedding_collections"
+    ))
+    moved, migrating = {}, set()
+    for name, column, dim, status, target_dim in result.all():
+        for table in COLLECTIONS.get(name, []):
+            if column != SLOTS[0] or dim != EMBEDDING_DIM:
+                moved[table] = (column, dim)
+            if status in ("backfilling", "indexing") and target_dim:
+                migrating.update(index.name for index in ann_indexes(table, spare_column(column), target_dim))
+    return moved, migrating
+
+async def sync_indexes(drop_stale: bool = False):
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        print("Ensuring tables...")
+        await conn.run_sync(Base.metadata.create_all)
+        # create_all skips existing tables, so columns added to a model later are added here
+        for table, column in declared_columns():
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            await conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN IF NOT EXISTS {ddl}'))
+
+        # Declared indexes are on "vector"; migrated tables need theirs on the active slot
+        moved, migrating = await registry_slots(conn)
+        declared = [
+            (table, index) for table, index in declared_search_indexes()
+            if table.name not in moved or index.dialect_options["postgresql"]["using"] == "gin"
+        ]
+        for table_name, (column, dim) in moved.items():
+            table = Base.metadata.tables[table_name]
+            declared += [(table, index) for index in ann_indexes(table_name, column, dim)]
+        declared_names = {index.name for _, index in declared}
+
+        for table, index in declared:
+            print(f"Ensuring {index.name} on {table.name}...")
+            await conn.execute(CreateIndex(index, if_not_exists=True))
+        for table, index in declared_btree_indexes():
+            print(f"Ensuring {'unique ' if index.unique else ''}{index.name} on {table.name}...")
+            try:
+                async with conn.begin_nested():
+                    await conn.execute(CreateIndex(index, if_not_exists=True))
+            except IntegrityError as e:
+                print(f"❌ Could not create {index.name}; existing rows violate it: {e.orig}")
+
+        result = await conn.execute(text(
+            "SELECT tablename, indexname FROM pg_indexes "
+            "WHERE schemaname = current_schema() "
+            "AND (indexdef ILIKE '%USING hnsw%' OR indexdef ILIKE '%USING ivfflat%')"
+        ))
+        stale = [(t, i) for t, i in result.all() if i not in declared_names | migrating]
+        for table_name, index_name in stale:
+            if drop_stale:
+                print(f"Dropping stale index {index_name} on {table_name}")
+                await conn.execute(text(f'DROP INDEX IF EXISTS "{index_name}"'))
+            else:
+                print(f"Stale index {index_name} on {table_name} (use --drop-stale to remove)")
+
+    await engine.dispose()
+    print("✨ Tables, columns and indexes are in sync.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create missing tables, columns and indexes to match the models")
+    parser.add_argument("--drop-stale", action="store_true", help="Drop vector indexes not declared on the models")
+    args = parser.parse_args()
+    asyncio.run(sync_indexes(args.drop_stale))
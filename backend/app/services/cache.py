@@ -1,33 +1,100 @@
 import asyncio
+import inspect
 from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional
 from cachetools import TTLCache
 from cachetools.keys import hashkey
 
-# Cache with 100 items limit, 60 minutes TTL
-response_cache = TTLCache(maxsize=100, ttl=3600)
 
-def async_cache(cache):
+def is_positive(result: Any) -> bool:
+    """Default cache policy: None and empty results (e.g. `[]` on error) are negative."""
+    if result is None:
+        return False
+    try:
+        return len(result) > 0
+    except TypeError:
+        return True
+
+def async_cache(
+    cache: Optional[TTLCache] = None,
+    *,
+    maxsize: int = 100,
+    ttl: float = 3600,
+    key: Optional[Callable[..., Hashable]] = None,
+    cache_if: Callable[[Any], bool] = is_positive,
+    negative_ttl: Optional[float] = None,
+):
     """
     Decorator to cache async function responses.
+
+    - Each decorated function gets its own TTLCache(maxsize, ttl) unless a
+      cache is passed explicitly.
+    - Single-flight: concurrent callers with the same key share one
+      in-flight call instead of all hitting the upstream.
+    - Results rejected by `cache_if` (empty/failed by default) are not
+      cached, or cached for `negative_ttl` seconds when that is set.
+    - `key` builds the cache key from the call arguments. For methods,
+      `self`/`cls` is never part of the key.
+    - `wrapper.stats` counts hits, misses and calls that joined an in-flight one.
     """
     def decorator(func):
+        positive_cache = cache if cache is not None else TTLCache(maxsize=maxsize, ttl=ttl)
+        negative_cache = TTLCache(maxsize=maxsize, ttl=negative_ttl) if negative_ttl else None
+        inflight: Dict[Hashable, asyncio.Task] = {}
+        key_func = key or hashkey
+        stats = {"hits": 0, "misses": 0, "shared": 0}  # shared = joined an in-flight call
+
+        params = list(inspect.signature(func).parameters)
+        skip_first = bool(params) and params[0] in ("self", "cls")
+
+        def store(cache_key: Hashable, task: asyncio.Task):
+            inflight.pop(cache_key, None)
+            if task.cancelled() or task.exception() is not None:
+                return
+            result = task.result()
+            if cache_if(result):
+                positive_cache[cache_key] = result
+            elif negative_cache is not None:
+                negative_cache[cache_key] = result
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # Create a cache key based on positional and keyword arguments
-            # We exclude 'self' from the key if it's a method by not modifying args handling
-            # hashkey handles *args and **kwargs. 
-            # Note: If valid usage involves 'self' (instance methods), hashkey includes it.
-            # For services that are singletons or stateless, this is fine.
-            key = hashkey(*args, **kwargs)
-            
-            if key in cache:
-                return cache[key]
-            
-            # Call the async function
-            result = await func(*args, **kwargs)
-            
-            # Store result in cache
-            cache[key] = result
-            return result
+            key_args = args[1:] if skip_first else args
+            cache_key = key_func(*key_args, **kwargs)
+
+            try:
+                result = positive_cache[cache_key]
+                stats["hits"] += 1
+                return result
+            except KeyError:
+                pass
+            if negative_cache is not None:
+                try:
+                    result = negative_cache[cache_key]
+                    stats["hits"] += 1
+                    return result
+                except KeyError:
+                    pass
+
+            task = inflight.get(cache_key)
+            if task is not None:
+                stats["shared"] += 1
+            else:
+                stats["misses"] += 1
+                # Run as a task so one caller's cancellation doesn't cancel the others
+                task = asyncio.ensure_future(func(*args, **kwargs))
+                inflight[cache_key] = task
+                task.add_done_callback(lambda t: store(cache_key, t))
+            return await asyncio.shield(task)
+
+        def cache_clear():
+            positive_cache.clear()
+            if negative_cache is not None:
+                negative_cache.clear()
+
+        wrapper.cache = positive_cache
+        wrapper.negative_cache = negative_cache
+        wrapper.cache_clear = cache_clear
+        wrapper.stats = stats
         return wrapper
     return decorator
@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import re
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+# Top-level declarations that start a new chunk in TS/TSX/JS files
+_CODE_BOUNDARY_RE = re.compile(
+    r"^(export\s+)?(default\s+)?(async\s+)?"
+    r"(function\*?\s+(?P<fn>\w+)|class\s+(?P<cls>\w+)|interface\s+(?P<iface>\w+)|"
+    r"type\s+(?P<type>\w+)|(const|let|var)\s+(?P<var>\w+)|enum\s+(?P<enum>\w+))"
+)
+# Top-level rule or at-rule opening a block in CSS files
+_CSS_BOUNDARY_RE = re.compile(r"^(?P<selector>[^\s{}][^{}]*?)\s*\{")
+# Statement-level lines inside a long component where a cut keeps both halves readable
+_CODE_INNER_RE = re.compile(r"^(return\s*\(|if\s*\(|for\s*\(|switch\s*\(|use[A-Z]\w*\(|<[A-Za-z])")
+_CLOSERS = {"}", "};", ")", ");", "})", "});", "/>", "</>"}
+
+CODE_TYPES = {"tsx", "ts", "jsx", "js", "mjs", "cjs"}
+CSS_TYPES = {"css", "scss"}
+
+
+@dataclass
+class Chunk:
+    index: int
+    start_line: int  # 1-based, inclusive
+    end_line: int
+    content: str
+    symbol: Optional[str] = None  # component/function name or CSS selector
+
+    @property
+    def content_hash(self) -> str:
+        return hashlib.sha256(self.content.encode("utf-8")).hexdigest()
+
+
+def _boundary(line: str, file_type: str):
+    """(is_boundary, symbol) for a line at column 0."""
+    if not line or line[0].isspace():
+        return False, None
+    if file_type in CODE_TYPES:
+        match = _CODE_BOUNDARY_RE.match(line)
+        if match:
+            symbol = next((v for v in match.groupdict().values() if v), None)
+            return True, symbol
+    elif file_type in CSS_TYPES:
+        match = _CSS_BOUNDARY_RE.match(line)
+        if match:
+            return True, match.group("selector").strip()
+    return False, None
+
+def chunk_file(content: str, file_type: Optional[str], max_lines: int = 80, overlap_lines: int = 0,
+               max_chars: Optional[int] = None) -> List[Chunk]:
+    """
+    Split a file at top-level component/function/type declarations (or CSS
+    rules). Leading imports/comments form their own chunk. Sections longer
+    than `max_lines` (or `max_chars`) are split further, preferring nested
+    declarations, closing braces and statement starts, then blank lines.
+    With `overlap_lines`, each piece of a split section also carries the
+    lines just before it, so a cut never strands a statement without its
+    context. Unknown file types are split by size only.
+    """
+    lines = content.splitlines()
+    if not lines:
+        return []
+    file_type = (file_type or "").lower()
+
+    # (start index, symbol) of each section
+    sections = [(0, None)]
+    for i, line in enumerate(lines):
+        is_boundary, symbol = _boundary(line, file_type)
+        if not is_boundary:
+            continue
+        if i == 0:
+            sections[0] = (0, symbol)
+        else:
+            # Attach directly preceding comments/decorators to the declaration
+            start = i
+            while start > sections[-1][0] + 1 and lines[start - 1].lstrip().startswith(("//", "/*", "*", "@")):
+                start -= 1
+            sections.append((start, symbol))
+
+    chunks: List[Chunk] = []
+    bounds = [s for s, _ in sections] + [len(lines)]
+    for (start, symbol), end in zip(sections, bounds[1:]):
+        for piece_start, piece_end in _split_long(lines, start, end, max_lines, file_type, max_chars):
+            if piece_start > start and overlap_lines > 0:
+                piece_start = max(start, piece_start - overlap_lines)
+            text = "\n".join(lines[piece_start:piece_end]).strip("\n")
+            if text.strip():
+                chunks.append(Chunk(len(chunks), piece_start + 1, piece_end, text, symbol))
+    return chunks
+
+def _is_inner_boundary(line: str, file_type: str) -> bool:
+    """A nested declaration, rule or statement start: good to cut before."""
+    stripped = line.strip()
+    if not stripped or not line[0].isspace():
+        return False
+    if file_type in CODE_TYPES:
+        return bool(_CODE_BOUNDARY_RE.match(stripped) or _CODE_INNER_RE.match(stripped))
+    if file_type in CSS_TYPES:
+        return bool(_CSS_BOUNDARY_RE.match(stripped))
+    return False
+
+def _piece_limit(lines: List[str], start: int, end: int, max_lines: int, max_chars: Optional[int]) -> int:
+    """Largest end index for a piece starting at `start` within both budgets."""
+    limit = min(end, start + max_lines)
+    if max_chars:
+        size = 0
+        for i in range(start, limit):
+            size += len(lines[i]) + 1
+            if size > max_chars:
+                return max(start + 1, i)
+    return limit
+
+def _split_long(lines: List[str], start: int, end: int, max_lines: int, file_type: str = "",
+                max_chars: Optional[int] = None):
+    """
+    Yield [start, end) ranges within the line/char budget. Cuts are searched
+    backwards over the second half of each window: before a nested
+    declaration or after a closing bracket line first, then at a blank
+    line, else at the budget.
+    """
+    while True:
+        limit = _piece_limit(lines, start, end, max_lines, max_chars)
+        if limit >= end:
+            break
+        floor = start + max(1, (limit - start) // 2)
+        cut = None
+        for i in range(limit, floor, -1):
+            if _is_inner_boundary(lines[i], file_type) or lines[i - 1].strip() in _CLOSERS:
+                cut = i
+                break
+        if cut is None:
+            cut = next((i for i in range(limit, floor, -1) if not lines[i - 1].strip()), limit)
+        yield start, cut
+        start = cut
+    yield start, end
+
+def chunk_batch(items: Sequence[Tuple[str, Optional[str]]], max_lines: int = 80, overlap_lines: int = 0,
+                max_chars: Optional[int] = None) -> List[List[Chunk]]:
+    """chunk_file over (content, file_type) pairs; top-level so worker processes can run it."""
+    return [chunk_file(content, file_type, max_lines, overlap_lines, max_chars) for content, file_type in items]
+
+async def chunk_files(items: Sequence[Tuple[str, Optional[str]]], max_lines: int = 80, overlap_lines: int = 0,
+                      max_chars: Optional[int] = None, executor: Optional[Executor] = None,
+                      batch_size: int = 32) -> List[List[Chunk]]:
+    """
+    Chunk many files, in `executor` (e.g. a ProcessPoolExecutor) when one is
+    given: files go out in batches of `batch_size` to amortize pickling, and
+    results come back in input order. Without an executor, runs inline.
+    """
+    if executor is None:
+        return chunk_batch(items, max_lines, overlap_lines, max_chars)
+    loop = asyncio.get_running_loop()
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    results = await asyncio.gather(*(
+        loop.run_in_executor(executor, chunk_batch, batch, max_lines, overlap_lines, max_chars)
+        for batch in batches
+    ))
+    return [chunks for batch in results for chunks in batch]
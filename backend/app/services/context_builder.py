@@ -0,0 +1,203 @@
+import math
+import re
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.models.models import WebPage, WebPageChunk
+from app.services.embedding_registry import embedding_registry
+from app.services.llm_service import llm_service
+from app.services.page_embedder import page_embedder
+from app.services.page_service import page_service
+from app.services.snippet_service import snippet_service
+
+# Words, numbers and single punctuation marks: within ~10-15% of BPE token
+# counts for code and English, and far cheaper than a real tokenizer.
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9_-]{2,}")
+
+# Lines kept when a file is outlined instead of included in full
+_OUTLINE_RE = re.compile(
+    r"^\s*(import\s|export\s|(async\s+)?function\s|class\s|interface\s|type\s+\w+\s*=|"
+    r"const\s+[A-Z]\w*\s*[:=]|@media|@keyframes|[.#:\w][^{;]*\{\s*$)"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return sum(1 for _ in _TOKEN_RE.finditer(text))
+
+def outline(content: str, max_lines: int = 40) -> str:
+    """Imports, exports, component/function signatures and CSS selectors."""
+    lines = [line.rstrip() for line in content.splitlines() if _OUTLINE_RE.match(line)]
+    if len(lines) > max_lines:
+        lines = lines[:max_lines] + [f"... ({len(lines) - max_lines} more declarations)"]
+    return "\n".join(lines)
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ContextBuilder:
+    """
+    Assembles chat-edit context within a token budget.
+
+    Files are ranked by: explicitly requested (`context_files`), file name
+    mentioned in the message, nearest embedded chunks (`web_page_chunks`),
+    similarity of the whole file (`web_pages.vector`), then keyword overlap.
+    Top-ranked files are included in full while they fit; for the rest only
+    the matched regions and an outline are sent, and anything beyond that is
+    listed by name only.
+    """
+    @staticmethod
+    def rank_pages(
+        pages: List[WebPage],
+        message: str,
+        context_files: List[str],
+        query_embedding: Optional[List[float]] = None,
+        chunk_ranks: Optional[Dict[str, int]] = None,
+        column: str = "vector"
+    ) -> List[WebPage]:
+        """
+        `chunk_ranks` maps file_path to the rank of its best-matching chunk;
+        `column` is the page vector column matching `query_embedding`'s model.
+        """
+        chunk_ranks = chunk_ranks or {}
+        requested = set(context_files)
+        message_lower = message.lower()
+        message_words = {w.lower() for w in _WORD_RE.findall(message)}
+
+        def score(page: WebPage) -> float:
+            value = 0.0
+            if page.file_path in requested:
+                value += 100.0
+            stem = page.file_path.rsplit("/", 1)[-1].rsplit(".", 1)[0].lower()
+            if stem and stem in message_lower:
+                value += 10.0
+            if page.file_path in chunk_ranks:
+                value += 5.0 / (1 + chunk_ranks[page.file_path])
+            page_vector = getattr(page, column)
+            if query_embedding and page_vector is not None:
+                value += 5.0 * _cosine(query_embedding, list(page_vector))
+            elif message_words:
+                page_words = {w.lower() for w in _WORD_RE.findall(page.content or "")}
+                value += len(message_words & page_words) / len(message_words)
+            return value
+
+        return sorted(pages, key=score, reverse=True)
+
+    @staticmethod
+    def assemble(ranked: List[WebPage], budget: int,
+                 regions: Optional[Dict[str, List[WebPageChunk]]] = None) -> str:
+        regions = regions or {}
+        parts: List[str] = []
+        remaining = budget
+        outlined: List[WebPage] = []
+
+        for page in ranked:
+            block = f"Filename: {page.file_path}\nContent:\n{page.content}\n\n"
+            cost = estimate_tokens(block)
+            if cost <= remaining:
+                parts.append(block)
+                remaining -= cost
+            else:
+                outlined.append(page)
+
+        omitted: List[str] = []
+        for page in outlined:
+            block = f"Filename: {page.file_path} (outline only, full file omitted)\n{outline(page.content or '')}\n\n"
+            matched = sorted(regions.get(page.file_path, []), key=lambda c: c.start_line)
+            if matched:
+                excerpts = "".join(
+                    f"Lines {c.start_line}-{c.end_line}:\n{c.content}\n\n" for c in matched
+                )
+                with_regions = f"Filename: {page.file_path} (relevant regions, full file omitted)\n{excerpts}Outline:\n{outline(page.content or '')}\n\n"
+                if estimate_tokens(with_regions) <= remaining:
+                    block = with_regions
+            cost = estimate_tokens(block)
+            if cost <= remaining:
+                parts.append(block)
+                remaining -= cost
+            else:
+                omitted.append(page.file_path)
+
+        if omitted:
+            parts.append("Other files (not shown): " + ", ".join(omitted) + "\n\n")
+        return "".join(parts)
+
+    @staticmethod
+    async def embed_chat_query(message: str) -> Tuple[Optional[List[float]], Optional[List[float]]]:
+        """
+        (pages, snippets) query embeddings for a chat message, each from its
+        collection's model (one call when both use the same model). Computed
+        before the context session opens so no connection waits on the embedder.
+        """
+        pages_model = embedding_registry.state("pages").model
+        snippets_model = embedding_registry.state("snippets").model
+        page_embedding = await llm_service.get_embedding(message, model=pages_model) or None
+        snippet_embedding = None
+        if snippet_service.effective_mode(message) != "lexical":
+            if snippets_model == pages_model:
+                snippet_embedding = page_embedding
+            else:
+                snippet_embedding = await llm_service.get_embedding(message, model=snippets_model) or None
+        return page_embedding, snippet_embedding
+
+    @staticmethod
+    async def build_chat_context(
+        session: AsyncSession,
+        portfolio_id: int,
+        message: str,
+        context_files: List[str],
+        budget: Optional[int] = None,
+        snippet_budget: Optional[int] = None,
+        embeddings: Optional[Tuple[Optional[List[float]], Optional[List[float]]]] = None
+    ) -> str:
+        """`embeddings` is embed_chat_query(message); computed here if omitted."""
+        budget = budget or settings.CHAT_CONTEXT_TOKEN_BUDGET
+        snippet_budget = snippet_budget or settings.CHAT_SNIPPET_TOKEN_BUDGET
+        if embeddings is None:
+            embeddings = await ContextBuilder.embed_chat_query(message)
+        page_embedding, snippet_embedding = embeddings
+
+        state = embedding_registry.state("pages")
+        pages = await page_service.get_active_pages(session, portfolio_id, vector_column=state.column)
+        # Lazily embed files saved before chunking existed, missed on shutdown
+        # or not carried over by an embedding model migration
+        page_embedder.schedule_missing(portfolio_id, pages, state)
+
+        query_embedding = None
+        chunk_ranks: Dict[str, int] = {}
+        regions: Dict[str, List[WebPageChunk]] = {}
+        if any(getattr(page, state.column) is not None for page in pages):
+            query_embedding = page_embedding
+        if query_embedding:
+            nearest = await page_embedder.nearest_chunks(
+                session, portfolio_id, query_embedding, settings.CHAT_RELEVANT_CHUNKS, state
+            )
+            for rank, (chunk, _) in enumerate(nearest):
+                chunk_ranks.setdefault(chunk.file_path, rank)
+                regions.setdefault(chunk.file_path, []).append(chunk)
+
+        ranked = ContextBuilder.rank_pages(pages, message, context_files, query_embedding, chunk_ranks, state.column)
+        files_context = ContextBuilder.assemble(ranked, budget, regions)
+
+        # A failed snippet embedding falls back to lexical search, not a second call
+        relevant_snippets = await snippet_service.search_snippets(
+            session, message, limit=2,
+            mode=None if snippet_embedding else "lexical",
+            query_embedding=snippet_embedding
+        )
+        snippet_parts: List[str] = []
+        remaining = snippet_budget
+        for s in relevant_snippets:
+            block = f"Reference ({s.name}):\n{s.code}"
+            cost = estimate_tokens(block)
+            if cost > remaining:
+                continue
+            snippet_parts.append(block)
+            remaining -= cost
+
+        return f"{files_context}\n\nRelevant Examples:\n" + "\n\n".join(snippet_parts)
+
+context_builder = ContextBuilder()
@@ -0,0 +1,61 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+
+EmbedBatchFn = Callable[[List[str], str], Awaitable[List[List[float]]]]
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching coalescer for embedding requests.
+
+    Single-text calls arriving from different requests are queued per model
+    and sent upstream as one batch when either `max_batch_size` texts are
+    waiting or `max_wait_ms` has elapsed since the first one arrived.
+    Identical texts within a batch are only embedded once.
+    """
+    def __init__(self, embed_batch: EmbedBatchFn, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self._embed_batch = embed_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def embed(self, text: str, model: str) -> List[float]:
+        """Queue one text and wait for its vector."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(model, [])
+        pending.append((text, future))
+
+        if len(pending) >= self.max_batch_size:
+            self._flush(model)
+        elif len(pending) == 1:
+            self._timers[model] = loop.call_later(self.max_wait, self._flush, model)
+
+        return await future
+
+    def _flush(self, model: str):
+        timer = self._timers.pop(model, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(model, [])
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(model, batch))
+        # Keep a strong reference until the batch completes
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, model: str, batch: List[Tuple[str, asyncio.Future]]):
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = await self._embed_batch(unique_texts, model)
+        except Exception as e:
+            print(f"Error fetching embedding batch: {e}")
+            vectors = [[] for _ in unique_texts]
+
+        by_text = dict(zip(unique_texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text.get(text, []))
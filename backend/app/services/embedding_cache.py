@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from app.core.config import settings
+
+
+def _encode(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _decode(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for embedding vectors, keyed by (model, normalized text).
+
+    Tier 1 is an in-process LRU bounded by the bytes of the stored vectors.
+    Tier 2 is a SQLite file (WAL mode) shared by every worker on the host,
+    so vectors survive restarts. Both tiers store packed float32 blobs.
+    """
+    def __init__(self, path: Optional[str], max_memory_bytes: int):
+        self.path = path
+        self.max_memory_bytes = max_memory_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "writes": 0,
+        }
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    @classmethod
+    def key(cls, model: str, text: str) -> str:
+        digest = hashlib.sha256(cls.normalize(text).encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    # Memory tier
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        blob = self._memory.get(key)
+        if blob is not None:
+            self._memory.move_to_end(key)
+        return blob
+
+    def _memory_put(self, key: str, blob: bytes):
+        if len(blob) > self.max_memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = blob
+        self._memory_bytes += len(blob)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.counters["evictions"] += 1
+
+    # Disk tier (blocking; always called through asyncio.to_thread)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db = db
+        return self._db
+
+    def _disk_get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        with self._db_lock:
+            db = self._connect()
+            found: Dict[str, bytes] = {}
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+            return found
+
+    def _disk_put_many(self, items: Dict[str, bytes]):
+        with self._db_lock:
+            db = self._connect()
+            now = time.time()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                    [(key, blob, now) for key, blob in items.items()]
+                )
+
+    # Public API
+
+    async def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up vectors for texts; misses come back as None."""
+        keys = [self.key(model, text) for text in texts]
+        blobs: Dict[str, bytes] = {}
+        for key in keys:
+            blob = self._memory_get(key)
+            if blob is not None:
+                blobs[key] = blob
+        self.counters["memory_hits"] += len(blobs)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in blobs]
+        if missing and self.path:
+            try:
+                found = await asyncio.to_thread(self._disk_get_many, missing)
+            except sqlite3.Error as e:
+                print(f"Embedding cache read failed: {e}")
+                found = {}
+            self.counters["disk_hits"] += len(found)
+            for key, blob in found.items():
+                self._memory_put(key, blob)
+            blobs.update(found)
+
+        results = [_decode(blobs[key]) if key in blobs else None for key in keys]
+        self.counters["misses"] += sum(1 for r in results if r is None)
+        return results
+
+    async def get(self, model: str, text: str) -> Optional[List[float]]:
+        return (await self.get_many(model, [text]))[0]
+
+    async def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Store vectors in both tiers. Empty (failed) vectors are ignored."""
+        items = {
+            self.key(model, text): _encode(vector)
+            for text, vector in zip(texts, vectors) if vector
+        }
+        if not items:
+            return
+        for key, blob in items.items():
+            self._memory_put(key, blob)
+        self.counters["writes"] += len(items)
+        if self.path:
+            try:
+                await asyncio.to_thread(self._disk_put_many, items)
+            except sqlite3.Error as e:
+                print(f"Embedding cache write failed: {e}")
+
+    async def put(self, model: str, text: str, vector: List[float]):
+        await self.put_many(model, [text], [vector])
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+        }
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+embedding_cache = EmbeddingCache(
+    path=settings.EMBEDDING_CACHE_PATH or None,
+    max_memory_bytes=int(settings.EMBEDDING_CACHE_MEMORY_MB * 1024 * 1024)
+)
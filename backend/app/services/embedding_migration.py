@@ -0,0 +1,508 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Column, Index, MetaData, String, Table, bindparam, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.schema import CreateIndex
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, engine
+from app.core.vector_index import mean_vector, partial_vector_indexes, vector_index
+from app.models.models import (
+    CodeContext, CodeContextChunk, CodeSnippet, EmbeddingCollection, ResponseCacheEntry, WebPage, WebPageChunk
+)
+from app.services.embedding_registry import COLLECTIONS, SLOTS, embedding_registry, spare_column
+from app.services.llm_service import llm_service
+from app.services.snippet_index import bump_version
+from app.services.snippet_service import snippet_service
+
+MODELS = {
+    "code_snippets": CodeSnippet,
+    "code_context": CodeContext,
+    "code_context_chunks": CodeContextChunk,
+    "web_pages": WebPage,
+    "web_page_chunks": WebPageChunk,
+    "llm_response_cache": ResponseCacheEntry,
+}
+
+# Tables re-embedded from their own columns: (columns, row -> text). The
+# text must be exactly what the writers embed.
+SOURCES: Dict[str, Tuple[tuple, Callable[[Any], str]]] = {
+    "code_snippets": (
+        (CodeSnippet.name, CodeSnippet.description, CodeSnippet.code),
+        lambda r: snippet_service.build_embedding_text(r.name, r.description, r.code)
+    ),
+    "code_context_chunks": ((CodeContextChunk.content,), lambda r: r.content),
+    "code_context": ((CodeContext.content,), lambda r: r.content),  # documents without chunks
+    "web_page_chunks": ((WebPageChunk.symbol, WebPageChunk.content), lambda r: f"{r.symbol or ''}\n{r.content}"),
+}
+# Tables whose vector is the mean of their chunks': table -> (chunk model, parent key)
+PARENTS = {
+    "code_context": (CodeContextChunk, "context_id"),
+    "web_pages": (WebPageChunk, "page_id"),
+}
+# Rows that must all have a new vector before the switch. Pages without
+# chunks are re-embedded lazily by page_embedder; the response cache keeps
+# no prompt text to re-embed.
+REQUIRED = {"code_snippets", "code_context_chunks", "code_context", "web_page_chunks"}
+# Tables searched through an ANN index (the others are scanned exactly)
+ANN_TABLES = {"code_snippets", "code_context", "code_context_chunks", "web_pages"}
+
+_PROBE_TEXT = "embedding dimension probe"
+_MAX_SWEEPS = 3
+_MAX_BATCH_RETRIES = 3
+
+
+def ann_indexes(table: str, column: str, dim: int) -> List[Index]:
+    """The ANN indexes the models declare for `table`, built on `column`."""
+    if table not in ANN_TABLES:
+        return []
+    columns = [Column(column, Vector(dim))]
+    indexes = [vector_index(table, column, dim=dim)]
+    if table == "code_snippets":
+        columns.append(Column("category", String))
+        indexes += partial_vector_indexes(
+            table, "category", settings.VECTOR_PARTIAL_INDEX_CATEGORIES, column_name=column, dim=dim
+        )
+    # Bound to a stand-in table: the mapped one only declares the indexes on "vector"
+    Table(table, MetaData(), *columns, *indexes)
+    return indexes
+
+def _trigger_sql(table: str, watched: str, reset: str) -> List[str]:
+    """BEFORE UPDATE trigger: a write to `watched` clears `reset` (it is re-embedded later)."""
+    function = f"{table}_clear_{reset}"
+    return [
+        f'''CREATE OR REPLACE FUNCTION "{function}"() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW."{watched}" IS DISTINCT FROM OLD."{watched}" THEN
+        NEW."{reset}" := NULL;
+    END IF;
+    RETURN NEW;
+END $$''',
+        f'DROP TRIGGER IF EXISTS "{table}_embedding_sync" ON "{table}"',
+        f'CREATE TRIGGER "{table}_embedding_sync" BEFORE UPDATE ON "{table}" '
+        f'FOR EACH ROW EXECUTE FUNCTION "{function}"()',
+    ]
+
+def _drop_trigger_sql(table: str) -> List[str]:
+    return [f'DROP TRIGGER IF EXISTS "{table}_embedding_sync" ON "{table}"'] + [
+        f'DROP FUNCTION IF EXISTS "{table}_clear_{slot}"()' for slot in SLOTS
+    ]
+
+
+class EmbeddingMigrator:
+    """
+    Online migration of a collection (see embedding_registry.COLLECTIONS) to
+    another embedding model, with no window where searches embed with one
+    model but read vectors of another.
+
+    1. start: the spare vector column of each table is recreated with the
+       new dimension, and a trigger clears a row's spare vector whenever
+       its active vector is rewritten, so edits made during the backfill
+       are re-embedded rather than lost.
+    2. backfill: rows are re-embedded into the spare column in keyset
+       batches of EMBED_MIGRATION_BATCH_SIZE, throttled to
+       EMBED_MIGRATION_ROWS_PER_SECOND. The last id done is committed with
+       each batch, so an interrupted run resumes where it stopped. Sweeps
+       then pick up rows changed behind the checkpoint.
+    3. indexing: the tables' ANN indexes are built on the spare column
+       (CREATE INDEX CONCURRENTLY).
+    4. switch: with writes briefly blocked (reads continue), the last
+       changed rows are re-embedded, and the registry row is updated to
+       the new model, dimension and column in the same transaction. Each
+       process picks the row up on its next registry refresh and moves
+       model and column together.
+    5. cleanup: after a grace period for processes still on the old state,
+       rows they wrote are re-embedded and the old column is dropped.
+
+    Queries keep using the old model and column until step 4 commits.
+    """
+    def __init__(self, batch_size: int = 64, rows_per_second: float = 50.0):
+        self.batch_size = batch_size
+        self.rows_per_second = rows_per_second
+
+    @staticmethod
+    async def _execute_ddl(session: AsyncSession, statements: List[str]):
+        conn = await session.connection()
+        for sql in statements:
+            await conn.exec_driver_sql(sql)
+
+    @staticmethod
+    async def _collection(session: AsyncSession, name: str, lock: bool = False) -> EmbeddingCollection:
+        if name not in COLLECTIONS:
+            raise ValueError(f"Unknown collection '{name}', expected one of {list(COLLECTIONS)}")
+        await embedding_registry.register_defaults(session)
+        row = await session.get(EmbeddingCollection, name, with_for_update=lock, populate_existing=True)
+        return row
+
+    async def start(self, name: str, model: str, dim: Optional[int] = None) -> EmbeddingCollection:
+        """Prepare the spare columns for `model`. Resuming the same migration is a no-op."""
+        probe = (await llm_service.get_embeddings([_PROBE_TEXT], model=model))[0]
+        if not probe:
+            raise ValueError(f"Could not embed with '{model}'; is it available on the embedding backend?")
+        if dim and len(probe) != dim:
+            raise ValueError(f"'{model}' returns {len(probe)}-dimensional vectors, not {dim}")
+        dim = len(probe)
+
+        async with AsyncSessionLocal() as session:
+            row = await self._collection(session, name, lock=True)
+            if row.status != "ready":
+                if row.target_model == model and row.target_dim == dim:
+                    return row
+                raise ValueError(
+                    f"'{name}' is already migrating to {row.target_model} ({row.status}); abort it first"
+                )
+            if row.model == model:
+                raise ValueError(f"'{name}' already uses {model}")
+
+            spare = spare_column(row.active_column)
+            await session.execute(text("SET LOCAL lock_timeout = '5s'"))
+            for table in COLLECTIONS[name]:
+                await self._execute_ddl(session, [
+                    f'ALTER TABLE "{table}" DROP COLUMN IF EXISTS "{spare}"',
+                    f'ALTER TABLE "{table}" ADD COLUMN "{spare}" vector({int(dim)})',
+                    *_trigger_sql(table, row.active_column, spare),
+                ])
+            row.target_model, row.target_dim = model, dim
+            row.status, row.checkpoint, row.rows_done = "backfilling", {}, 0
+            row.started_at = func.now()
+            await session.commit()
+            await session.refresh(row)
+        print(f"🚚 '{name}': migrating {row.model} ({row.dim}d, {row.active_column}) -> {model} ({dim}d, {spare})")
+        return row
+
+    async def _reembed_batch(self, session: AsyncSession, table: str, source: str, target: str,
+                             model: str, after_id: int, limit: int) -> Tuple[Optional[int], int, int]:
+        """
+        Fill `target` for up to `limit` rows after `after_id` that have a
+        `source` vector but no `target` one. Returns (last id seen, or None
+        when there are no more rows; rows written; texts that failed to embed).
+        """
+        model_cls = MODELS[table]
+        columns = SOURCES[table][0] if table in SOURCES else ()
+        rows = (await session.execute(
+            select(model_cls.id, *columns)
+            .where(
+                model_cls.id > after_id,
+                getattr(model_cls, source).is_not(None),
+                getattr(model_cls, target).is_(None)
+            )
+            .order_by(model_cls.id)
+            .limit(limit)
+        )).all()
+        if not rows:
+            return None, 0, 0
+
+        vectors: Dict[int, List[float]] = {}
+        if table in PARENTS:
+            child, key = PARENTS[table]
+            parent_id, child_vector = getattr(child, key), getattr(child, target)
+            grouped: Dict[int, List[List[float]]] = {}
+            result = await session.execute(
+                select(parent_id, child_vector).where(parent_id.in_([r.id for r in rows]), child_vector.is_not(None))
+            )
+            for row_id, vector in result.all():
+                grouped.setdefault(row_id, []).append(list(vector))
+            vectors = {row_id: mean_vector(group) for row_id, group in grouped.items()}
+
+        failed = 0
+        pending = [r for r in rows if r.id not in vectors]
+        if table in SOURCES and pending:
+            embedded = await llm_service.get_embeddings([SOURCES[table][1](r) for r in pending], model=model)
+            vectors.update({r.id: v for r, v in zip(pending, embedded) if v})
+            failed = sum(1 for v in embedded if not v)
+
+        if vectors:
+            table_obj = model_cls.__table__
+            await session.execute(
+                update(table_obj).where(table_obj.c.id == bindparam("row_id")).values({target: bindparam("embedding")}),
+                [{"row_id": row_id, "embedding": vector} for row_id, vector in vectors.items()]
+            )
+        return rows[-1].id, len(vectors), failed
+
+    @staticmethod
+    async def _missing(session: AsyncSession, table: str, source: str, target: str) -> int:
+        model_cls = MODELS[table]
+        return (await session.execute(
+            select(func.count()).select_from(model_cls)
+            .where(getattr(model_cls, source).is_not(None), getattr(model_cls, target).is_(None))
+        )).scalar_one()
+
+    @staticmethod
+    async def _model_available(model: str) -> bool:
+        """Whether `model` embeds a probe right now (unique text, so never an embedding-cache hit)."""
+        probe = f"{_PROBE_TEXT} {time.time_ns()}"
+        return bool((await llm_service.get_embeddings([probe], model=model))[0])
+
+    async def _pass(self, name: str, table: str, source: str, target: str, model: str,
+                    after_id: int = 0, checkpoint: Optional[Dict[str, Any]] = None,
+                    save_position: bool = False) -> int:
+        """
+        One keyset pass over `table`. Returns the rows written. With a
+        `checkpoint`, skipped rows (and with `save_position`, the last id
+        done) are saved in it with each batch.
+
+        A batch that fails as a whole is retried every
+        EMBED_RETRY_AFTER_SECONDS. After _MAX_BATCH_RETRIES, if the model
+        still embeds a probe, the batch's inputs are the problem: its rows
+        are retried one at a time and any that still fail are skipped and
+        listed under checkpoint["skipped"], to be retried by the sweeps and
+        reported if they never succeed. While the probe fails too, the
+        backend is down and the pass keeps waiting.
+        """
+        written, retries = 0, 0
+        single_until: Optional[int] = None  # last id of a failing batch being retried row by row
+        while True:
+            started = time.perf_counter()
+            limit = 1 if single_until is not None else self.batch_size
+            async with AsyncSessionLocal() as session:
+                last_id, count, failed = await self._reembed_batch(
+                    session, table, source, target, model, after_id, limit
+                )
+                if last_id is None:
+                    return written
+                if failed and not count:
+                    await session.rollback()
+                    retries += 1
+                    healthy = single_until is not None or retries >= _MAX_BATCH_RETRIES
+                    healthy = healthy and await self._model_available(model)
+                    if healthy and single_until is None:
+                        # The inputs, not the backend: find the bad rows one at a time
+                        print(f"   {table}: batch after id {after_id} keeps failing; retrying its rows one by one")
+                        single_until, retries = last_id, 0
+                        continue
+                    if not healthy:
+                        print(f"   embedding with {model} failed; retrying in {settings.EMBED_RETRY_AFTER_SECONDS:.0f}s")
+                        await asyncio.sleep(settings.EMBED_RETRY_AFTER_SECONDS)
+                        continue
+                    print(f"   {table}: skipping id {last_id}, which {model} cannot embed")
+                    if checkpoint is not None:
+                        skipped = checkpoint.setdefault("skipped", {}).setdefault(table, [])
+                        if last_id not in skipped:
+                            skipped.append(last_id)
+                retries = 0
+                if single_until is not None and last_id >= single_until:
+                    single_until = None
+                if checkpoint is not None:
+                    if save_position:
+                        checkpoint[table] = last_id
+                    await session.execute(
+                        update(EmbeddingCollection)
+                        .where(EmbeddingCollection.name == name)
+                        .values(checkpoint=dict(checkpoint), rows_done=EmbeddingCollection.rows_done + count)
+                    )
+                await session.commit()
+            after_id = last_id
+            written += count
+            print(f"   {table}: up to id {last_id}, {written} re-embedded this pass")
+            if self.rows_per_second > 0:
+                await asyncio.sleep(max(0.0, count / self.rows_per_second - (time.perf_counter() - started)))
+
+    async def backfill(self, name: str) -> bool:
+        """Fill the spare columns. Returns True when every required row has a new vector."""
+        async with AsyncSessionLocal() as session:
+            row = await self._collection(session, name)
+        source, target = row.active_column, spare_column(row.active_column)
+        tables = [t for t in COLLECTIONS[name] if t in SOURCES or t in PARENTS]
+
+        # First pass resumes from the checkpoint
+        checkpoint = dict(row.checkpoint or {})
+        for table in tables:
+            await self._pass(name, table, source, target, row.target_model,
+                             after_id=checkpoint.get(table, 0), checkpoint=checkpoint, save_position=True)
+
+        # Sweeps: rows inserted or rewritten behind the checkpoint, earlier failures
+        for _ in range(_MAX_SWEEPS):
+            async with AsyncSessionLocal() as session:
+                missing = {t: await self._missing(session, t, source, target) for t in tables if t in REQUIRED}
+            if not any(missing.values()):
+                return True
+            print(f"   sweeping {sum(missing.values())} rows without a new vector")
+            written = 0
+            for table in tables:
+                written += await self._pass(name, table, source, target, row.target_model, checkpoint=checkpoint)
+            if not written:
+                break
+        print(f"⚠️  '{name}': rows still missing a {row.target_model} vector: {missing}")
+        if checkpoint.get("skipped"):
+            print(f"   ids {row.target_model} could not embed: {checkpoint['skipped']}")
+        return False
+
+    async def build_indexes(self, name: str):
+        """Build the ANN indexes on the spare columns without blocking writes."""
+        async with AsyncSessionLocal() as session:
+            row = await self._collection(session, name)
+        target = spare_column(row.active_column)
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            for table in COLLECTIONS[name]:
+                for index in ann_indexes(table, target, row.target_dim):
+                    valid = (await conn.execute(
+                        text("SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                             "WHERE c.relname = :name AND c.relnamespace = current_schema()::regnamespace"),
+                        {"name": index.name}
+                    )).scalar_one_or_none()
+                    if valid:
+                        continue
+                    if valid is False:
+                        # Left behind by an interrupted concurrent build
+                        await conn.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"')
+                    print(f"   building {index.name}...")
+                    index.dialect_options["postgresql"]["concurrently"] = True
+                    await conn.execute(CreateIndex(index))
+                await conn.exec_driver_sql(f'ANALYZE "{table}"')
+
+    async def switch(self, name: str) -> bool:
+        """
+        Point the collection at the new model and column. Returns False if
+        too many rows changed since the backfill (run another pass first).
+        """
+        async with AsyncSessionLocal() as session:
+            row = await self._collection(session, name, lock=True)
+            source, target = row.active_column, spare_column(row.active_column)
+            tables = COLLECTIONS[name]
+
+            # Writers wait on this lock until commit; searches keep running
+            await session.execute(text("SET LOCAL lock_timeout = '5s'"))
+            locked = ", ".join(f'"{t}"' for t in tables)
+            await session.execute(text(f"LOCK TABLE {locked} IN SHARE ROW EXCLUSIVE MODE"))
+            for table in tables:
+                if table not in REQUIRED:
+                    continue
+                missing = await self._missing(session, table, source, target)
+                if missing > self.batch_size:
+                    await session.rollback()
+                    return False
+                if missing:
+                    await self._reembed_batch(session, table, source, target, row.target_model, 0, missing)
+                    if await self._missing(session, table, source, target):
+                        await session.rollback()
+                        return False
+            # Processes still on the old state write the old column until they
+            # refresh; clear the new vector on such writes so cleanup redoes it
+            for table in tables:
+                await self._execute_ddl(session, _trigger_sql(table, source, target))
+
+            previous = (row.model, row.dim)
+            row.model, row.dim, row.active_column = row.target_model, row.target_dim, target
+            row.target_model, row.target_dim = None, None
+            row.status, row.switched_at = "switched", func.now()
+            if "code_snippets" in tables:
+                await bump_version(session)
+            await session.commit()
+        print(f"🔀 '{name}': switched from {previous[0]} ({previous[1]}d) to {row.model} ({row.dim}d) in {target}")
+        return True
+
+    async def cleanup(self, name: str, grace_seconds: Optional[float] = None):
+        """After the grace period, redo rows stale processes wrote and drop the old column."""
+        grace = 3 * settings.EMBEDDING_REGISTRY_REFRESH_SECONDS if grace_seconds is None else grace_seconds
+        async with AsyncSessionLocal() as session:
+            row = await self._collection(session, name)
+            waited = (await session.execute(select(func.extract("epoch", func.now() - row.switched_at)))).scalar_one()
+        if float(waited) < grace:
+            print(f"   waiting {grace - float(waited):.0f}s for processes to pick up the switch")
+            await asyncio.sleep(grace - float(waited))
+
+        active, old = row.active_column, spare_column(row.active_column)
+        for table in COLLECTIONS[name]:
+            if table in SOURCES or table in PARENTS:
+                await self._pass(name, table, old, active, row.model)
+
+        async with AsyncSessionLocal() as session:
+            row = await self._collection(session, name, lock=True)
+            await session.execute(text("SET LOCAL lock_timeout = '5s'"))
+            for table in COLLECTIONS[name]:
+                # Dropping the column drops its indexes too
+                await self._execute_ddl(session, [
+                    *_drop_trigger_sql(table),
+                    f'ALTER TABLE "{table}" DROP COLUMN IF EXISTS "{old}"',
+                    f'ALTER TABLE "{table}" ADD COLUMN "{old}" vector',
+                ])
+            row.status, row.checkpoint = "ready", {}
+            await session.commit()
+        print(f"🧹 '{name}': dropped the old {old} vectors")
+
+    async def abort(self, name: str):
+        """Stop a migration that has not switched yet and free the spare column."""
+        async with AsyncSessionLocal() as session:
+            row = await self._collection(session, name, lock=True)
+            if row.status == "ready":
+                print(f"'{name}' has no migration in progress")
+                return
+            if row.status == "switched":
+                raise ValueError(f"'{name}' already switched to {row.model}; migrate back to undo it")
+            spare = spare_column(row.active_column)
+            await session.execute(text("SET LOCAL lock_timeout = '5s'"))
+            for table in COLLECTIONS[name]:
+                await self._execute_ddl(session, [
+                    *_drop_trigger_sql(table),
+                    f'ALTER TABLE "{table}" DROP COLUMN IF EXISTS "{spare}"',
+                    f'ALTER TABLE "{table}" ADD COLUMN "{spare}" vector',
+                ])
+            row.status, row.target_model, row.target_dim, row.checkpoint = "ready", None, None, {}
+            await session.commit()
+        print(f"🛑 '{name}': migration aborted, still on {row.model}")
+
+    async def run(self, name: str, model: Optional[str] = None, dim: Optional[int] = None):
+        """Start (or resume) and drive a migration through every step."""
+        async with AsyncSessionLocal() as session:
+            row = await self._collection(session, name)
+            await session.commit()
+        if row.status == "ready":
+            if not model:
+                raise ValueError(f"'{name}' has no migration in progress; pass a target model")
+            row = await self.start(name, model, dim)
+        elif model and model != row.target_model:
+            raise ValueError(f"'{name}' is already migrating to {row.target_model}; abort it first")
+
+        if row.status == "backfilling":
+            if not await self.backfill(name):
+                return
+            await self._set_status(name, "indexing")
+            row.status = "indexing"
+
+        if row.status == "indexing":
+            await self.build_indexes(name)
+            for _ in range(_MAX_SWEEPS):
+                if await self.switch(name):
+                    break
+                print("   too many rows changed since the backfill; sweeping again before switching")
+                if not await self.backfill(name):
+                    return
+            else:
+                print(f"⚠️  '{name}': could not catch up with writes; run again to retry the switch")
+                return
+
+        await self.cleanup(name)
+
+    @staticmethod
+    async def _set_status(name: str, status: str):
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(EmbeddingCollection).where(EmbeddingCollection.name == name).values(status=status)
+            )
+            await session.commit()
+
+    @staticmethod
+    async def status() -> List[Dict[str, Any]]:
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(select(EmbeddingCollection).order_by(EmbeddingCollection.name))).scalars().all()
+        return [
+            {
+                "name": row.name,
+                "model": row.model,
+                "dim": row.dim,
+                "column": row.active_column,
+                "status": row.status,
+                "target_model": row.target_model,
+                "target_dim": row.target_dim,
+                "checkpoint": row.checkpoint or {},
+                "rows_done": row.rows_done,
+            }
+            for row in rows
+        ]
+
+embedding_migrator = EmbeddingMigrator(
+    batch_size=settings.EMBED_MIGRATION_BATCH_SIZE,
+    rows_per_second=settings.EMBED_MIGRATION_ROWS_PER_SECOND
+)
@@ -0,0 +1,126 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.vector_index import EMBEDDING_DIM
+from app.models.models import EmbeddingCollection
+
+# Every embedded table has two vector columns. Reads and writes use the
+# collection's active one; a model migration fills the other, then swaps.
+SLOTS = ("vector", "vector_alt")
+
+# Tables searched with the same query embedding, so they change model
+# together. Listed children first: parent vectors are means of their chunks.
+COLLECTIONS: Dict[str, List[str]] = {
+    "snippets": ["code_snippets"],
+    "context": ["code_context_chunks", "code_context"],
+    "pages": ["web_page_chunks", "web_pages"],
+    "response_cache": ["llm_response_cache"],
+}
+
+
+def spare_column(column: str) -> str:
+    return SLOTS[1] if column == SLOTS[0] else SLOTS[0]
+
+
+@dataclass(frozen=True)
+class EmbeddingState:
+    """Model, dimension and vector column to use for one collection."""
+    model: str
+    dim: int
+    column: str
+
+    def vector(self, model_cls):
+        """The active vector column attribute of `model_cls`."""
+        return getattr(model_cls, self.column)
+
+DEFAULT_STATE = EmbeddingState(settings.EMBEDDING_MODEL, EMBEDDING_DIM, SLOTS[0])
+
+
+class EmbeddingRegistry:
+    """
+    Process-local copy of embedding_collections.
+
+    Callers take `state(collection)` once per operation and use its model
+    for the query/document embedding and its column for the SQL, so both
+    always agree even if a migration switches the collection mid-request.
+    A background task re-reads the table every
+    EMBEDDING_REGISTRY_REFRESH_SECONDS; the switch is a single row update,
+    so each process moves to the new model and column in one step.
+
+    The first refresh registers collections that have no row yet with
+    EMBEDDING_MODEL/EMBEDDING_DIM, pinning the model their vectors were
+    built with.
+    """
+    def __init__(self, refresh_interval: float = 10.0):
+        self.refresh_interval = refresh_interval
+        self._states: Dict[str, EmbeddingState] = {}
+        self._registered = False
+        self._task: Optional[asyncio.Task] = None
+
+    def state(self, collection: str) -> EmbeddingState:
+        return self._states.get(collection, DEFAULT_STATE)
+
+    async def register_defaults(self, session):
+        stmt = insert(EmbeddingCollection).values([
+            {"name": name, "model": settings.EMBEDDING_MODEL, "dim": EMBEDDING_DIM,
+             "active_column": SLOTS[0], "status": "ready", "checkpoint": {}}
+            for name in COLLECTIONS
+        ])
+        await session.execute(stmt.on_conflict_do_nothing(index_elements=[EmbeddingCollection.name]))
+
+    async def refresh(self) -> bool:
+        """Re-read the registry. Returns True if any collection changed."""
+        async with AsyncSessionLocal() as session:
+            if not self._registered:
+                await self.register_defaults(session)
+                await session.commit()
+                self._registered = True
+            rows = (await session.execute(select(EmbeddingCollection))).scalars().all()
+
+        states = {row.name: EmbeddingState(row.model, row.dim, row.active_column) for row in rows}
+        changed = [name for name in states if states[name] != self.state(name)]
+        self._states = states
+        for name in changed:
+            state = states[name]
+            print(f"Embedding collection '{name}': {state.model} ({state.dim}d) in {state.column}")
+            if state.model != settings.EMBEDDING_MODEL:
+                print(f"   (EMBEDDING_MODEL is {settings.EMBEDDING_MODEL}; the registry takes precedence)")
+        return bool(changed)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Error refreshing embedding registry: {e}")
+
+    async def start(self):
+        """Load the registry, then keep it fresh in the background."""
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"Error loading embedding registry (using EMBEDDING_MODEL until it loads): {e}")
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {
+            name: {"model": state.model, "dim": state.dim, "column": state.column}
+            for name, state in ((name, self.state(name)) for name in COLLECTIONS)
+        }
+
+embedding_registry = EmbeddingRegistry(refresh_interval=settings.EMBEDDING_REGISTRY_REFRESH_SECONDS)
@@ -0,0 +1,100 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.core.database import session_scope
+from app.core.telemetry import span
+from app.models.models import Portfolio
+from app.services.llm_service import llm_service
+from app.services.page_embedder import page_embedder
+from app.services.page_service import page_service
+from app.services.response_cache import response_cache
+from app.services.snippet_service import snippet_service
+
+ProgressCallback = Callable[[int, str], Awaitable[None]]
+
+
+class GenerationError(Exception):
+    """Upstream generation failed; the job may be retried."""
+
+
+class GenerationService:
+    @staticmethod
+    async def build_inputs(
+        session: AsyncSession,
+        github_username: str,
+        template_id: Optional[str] = None,
+        custom_prompt: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """
+        Prompt and snippet context for a portfolio generation.
+        """
+        snippet_query = f"{template_id} portfolio {custom_prompt or ''}"
+        relevant_snippets = await snippet_service.search_snippets(session, snippet_query, limit=3)
+
+        snippet_context = "\n\n".join([
+            f"Example {i+1} ({s.name}):\n{s.code}"
+            for i, s in enumerate(relevant_snippets)
+        ])
+
+        prompt = f"Generate a portfolio for {github_username}. "
+        if custom_prompt:
+            prompt += f"User request: {custom_prompt}"
+        return prompt, snippet_context
+
+    @staticmethod
+    async def generate_portfolio(
+        portfolio_id: int,
+        payload: Dict,
+        progress: ProgressCallback
+    ) -> List[Dict[str, str]]:
+        """
+        Run one portfolio generation end to end. Each DB step uses its own short
+        session, so no connection is held while the LLM is generating.
+        Raises GenerationError when the model returns nothing usable.
+        """
+        await progress(10, "Searching snippets")
+        with span("generation.build_inputs"):
+            async with session_scope() as session:
+                # A cache hit needs no snippet search
+                cached = await response_cache.lookup(
+                    session, payload.get("template_id"), payload.get("custom_prompt"), payload["github_username"]
+                )
+                if not cached:
+                    prompt, snippet_context = await GenerationService.build_inputs(
+                        session,
+                        payload["github_username"],
+                        payload.get("template_id"),
+                        payload.get("custom_prompt")
+                    )
+                portfolio = await session.get(Portfolio, portfolio_id)
+                portfolio.status = 'generating'
+
+        if cached:
+            await progress(30, "Reusing a similar generation")
+            files = cached
+        else:
+            await progress(30, "Generating code")
+            with span("generation.llm"):
+                generated_files = await llm_service.generate_code(prompt, context=snippet_context)
+            files = [
+                {"filename": f.get("filename"), "content": f.get("content")}
+                for f in generated_files
+                if f.get("filename") and f.get("content")
+            ]
+            if not files:
+                raise GenerationError("Model returned no files")
+
+        await progress(80, "Saving files")
+        with span("generation.save", files=len(files)):
+            async with session_scope() as session:
+                await page_service.save_files(session, portfolio_id, files)
+                if not cached:
+                    await response_cache.store(
+                        session, payload.get("template_id"), payload.get("custom_prompt"),
+                        payload["github_username"], files
+                    )
+                portfolio = await session.get(Portfolio, portfolio_id)
+                portfolio.status = 'ready'
+        page_embedder.schedule(portfolio_id, [f["filename"] for f in files])
+        return files
+
+generation_service = GenerationService()
@@ -0,0 +1,59 @@
+import httpx
+from typing import Dict, Tuple
+from app.core.config import settings
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _backend_profiles() -> Dict[str, Tuple[int, int, bool]]:
+    # backend -> (max_connections, max_keepalive_connections, http2)
+    return {
+        "ollama": (settings.OLLAMA_MAX_CONNECTIONS, settings.OLLAMA_MAX_KEEPALIVE, settings.OLLAMA_HTTP2),
+        "openrouter": (settings.OPENROUTER_MAX_CONNECTIONS, settings.OPENROUTER_MAX_KEEPALIVE, settings.OPENROUTER_HTTP2),
+    }
+
+
+class HTTPClientPool:
+    """
+    Long-lived httpx clients, one per upstream backend.
+
+    Each backend gets its own connection limits so a burst of embeddings
+    cannot starve completions (and vice versa). Clients are created lazily
+    and must be closed with `aclose()` on application shutdown.
+    """
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _build(self, backend: str) -> httpx.AsyncClient:
+        max_connections, max_keepalive, http2 = _backend_profiles().get(
+            backend,
+            (settings.OPENROUTER_MAX_CONNECTIONS, settings.OPENROUTER_MAX_KEEPALIVE, False)
+        )
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+        )
+        return httpx.AsyncClient(limits=limits, http2=http2 and HTTP2_AVAILABLE)
+
+    def get(self, backend: str) -> httpx.AsyncClient:
+        """
+        Return the shared client for a backend, creating it on first use.
+        """
+        client = self._clients.get(backend)
+        if client is None or client.is_closed:
+            client = self._build(backend)
+            self._clients[backend] = client
+        return client
+
+    async def aclose(self):
+        """Close every client. Safe to call more than once."""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+http_pool = HTTPClientPool()
@@ -0,0 +1,232 @@
+import asyncio
+import random
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.models import GenerationJob, Portfolio
+from app.services.generation_service import generation_service
+
+
+class JobQueue:
+    """
+    Postgres-backed queue for portfolio generation.
+
+    Workers in any number of processes claim jobs with
+    SELECT ... FOR UPDATE SKIP LOCKED, so no two workers get the same job
+    and nobody blocks on a row another worker holds.
+    """
+    @staticmethod
+    async def enqueue(session: AsyncSession, portfolio_id: int, user_id: str, payload: Dict) -> GenerationJob:
+        """Add a job to the session; the caller commits."""
+        job = GenerationJob(
+            portfolio_id=portfolio_id,
+            user_id=user_id,
+            payload=payload,
+            status='queued',
+            stage='Queued',
+            max_attempts=settings.JOB_MAX_ATTEMPTS
+        )
+        session.add(job)
+        await session.flush()
+        return job
+
+    @staticmethod
+    async def claim(session: AsyncSession) -> Optional[GenerationJob]:
+        """
+        Claim the oldest runnable job whose user is under the concurrency cap.
+        """
+        cap = settings.JOB_USER_CONCURRENCY
+        running = aliased(GenerationJob)
+        running_for_user = (
+            select(func.count())
+            .where(running.user_id == GenerationJob.user_id, running.status == 'running')
+            .scalar_subquery()
+        )
+        stmt = (
+            select(GenerationJob)
+            .where(
+                GenerationJob.status == 'queued',
+                GenerationJob.run_after <= func.now(),
+                running_for_user < cap
+            )
+            .order_by(GenerationJob.run_after, GenerationJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = (await session.execute(stmt)).scalar_one_or_none()
+        if job is None:
+            await session.rollback()
+            return None
+
+        # Serialize claims per user, then re-check the cap: two workers may
+        # both have passed the check above for different jobs of one user.
+        await session.execute(select(func.pg_advisory_xact_lock(func.hashtext(job.user_id))))
+        running_now = await session.scalar(
+            select(func.count()).where(GenerationJob.user_id == job.user_id, GenerationJob.status == 'running')
+        )
+        if running_now >= cap:
+            await session.rollback()
+            return None
+
+        job.status = 'running'
+        job.stage = 'Starting'
+        job.attempts += 1
+        job.locked_at = func.now()
+        await session.commit()
+        await session.refresh(job)
+        return job
+
+    @staticmethod
+    async def update_progress(job_id: int, progress: int, stage: str):
+        """Record progress; also acts as the worker's heartbeat."""
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id)
+                .values(progress=progress, stage=stage, locked_at=func.now())
+            )
+            await session.commit()
+
+    @staticmethod
+    async def complete(job_id: int):
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id)
+                .values(status='done', progress=100, stage='Done', locked_at=None, error=None)
+            )
+            await session.commit()
+
+    @staticmethod
+    async def fail(job: GenerationJob, error: str):
+        """
+        Retry with exponential backoff (plus jitter), or mark the job and its
+        portfolio failed once attempts are exhausted.
+        """
+        async with AsyncSessionLocal() as session:
+            if job.attempts < job.max_attempts:
+                delay = settings.JOB_RETRY_BASE_SECONDS * (2 ** (job.attempts - 1))
+                delay *= random.uniform(0.8, 1.2)
+                values = dict(
+                    status='queued',
+                    stage=f"Retrying in {delay:.0f}s",
+                    run_after=func.now() + timedelta(seconds=delay),
+                    locked_at=None,
+                    error=error
+                )
+            else:
+                values = dict(status='failed', stage='Failed', locked_at=None, error=error)
+                await session.execute(
+                    update(Portfolio).where(Portfolio.id == job.portfolio_id).values(status='failed')
+                )
+            await session.execute(update(GenerationJob).where(GenerationJob.id == job.id).values(**values))
+            await session.commit()
+
+    @staticmethod
+    async def release(job_id: int):
+        """Put a job back on the queue without counting the attempt (shutdown)."""
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, GenerationJob.status == 'running')
+                .values(status='queued', stage='Queued', locked_at=None,
+                        attempts=GenerationJob.attempts - 1)
+            )
+            await session.commit()
+
+    @staticmethod
+    async def requeue_stale(session: AsyncSession) -> int:
+        """Requeue running jobs whose worker stopped sending heartbeats."""
+        cutoff = func.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT_SECONDS)
+        result = await session.execute(
+            update(GenerationJob)
+            .where(GenerationJob.status == 'running', GenerationJob.locked_at < cutoff)
+            .values(status='queued', stage='Requeued', locked_at=None)
+        )
+        await session.commit()
+        return result.rowcount
+
+    @staticmethod
+    async def get_latest_for_portfolio(session: AsyncSession, portfolio_id: int) -> Optional[GenerationJob]:
+        stmt = (
+            select(GenerationJob)
+            .where(GenerationJob.portfolio_id == portfolio_id)
+            .order_by(GenerationJob.id.desc())
+            .limit(1)
+        )
+        return (await session.execute(stmt)).scalar_one_or_none()
+
+
+class JobWorker:
+    """
+    Bounded pool of asyncio workers that claim and run generation jobs.
+    Run it inside the API process (JOB_WORKERS > 0) or on its own with
+    `python -m app.scripts.run_worker`.
+    """
+    def __init__(self, concurrency: int, poll_interval: float = 1.0, reap_interval: float = 30.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.reap_interval = reap_interval
+        self._tasks: List[asyncio.Task] = []
+        self._last_reap = 0.0
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._loop()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _loop(self):
+        while True:
+            try:
+                async with AsyncSessionLocal() as session:
+                    await self._maybe_reap(session)
+                    job = await JobQueue.claim(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error claiming generation job: {e}")
+                job = None
+
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self._run(job)
+
+    async def _maybe_reap(self, session: AsyncSession):
+        now = time.monotonic()
+        if now - self._last_reap >= self.reap_interval:
+            self._last_reap = now
+            requeued = await JobQueue.requeue_stale(session)
+            if requeued:
+                print(f"Requeued {requeued} stale generation job(s)")
+
+    async def _run(self, job: GenerationJob):
+        async def progress(value: int, stage: str):
+            await JobQueue.update_progress(job.id, value, stage)
+
+        try:
+            await generation_service.generate_portfolio(job.portfolio_id, job.payload, progress)
+        except asyncio.CancelledError:
+            await asyncio.shield(JobQueue.release(job.id))
+            raise
+        except Exception as e:
+            print(f"Generation job {job.id} failed (attempt {job.attempts}/{job.max_attempts}): {e}")
+            await JobQueue.fail(job, str(e))
+        else:
+            await JobQueue.complete(job.id)
+
+job_queue = JobQueue()
+job_worker = JobWorker(
+    concurrency=settings.JOB_WORKERS,
+    poll_interval=settings.JOB_POLL_INTERVAL_SECONDS
+)
@@ -0,0 +1,417 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+import httpx
+from app.core.config import settings
+from app.core.telemetry import observe_llm
+from app.services.http_client import http_pool
+
+_END = object()
+
+
+class LLMUnavailableError(Exception):
+    """Every provider failed or has an open circuit."""
+
+
+class LLMProvider:
+    """
+    One chat-completion backend speaking the OpenAI-compatible API
+    (`POST {base_url}/chat/completions`, SSE when streaming). OpenRouter
+    and self-hosted servers (vLLM, llama.cpp, LM Studio) use this as-is.
+    """
+    def __init__(self, name: str, base_url: str, model: str, api_key: Optional[str] = None,
+                 headers: Optional[Dict[str, str]] = None, pool: str = "openrouter"):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.pool = pool
+        self.headers = dict(headers or {})
+        if api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+
+    def _payload(self, messages: List[Dict[str, str]], temperature: float) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+
+    async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.2,
+                     usage: Optional[Dict[str, int]] = None) -> AsyncIterator[str]:
+        """
+        Yield content deltas; errors propagate to the router. Token counts
+        from the final usage chunk, if the server sends one, go into `usage`.
+        """
+        client = http_pool.get(self.pool)
+        async with client.stream(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            headers=self.headers,
+            json=self._payload(messages, temperature),
+            timeout=httpx.Timeout(settings.LLM_CONNECT_TIMEOUT_SECONDS, read=settings.LLM_READ_TIMEOUT_SECONDS)
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                # SSE: "data: {...}" events; ":" lines are keep-alive comments
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    raise RuntimeError(f"{self.name} stream error: {chunk['error']}")
+                if usage is not None and chunk.get("usage"):
+                    usage["prompt"] = chunk["usage"].get("prompt_tokens", 0)
+                    usage["completion"] = chunk["usage"].get("completion_tokens", 0)
+                choices = chunk.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+
+class OllamaProvider(LLMProvider):
+    """Ollama's native `POST /api/chat` (NDJSON when streaming)."""
+    def __init__(self, name: str, base_url: str, model: str):
+        super().__init__(name, base_url, model, pool="ollama")
+
+    async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.2,
+                     usage: Optional[Dict[str, int]] = None) -> AsyncIterator[str]:
+        client = http_pool.get(self.pool)
+        async with client.stream(
+            "POST",
+            f"{self.base_url}/api/chat",
+            json={"model": self.model, "messages": messages, "stream": True, "options": {"temperature": temperature}},
+            timeout=httpx.Timeout(settings.LLM_CONNECT_TIMEOUT_SECONDS, read=settings.LLM_READ_TIMEOUT_SECONDS)
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(f"{self.name} error: {chunk['error']}")
+                delta = (chunk.get("message") or {}).get("content")
+                if delta:
+                    yield delta
+                if chunk.get("done"):
+                    if usage is not None:
+                        usage["prompt"] = chunk.get("prompt_eval_count", 0)
+                        usage["completion"] = chunk.get("eval_count", 0)
+                    break
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `cooldown` seconds; then lets a single trial call through
+    (half-open) that either closes it again or re-opens it.
+    """
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release(self):
+        """A trial call was abandoned (e.g. lost a hedge) without an outcome."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class ProviderStats:
+    """Exponentially weighted latency and error rate for one provider."""
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.requests = 0
+        self.failures = 0
+        self.hedges_won = 0
+        self.first_token_ms: Optional[float] = None
+        self.total_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.measured_at = 0.0  # monotonic time of the last latency sample
+
+    def _ewma(self, current: Optional[float], value: float) -> float:
+        return value if current is None else current + self.alpha * (value - current)
+
+    def record(self, ok: bool, first_token_ms: Optional[float] = None, total_ms: Optional[float] = None):
+        self.requests += 1
+        self.error_rate = self._ewma(self.error_rate, 0.0 if ok else 1.0)
+        if not ok:
+            self.failures += 1
+        if first_token_ms is not None:
+            self.first_token_ms = self._ewma(self.first_token_ms, first_token_ms)
+            self.measured_at = time.monotonic()
+        if total_ms is not None:
+            self.total_ms = self._ewma(self.total_ms, total_ms)
+
+    def record_censored(self, elapsed_ms: float):
+        """
+        A hedge loser cancelled `elapsed_ms` after it started: its first
+        token would have taken at least that long. Only a bound above the
+        current estimate tells us anything, so smaller values are ignored.
+        """
+        if self.first_token_ms is None or elapsed_ms > self.first_token_ms:
+            self.first_token_ms = self._ewma(self.first_token_ms, elapsed_ms)
+            self.measured_at = time.monotonic()
+
+    def score(self, max_age: float) -> Optional[float]:
+        """
+        Expected first-token latency, penalized by errors. None without a
+        latency sample in the last `max_age` seconds; failures alone carry no
+        latency, so they never count as fresh data.
+        """
+        if self.first_token_ms is None or time.monotonic() - self.measured_at > max_age:
+            return None
+        return self.first_token_ms * (1 + 4 * self.error_rate)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 3),
+            "first_token_ms": round(self.first_token_ms, 1) if self.first_token_ms is not None else None,
+            "total_ms": round(self.total_ms, 1) if self.total_ms is not None else None,
+            "hedges_won": self.hedges_won,
+        }
+
+
+class _Attempt:
+    """A provider call pumping its deltas into a queue from its own task."""
+    def __init__(self, provider: LLMProvider, messages: List[Dict[str, str]], temperature: float):
+        self.provider = provider
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.started = time.perf_counter()
+        self.first_token_ms: Optional[float] = None
+        self.usage: Dict[str, int] = {}
+        self.task = asyncio.get_running_loop().create_task(self._pump(messages, temperature))
+
+    async def _pump(self, messages: List[Dict[str, str]], temperature: float):
+        try:
+            async for delta in self.provider.stream(messages, temperature, self.usage):
+                await self.queue.put(delta)
+            await self.queue.put(_END)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self.queue.put(e)
+
+    async def cancel(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+
+class LLMRouter:
+    """
+    Routes completions across providers.
+
+    Providers are tried best-first: those with a recent latency sample are
+    reordered among themselves by EWMA first-token latency (penalized by
+    error rate), while those without one keep their configured position, so
+    a primary that only failed is retried first and one demoted for being
+    slow is re-measured once its sample is `stats_max_age` old. A provider
+    whose circuit is open is
+    skipped. If a provider fails before its first token, the next one is
+    tried; once tokens are flowing there is no fallback, because they have
+    already been handed to the caller. With `hedge_after_ms` set, the next
+    provider is also started when the current one has not produced a first
+    token in that time, and whichever answers first wins.
+    """
+    def __init__(self, providers: List[LLMProvider], hedge_after_ms: float = 0.0,
+                 first_token_timeout: float = 30.0, breaker_failures: int = 3,
+                 breaker_cooldown: float = 30.0, stats_max_age: float = 300.0):
+        self.providers = providers
+        self.hedge_after = hedge_after_ms / 1000.0
+        self.first_token_timeout = first_token_timeout
+        self.stats_max_age = stats_max_age
+        self.breakers = {p.name: CircuitBreaker(breaker_failures, breaker_cooldown) for p in providers}
+        self.provider_stats = {p.name: ProviderStats() for p in providers}
+
+    def ranked(self) -> List[LLMProvider]:
+        scores = {p.name: self.provider_stats[p.name].score(self.stats_max_age) for p in self.providers}
+        # Stable sort: equal scores keep their configured order
+        measured = iter(sorted((p for p in self.providers if scores[p.name] is not None), key=lambda p: scores[p.name]))
+        return [p if scores[p.name] is None else next(measured) for p in self.providers]
+
+    def _next_allowed(self, candidates: List[LLMProvider]) -> Optional[LLMProvider]:
+        while candidates:
+            provider = candidates.pop(0)
+            if self.breakers[provider.name].allow():
+                return provider
+        return None
+
+    def _succeeded(self, winner: _Attempt):
+        total_ms = (time.perf_counter() - winner.started) * 1000
+        self.breakers[winner.provider.name].record_success()
+        self.provider_stats[winner.provider.name].record(True, winner.first_token_ms, total_ms)
+        observe_llm(winner.provider.name, True, winner.first_token_ms / 1000, total_ms / 1000, winner.usage)
+
+    def _failed(self, attempt: _Attempt, error: BaseException, errors: List[str]):
+        self.breakers[attempt.provider.name].record_failure()
+        self.provider_stats[attempt.provider.name].record(False)
+        observe_llm(attempt.provider.name, False, total_seconds=time.perf_counter() - attempt.started)
+        errors.append(f"{attempt.provider.name}: {error!r}")
+        print(f"LLM provider {attempt.provider.name} failed: {error!r}")
+
+    async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.2) -> AsyncIterator[str]:
+        """Yield content deltas from the first provider to produce a token."""
+        loop = asyncio.get_running_loop()
+        candidates = self.ranked()
+        errors: List[str] = []
+        attempts: List[_Attempt] = []
+        winner: Optional[_Attempt] = None
+        first = None
+        try:
+            # 1. Race for the first token: fall back on failure, hedge on slowness
+            while winner is None:
+                if not attempts:
+                    provider = self._next_allowed(candidates)
+                    if provider is None:
+                        raise LLMUnavailableError("; ".join(errors) or "all provider circuits are open")
+                    attempts.append(_Attempt(provider, messages, temperature))
+                    deadline = loop.time() + self.first_token_timeout
+                    hedge_at = loop.time() + self.hedge_after if self.hedge_after else None
+
+                gets = {loop.create_task(a.queue.get()): a for a in attempts}
+                wake_at = min(deadline, hedge_at) if hedge_at else deadline
+                done, pending = await asyncio.wait(
+                    gets, timeout=max(0.0, wake_at - loop.time()), return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in pending:
+                    task.cancel()
+
+                for task in done:
+                    attempt, item = gets[task], task.result()
+                    if isinstance(item, BaseException) or item is _END:
+                        error = item if item is not _END else RuntimeError("empty completion")
+                        self._failed(attempt, error, errors)
+                        attempts.remove(attempt)
+                    elif winner is None:
+                        winner, first = attempt, item
+                if winner is not None or not attempts:
+                    continue
+
+                if hedge_at and loop.time() >= hedge_at:
+                    hedge_at = None
+                    provider = self._next_allowed(candidates)
+                    if provider is not None:
+                        attempts.append(_Attempt(provider, messages, temperature))
+                elif loop.time() >= deadline:
+                    for attempt in attempts:
+                        await attempt.cancel()
+                        self._failed(attempt, TimeoutError("no first token"), errors)
+                    attempts = []
+
+            # 2. Commit to the winner
+            winner.first_token_ms = (time.perf_counter() - winner.started) * 1000
+            for attempt in attempts:
+                if attempt is not winner:
+                    # Slower than the winner: feed that into ranking so it gets demoted
+                    elapsed_ms = (time.perf_counter() - attempt.started) * 1000
+                    await attempt.cancel()
+                    self.breakers[attempt.provider.name].release()
+                    self.provider_stats[attempt.provider.name].record_censored(elapsed_ms)
+            if len(attempts) > 1:
+                self.provider_stats[winner.provider.name].hedges_won += 1
+            attempts = [winner]
+
+            yield first
+            while True:
+                item = await winner.queue.get()
+                if item is _END:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        except GeneratorExit:
+            # The consumer stopped reading (e.g. the stream parser saw the
+            # closing bracket); the winner's tokens were delivered
+            self._succeeded(winner)
+            raise
+        except (Exception, asyncio.CancelledError) as e:
+            if winner is not None and not isinstance(e, asyncio.CancelledError):
+                self._failed(winner, e, errors)
+            raise
+        else:
+            self._succeeded(winner)
+        finally:
+            for attempt in attempts:
+                await attempt.cancel()
+                self.breakers[attempt.provider.name].release()
+
+    async def complete(self, messages: List[Dict[str, str]], temperature: float = 0.2) -> str:
+        """Full completion text (streamed internally so hedging applies)."""
+        parts = []
+        async for delta in self.stream(messages, temperature):
+            parts.append(delta)
+        return "".join(parts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            p.name: {"circuit": self.breakers[p.name].state, **self.provider_stats[p.name].as_dict()}
+            for p in self.providers
+        }
+
+
+def build_providers() -> List[LLMProvider]:
+    """Providers named in LLM_PROVIDERS, in order."""
+    available = {
+        "openrouter": lambda: LLMProvider(
+            "openrouter",
+            settings.OPENROUTER_BASE_URL,
+            settings.OPENROUTER_MODEL,
+            api_key=settings.OPENROUTER_API_KEY,
+            headers={"HTTP-Referer": "https://gitfolio.ai", "X-Title": "GitFolio AI"}  # Required by OpenRouter
+        ),
+        "ollama": lambda: OllamaProvider("ollama", settings.OLLAMA_BASE_URL, settings.OLLAMA_CHAT_MODEL),
+        "openai": lambda: LLMProvider(
+            "openai",
+            settings.OPENAI_COMPAT_BASE_URL,
+            settings.OPENAI_COMPAT_MODEL,
+            api_key=settings.OPENAI_COMPAT_API_KEY,
+            pool="openai"
+        ),
+    }
+    unknown = [name for name in settings.LLM_PROVIDERS if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown LLM_PROVIDERS {unknown}, expected some of {list(available)}")
+    return [available[name]() for name in settings.LLM_PROVIDERS]
+
+llm_router = LLMRouter(
+    build_providers(),
+    hedge_after_ms=settings.LLM_HEDGE_AFTER_MS,
+    first_token_timeout=settings.LLM_FIRST_TOKEN_TIMEOUT_SECONDS,
+    breaker_failures=settings.LLM_BREAKER_FAILURES,
+    breaker_cooldown=settings.LLM_BREAKER_COOLDOWN_SECONDS
+)
@@ -1,90 +1,149 @@
-import httpx
-import json
-import re
 from app.core.config import settings
-from typing import List, Optional, Dict, Any
+import hashlib
+import time
+from typing import AsyncIterator, List, Optional, Dict, Any
 from app.core.prompts import SYSTEM_PROMPT
-from app.services.cache import async_cache, response_cache
+from app.core.telemetry import observe_embedding, span
+from app.services.cache import async_cache
+from app.services.http_client import http_pool
+from app.services.llm_router import llm_router
+from app.services.output_parser import parse_files
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import embedding_cache
+
+def _response_key(prompt: str, context: str = "", system_prompt: str = SYSTEM_PROMPT) -> str:
+    """In-memory cache key: a digest instead of the multi-kilobyte strings."""
+    digest = hashlib.sha256()
+    for part in (system_prompt, context, prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
 
 class LLMService:
     def __init__(self):
-        self.openrouter_key = settings.OPENROUTER_API_KEY
         self.ollama_base_url = settings.OLLAMA_BASE_URL
-        self.headers = {
-            "Authorization": f"Bearer {self.openrouter_key}",
-            "HTTP-Referer": "https://gitfolio.ai", # Required by OpenRouter
-            "X-Title": "GitFolio AI"
-        }
-
-    @async_cache(response_cache)
-    async def get_embedding(self, text: str, model: str = "snowflake-arctic-embed:33m") -> List[float]:
+        self._embed_down_until = 0.0
+        self._batcher = EmbeddingBatcher(
+            self._embed_batch,
+            max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS
+        )
+
+    @property
+    def embeddings_available(self) -> bool:
+        """False for EMBED_RETRY_AFTER_SECONDS after a failed embedding request."""
+        return time.monotonic() >= self._embed_down_until
+
+    async def get_embedding(self, text: str, model: str = settings.EMBEDDING_MODEL) -> List[float]:
         """
         Get embeddings from Ollama for a given text.
+        Concurrent calls are coalesced into batched /api/embed requests.
         """
-        async with httpx.AsyncClient() as client:
+        cached = await embedding_cache.get(model, text)
+        if cached is not None:
+            return cached
+
+        if settings.EMBED_COALESCE:
+            embedding = await self._batcher.embed(text, model)
+        else:
+            embedding = (await self._fetch_embeddings([text], model))[0]
+        await embedding_cache.put(model, text, embedding)
+        return embedding
+
+    async def get_embeddings(self, texts: List[str], model: str = settings.EMBEDDING_MODEL) -> List[List[float]]:
+        """
+        Get embeddings for many texts using Ollama's batch endpoint.
+        Returns one vector per input text, in order; failed texts get [].
+        """
+        cached = await embedding_cache.get_many(model, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        if not missing:
+            return cached
+
+        fetched = dict(zip(missing, await self._fetch_embeddings(missing, model)))
+        await embedding_cache.put_many(model, missing, [fetched[text] for text in missing])
+        return [vector if vector is not None else fetched[text] for text, vector in zip(texts, cached)]
+
+    async def _fetch_embeddings(self, texts: List[str], model: str) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        batch_size = settings.EMBED_BATCH_MAX_SIZE
+        for i in range(0, len(texts), batch_size):
+            batch = texts[i:i + batch_size]
             try:
-                # Ollama API: POST /api/embeddings
-                # Payload: { "model": "snowflake-arctic-embed", "prompt": "text" }
-                response = await client.post(
-                    f"{self.ollama_base_url}/api/embeddings",
-                    json={"model": model, "prompt": text},
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data["embedding"]
+                vectors.extend(await self._embed_batch(batch, model))
             except Exception as e:
-                print(f"Error fetching embedding: {e}")
-                return []
+                print(f"Error fetching embeddings: {e}")
+                vectors.extend([] for _ in batch)
+        return vectors
+
+    async def _embed_batch(self, texts: List[str], model: str) -> List[List[float]]:
+        client = http_pool.get("ollama")
+        start = time.perf_counter()
+        # Ollama API: POST /api/embed
+        # Payload: { "model": "snowflake-arctic-embed", "input": ["text", ...] }
+        try:
+            response = await client.post(
+                f"{self.ollama_base_url}/api/embed",
+                json={"model": model, "input": texts},
+                timeout=30.0
+            )
+            response.raise_for_status()
+        except Exception:
+            self._embed_down_until = time.monotonic() + settings.EMBED_RETRY_AFTER_SECONDS
+            raise
+        self._embed_down_until = 0.0
+        observe_embedding(model, time.perf_counter() - start, len(texts))
+        embeddings = response.json()["embeddings"]
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return embeddings
 
-    @async_cache(response_cache)
-    async def generate_code(self, prompt: str, context: str = "", model: str = "openrouter/meta-llama/llama-3.3-70b-instruct:free") -> List[Dict[str, str]]:
+    @async_cache(maxsize=100, ttl=3600, key=_response_key)
+    async def generate_code(self, prompt: str, context: str = "", system_prompt: str = SYSTEM_PROMPT) -> List[Dict[str, Any]]:
         """
-        Generate code using OpenRouter.
+        Generate code through the provider router (fallbacks, circuit
+        breakers and optional hedging are configured in settings).
         """
+        try:
+            with span("llm.generate"):
+                content = await llm_router.complete(self._build_messages(prompt, context, system_prompt))
+        except Exception as e:
+            print(f"Error generating code: {e}")
+            return []
+
+        # Parse JSON output, salvaging whatever files are intact
+        with span("llm.parse") as parse_span:
+            report = parse_files(content)
+            parse_span.set_attribute("files", len(report.files))
+        if report.dropped or report.repairs:
+            print(f"Recovered LLM output: {report.summary()}")
+        return report.files
+
+    async def stream_code(self, prompt: str, context: str = "", system_prompt: str = SYSTEM_PROMPT) -> AsyncIterator[str]:
+        """
+        Stream raw completion text from the first provider to respond.
+        Yields content deltas as they arrive; errors propagate to the caller.
+        """
+        deltas = llm_router.stream(self._build_messages(prompt, context, system_prompt))
+        try:
+            async for delta in deltas:
+                yield delta
+        finally:
+            # Close the router stream now rather than at garbage collection,
+            # so it records the outcome when the caller stops early
+            await deltas.aclose()
+
+    @staticmethod
+    def _build_messages(prompt: str, context: str = "", system_prompt: str = SYSTEM_PROMPT) -> List[Dict[str, str]]:
         messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "system", "content": system_prompt},
         ]
 
         if context:
              messages.append({"role": "system", "content": f"Context/Knowledge Base:\n{context}"})
 
         messages.append({"role": "user", "content": prompt})
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": 0.2
-        }
-
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    "https://openrouter.ai/api/v1/chat/completions",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=60.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                content = data["choices"][0]["message"]["content"]
-                
-                # Parse JSON output
-                try:
-                    # Remove markdown code blocks if present
-                    clean_content = re.sub(r"^```json\s*|\s*```$", "", content.strip(), flags=re.MULTILINE | re.DOTALL)
-                    parsed_files = json.loads(clean_content)
-                    if isinstance(parsed_files, list):
-                        return parsed_files
-                    else:
-                        print("LLM did not return a list")
-                        return []
-                except json.JSONDecodeError as e:
-                    print(f"JSON Parse Error: {e} \nContent: {content}")
-                    return []
-
-            except Exception as e:
-                print(f"Error generating code: {e}")
-                return []
+        return messages
 
 llm_service = LLMService()
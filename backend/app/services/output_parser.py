@@ -0,0 +1,263 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+_FENCE_RE = re.compile(r"^```[\w-]*\s*|\s*```\s*$")
+# Start of the file array (or of a bare file object when the model dropped the brackets)
+_ARRAY_START_RE = re.compile(r"\[\s*\{")
+_OBJECT_START_RE = re.compile(r"\{\s*\"filename\"")
+_STRUCTURAL_RE = re.compile(r'[{}\[\]",:]')
+_STRING_SPECIAL_RE = re.compile(r'["\\\x00-\x1f]')
+_NEXT_ELEMENT_RE = re.compile(r"[{\]]")
+_KEY_RE = re.compile(r'\s*"[A-Za-z_$][\w$-]*"\s*:')
+_WS_RE = re.compile(r"\s*")
+_FILENAME_RE = re.compile(r'"filename"\s*:\s*"([^"\\]{1,300})"')
+# A key left without a value at the point of truncation
+_DANGLING_RE = re.compile(r'(?:,|(?<=\{))\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+
+_DECODER = json.JSONDecoder()
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+_VALID_ESCAPES = set('"\\/bfnrtu')
+
+
+@dataclass
+class ParseReport:
+    """Outcome of parsing one model response."""
+    files: List[Dict[str, Any]] = field(default_factory=list)
+    dropped: List[str] = field(default_factory=list)  # what was discarded, and why
+    repairs: List[str] = field(default_factory=list)  # defects fixed to recover the files
+    strict: bool = True  # parsed as-is with json.loads (no scanning needed)
+
+    def summary(self) -> str:
+        parts = [f"{len(self.files)} file(s)"]
+        if self.repairs:
+            parts.append("repaired: " + ", ".join(sorted(set(self.repairs))))
+        if self.dropped:
+            parts.append("dropped: " + "; ".join(self.dropped))
+        return ", ".join(parts)
+
+
+class _Scanner:
+    """
+    Lenient single pass over a JSON array of objects. Each top-level
+    element is rewritten into valid JSON on the fly: raw control characters
+    in strings are escaped, quotes that cannot end a string (judged by what
+    follows them) are escaped, invalid escapes are unwrapped and trailing
+    commas are dropped. Returns one (text, error) pair per element.
+    """
+    def __init__(self, text: str):
+        self.text = text
+        self.repairs: List[str] = []
+
+    def scan(self, pos: int) -> List[Tuple[str, Optional[str]]]:
+        text = self.text
+        elements: List[Tuple[str, Optional[str]]] = []
+        i = pos
+        while True:
+            match = _NEXT_ELEMENT_RE.search(text, i)
+            if match is None or match.group() == "]":
+                return elements
+            element, i, error = self._element(match.start())
+            elements.append((element, error))
+            if error is not None:
+                # Truncated: nothing after this can be trusted
+                return elements
+
+    def _element(self, start: int) -> Tuple[str, int, Optional[str]]:
+        text, n = self.text, len(self.text)
+        out: List[str] = ["{"]
+        stack = ["{"]
+        expect_key = [True]
+        pending_comma = False
+        i = start + 1
+
+        while True:
+            match = _STRUCTURAL_RE.search(text, i)
+            if match is None:
+                out.append(text[i:])
+                return self._close_truncated(out, stack), n, None
+            chunk = text[i:match.start()]
+            if pending_comma and chunk.strip():
+                out.append(",")
+                pending_comma = False
+            out.append(chunk)
+            char = match.group()
+            i = match.end()
+
+            if char == '"':
+                if pending_comma:
+                    out.append(",")
+                    pending_comma = False
+                is_key = stack[-1] == "{" and expect_key[-1]
+                string, i = self._string(i, is_key, stack[-1])
+                if string is None:
+                    return "".join(out), n, "truncated inside a string"
+                out.append(string)
+            elif char in "{[":
+                if pending_comma:
+                    out.append(",")
+                    pending_comma = False
+                stack.append(char)
+                expect_key.append(char == "{")
+                out.append(char)
+            elif char in "}]":
+                if pending_comma:
+                    self.repairs.append("trailing comma")
+                    pending_comma = False
+                expected = "}" if stack[-1] == "{" else "]"
+                if char != expected:
+                    self.repairs.append("mismatched bracket")
+                out.append(expected)
+                stack.pop()
+                expect_key.pop()
+                if not stack:
+                    return "".join(out), i, None
+            elif char == ",":
+                pending_comma = True
+                if stack[-1] == "{":
+                    expect_key[-1] = True
+            else:  # ":"
+                out.append(":")
+                expect_key[-1] = False
+
+    def _string(self, i: int, is_key: bool, container: str) -> Tuple[Optional[str], int]:
+        text, n = self.text, len(self.text)
+        parts = ['"']
+        while True:
+            match = _STRING_SPECIAL_RE.search(text, i)
+            if match is None:
+                return None, n
+            parts.append(text[i:match.start()])
+            char = match.group()
+            i = match.end()
+            if char == "\\":
+                if i >= n:
+                    return None, n
+                escaped = text[i]
+                if escaped in _VALID_ESCAPES:
+                    parts.append("\\" + escaped)
+                else:
+                    self.repairs.append("invalid escape")
+                    parts.append(json.dumps(escaped)[1:-1])
+                i += 1
+            elif char == '"':
+                if self._closes(i, is_key, container):
+                    parts.append('"')
+                    return "".join(parts), i
+                self.repairs.append("unescaped quote")
+                parts.append('\\"')
+            else:
+                self.repairs.append("unescaped newline" if char in "\r\n" else "unescaped control character")
+                parts.append(_CONTROL_ESCAPES.get(char) or f"\\u{ord(char):04x}")
+
+    def _closes(self, i: int, is_key: bool, container: str) -> bool:
+        """Can a quote at i-1 end the string, given what follows it?"""
+        text = self.text
+        j = _WS_RE.match(text, i).end()
+        if j >= len(text):
+            return True
+        char = text[j]
+        if is_key:
+            return char == ":"
+        if char == ("}" if container == "{" else "]"):
+            # The closer must itself be followed by something that can follow a value
+            k = _WS_RE.match(text, j + 1).end()
+            return k >= len(text) or text[k] in ",}]"
+        if char != ",":
+            return False
+        k = _WS_RE.match(text, j + 1).end()
+        if k >= len(text):
+            return True
+        if container == "{":
+            return bool(_KEY_RE.match(text, j + 1)) or text[k] == "}"
+        return text[k] in '"{[]-0123456789tfn'
+
+    def _close_truncated(self, out: List[str], stack: List[str]) -> str:
+        """Close an element cut off between values (not inside a string)."""
+        self.repairs.append("truncated object")
+        body = _DANGLING_RE.sub("", "".join(out).rstrip().rstrip(","))
+        return body + "".join("}" if c == "{" else "]" for c in reversed(stack))
+
+
+def _element_name(text: str) -> str:
+    match = _FILENAME_RE.search(text)
+    return f"'{match.group(1)}'" if match else "unnamed object"
+
+def _is_file(value: Any) -> bool:
+    return (
+        isinstance(value, dict)
+        and isinstance(value.get("filename"), str) and bool(value["filename"])
+        and (isinstance(value.get("content"), str) or isinstance(value.get("edits"), list))
+    )
+
+def _collect(value: Any, report: ParseReport):
+    """Accept [...], {"files": [...]} or a single file object."""
+    if isinstance(value, dict):
+        value = value.get("files") if isinstance(value.get("files"), list) else [value]
+    if not isinstance(value, list):
+        report.dropped.append(f"top-level {type(value).__name__} is not a file list")
+        return
+    for index, item in enumerate(value):
+        if _is_file(item):
+            report.files.append(item)
+        else:
+            report.dropped.append(f"element {index}: not a file object")
+
+def parse_files(text: str) -> ParseReport:
+    """
+    Extract the file objects from a model response.
+
+    Valid JSON (optionally fenced) goes straight through json.loads. Anything
+    else is located inside the surrounding chatter and scanned leniently;
+    every element that can be recovered is kept and the rest is listed in
+    `report.dropped` instead of failing the whole response.
+    """
+    report = ParseReport()
+    stripped = _FENCE_RE.sub("", text.strip())
+    try:
+        _collect(json.loads(stripped), report)
+        return report
+    except json.JSONDecodeError:
+        pass
+
+    report.strict = False
+    match = _ARRAY_START_RE.search(text)
+    if match is not None:
+        # Valid array inside chatter: decode it in place, ignoring what follows
+        try:
+            value, _ = _DECODER.raw_decode(text, match.start())
+            _collect(value, report)
+            return report
+        except json.JSONDecodeError:
+            pass
+        start = match.start() + 1
+    else:
+        match = _OBJECT_START_RE.search(text)
+        if match is None:
+            report.dropped.append("no JSON array or file object found")
+            return report
+        report.repairs.append("missing array brackets")
+        start = match.start()
+
+    scanner = _Scanner(text)
+    for index, (element, error) in enumerate(scanner.scan(start)):
+        if error is not None:
+            report.dropped.append(f"element {index} ({_element_name(element)}): {error}")
+            continue
+        try:
+            value = json.loads(element)
+        except json.JSONDecodeError as e:
+            report.dropped.append(f"element {index} ({_element_name(element)}): {e.msg}")
+            continue
+        if _is_file(value):
+            report.files.append(value)
+        else:
+            report.dropped.append(f"element {index} ({_element_name(element)}): no content or edits")
+    report.repairs.extend(scanner.repairs)
+    return report
+
+def parse_object(text: str) -> Optional[Dict[str, Any]]:
+    """Repair and decode a single JSON object (e.g. one streamed element)."""
+    report = parse_files(text)
+    return report.files[0] if report.files else None
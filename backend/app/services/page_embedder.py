@@ -0,0 +1,219 @@
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import select, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.vector_index import distance, mean_vector
+from app.models.models import WebPage, WebPageChunk
+from app.services.chunker import chunk_file
+from app.services.embedding_registry import EmbeddingState, embedding_registry
+from app.services.llm_service import llm_service
+
+_MAX_RETRY_SECONDS = 3600.0
+
+
+class PageEmbedder:
+    """
+    Background chunking and embedding of saved portfolio files.
+
+    `schedule()` is called once a save has committed; it only queues the
+    (portfolio, file) pairs. One task per portfolio drains that queue, so a
+    burst of edits to a file collapses into a single pass over its latest
+    active version. Chunks whose content hash already has a vector in the
+    portfolio reuse it; only new or changed chunks are sent to the
+    embedding backend.
+
+    A complete pass records its model in WebPage.embedded_with (page rows
+    are immutable versions, so the model is all that can go stale). Files
+    whose pass failed are retried with exponential backoff.
+    """
+    def __init__(self, max_concurrency: int = 2, chunk_max_lines: int = 80, retry_seconds: float = 60.0):
+        self.chunk_max_lines = chunk_max_lines
+        self.retry_seconds = retry_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending: Dict[int, Set[str]] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # (portfolio_id, file_path) -> (consecutive failed passes, monotonic time of the next try)
+        self._failures: Dict[Tuple[int, str], Tuple[int, float]] = {}
+
+    def schedule(self, portfolio_id: int, file_paths: Iterable[str]):
+        """Queue files for (re-)embedding. Never blocks or touches the DB."""
+        file_paths = set(file_paths)
+        if not file_paths:
+            return
+        self._pending.setdefault(portfolio_id, set()).update(file_paths)
+        if portfolio_id not in self._tasks:
+            self._tasks[portfolio_id] = asyncio.get_running_loop().create_task(self._drain(portfolio_id))
+
+    def schedule_missing(self, portfolio_id: int, pages: Iterable[WebPage], state: EmbeddingState):
+        """
+        Queue active pages that have no vector in `state.column` and no
+        complete pass with `state.model`, skipping files still backing off.
+        """
+        now = time.monotonic()
+        self.schedule(portfolio_id, [
+            page.file_path for page in pages
+            if page.content and getattr(page, state.column) is None and page.embedded_with != state.model
+            and self._failures.get((portfolio_id, page.file_path), (0, 0.0))[1] <= now
+        ])
+
+    def _record(self, portfolio_id: int, file_paths: Iterable[str], ok: bool):
+        for file_path in file_paths:
+            key = (portfolio_id, file_path)
+            if ok:
+                self._failures.pop(key, None)
+                continue
+            failures = self._failures.get(key, (0, 0.0))[0] + 1
+            backoff = min(self.retry_seconds * 2 ** (failures - 1), _MAX_RETRY_SECONDS)
+            self._failures[key] = (failures, time.monotonic() + backoff)
+
+    def _prune(self, portfolio_id: int, removed: Iterable[str] = ()):
+        """
+        Forget failures of files that no longer exist, and any entry whose
+        retry came due more than _MAX_RETRY_SECONDS ago (nobody asked for that
+        file since, e.g. a deleted portfolio), so the map stays bounded.
+        """
+        for file_path in removed:
+            self._failures.pop((portfolio_id, file_path), None)
+        expired = time.monotonic() - _MAX_RETRY_SECONDS
+        for key in [k for k, (_, retry_at) in self._failures.items() if retry_at < expired]:
+            del self._failures[key]
+
+    async def _drain(self, portfolio_id: int):
+        try:
+            async with self._semaphore:
+                while True:
+                    file_paths = self._pending.pop(portfolio_id, None)
+                    if not file_paths:
+                        break
+                    try:
+                        await self.embed_files(portfolio_id, sorted(file_paths))
+                    except Exception as e:
+                        print(f"Error embedding pages of portfolio {portfolio_id}: {e}")
+                        self._record(portfolio_id, file_paths, ok=False)
+        finally:
+            # No await between the empty check and this, so a concurrent
+            # schedule() either landed in the loop above or starts a new task
+            self._tasks.pop(portfolio_id, None)
+            self._prune(portfolio_id)
+
+    async def embed_files(self, portfolio_id: int, file_paths: List[str]) -> int:
+        """
+        Re-chunk the active versions of `file_paths`, embed changed chunks and
+        replace the files' chunk rows. Returns the number of chunks embedded.
+        """
+        # 1. Load active pages and reusable chunk vectors, then release the connection
+        state = embedding_registry.state("pages")
+        async with AsyncSessionLocal() as session:
+            pages = (await session.execute(
+                select(WebPage).where(
+                    WebPage.portfolio_id == portfolio_id,
+                    WebPage.file_path.in_(file_paths),
+                    WebPage.is_active.is_(True)
+                )
+            )).scalars().all()
+            chunked = {page.id: (page, chunk_file(page.content or "", page.file_type, self.chunk_max_lines))
+                       for page in pages}
+            self._prune(portfolio_id, set(file_paths) - {page.file_path for page in pages})
+            hashes = {c.content_hash for _, chunks in chunked.values() for c in chunks}
+            known: Dict[str, List[float]] = {}
+            if hashes:
+                rows = await session.execute(
+                    select(WebPageChunk.content_hash, state.vector(WebPageChunk)).where(
+                        WebPageChunk.portfolio_id == portfolio_id,
+                        WebPageChunk.content_hash.in_(hashes),
+                        state.vector(WebPageChunk).is_not(None)
+                    )
+                )
+                known = {h: list(v) for h, v in rows}
+
+        # 2. Embed only chunks we have no vector for
+        missing = {c.content_hash: c for _, chunks in chunked.values() for c in chunks if c.content_hash not in known}
+        if missing:
+            texts = [f"{c.symbol or ''}\n{c.content}" for c in missing.values()]
+            vectors = await llm_service.get_embeddings(texts, model=state.model)
+            known.update({h: v for h, v in zip(missing, vectors) if v})
+
+        # 3. Swap in the new chunk rows, unless a newer version was saved meanwhile
+        #    (that save scheduled its own pass)
+        async with AsyncSessionLocal() as session:
+            still_active = set((await session.execute(
+                select(WebPage.id).where(WebPage.id.in_(list(chunked)), WebPage.is_active.is_(True))
+                .with_for_update()
+            )).scalars().all())
+            current = [chunked[page_id] for page_id in still_active]
+            if not current:
+                return 0
+
+            await session.execute(
+                delete(WebPageChunk).where(
+                    WebPageChunk.portfolio_id == portfolio_id,
+                    WebPageChunk.file_path.in_([page.file_path for page, _ in current])
+                )
+            )
+            for page, chunks in current:
+                session.add_all([
+                    WebPageChunk(
+                        portfolio_id=portfolio_id,
+                        page_id=page.id,
+                        file_path=page.file_path,
+                        chunk_index=c.index,
+                        symbol=c.symbol,
+                        start_line=c.start_line,
+                        end_line=c.end_line,
+                        content=c.content,
+                        content_hash=c.content_hash,
+                        **{state.column: known.get(c.content_hash)}
+                    )
+                    for c in chunks
+                ])
+                values = {state.column: mean_vector([known.get(c.content_hash) for c in chunks])}
+                if all(c.content_hash in known for c in chunks):
+                    values["embedded_with"] = state.model
+                await session.execute(update(WebPage).where(WebPage.id == page.id).values(values))
+            await session.commit()
+        for page, chunks in current:
+            self._record(portfolio_id, [page.file_path], ok=all(c.content_hash in known for c in chunks))
+        return sum(1 for h in missing if h in known)
+
+    @staticmethod
+    async def nearest_chunks(
+        session: AsyncSession,
+        portfolio_id: int,
+        query_embedding: List[float],
+        limit: int = 8,
+        state: Optional[EmbeddingState] = None
+    ) -> List[Tuple[WebPageChunk, float]]:
+        """
+        The portfolio's chunks closest to `query_embedding` (embedded with
+        `state.model`), as (chunk, distance). Exact scan via ix_web_page_chunks_file.
+        """
+        vector = (state or embedding_registry.state("pages")).vector(WebPageChunk)
+        dist = distance(vector, query_embedding)
+        stmt = (
+            select(WebPageChunk, dist.label("distance"))
+            .where(WebPageChunk.portfolio_id == portfolio_id, vector.is_not(None))
+            .order_by(dist)
+            .limit(limit)
+        )
+        return [(chunk, d) for chunk, d in (await session.execute(stmt)).all()]
+
+    async def stop(self, timeout: float = 10.0):
+        """Give in-flight passes a moment to finish, then cancel the rest."""
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        _, still_running = await asyncio.wait(tasks, timeout=timeout)
+        for task in still_running:
+            task.cancel()
+        await asyncio.gather(*still_running, return_exceptions=True)
+        # Anything left unembedded is picked up lazily on the next chat edit
+        self._pending.clear()
+
+page_embedder = PageEmbedder(
+    max_concurrency=settings.PAGE_EMBED_CONCURRENCY,
+    chunk_max_lines=settings.PAGE_CHUNK_MAX_LINES,
+    retry_seconds=settings.PAGE_EMBED_RETRY_SECONDS
+)
@@ -0,0 +1,145 @@
+import hashlib
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import undefer
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.models.models import WebPage
+
+_SAVE_ATTEMPTS = 3
+
+
+class PageService:
+    """
+    Versioned storage for generated portfolio files.
+
+    Each (portfolio_id, file_path) has exactly one active row (enforced by
+    ux_web_pages_one_active). Saving new content inserts version N+1 and
+    deactivates the previous row in the same transaction; saving identical
+    content is a no-op.
+    """
+    @staticmethod
+    def content_hash(content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    async def get_active_pages(session: AsyncSession, portfolio_id: int,
+                               file_paths: Optional[List[str]] = None,
+                               vector_column: Optional[str] = None) -> List[WebPage]:
+        """
+        Current file tree (or just `file_paths`), served by ix_web_pages_active.
+        `vector_column` also loads that (otherwise deferred) embedding column.
+        """
+        stmt = (
+            select(WebPage)
+            .where(WebPage.portfolio_id == portfolio_id, WebPage.is_active.is_(True))
+            .order_by(WebPage.file_path)
+        )
+        if vector_column:
+            stmt = stmt.options(undefer(getattr(WebPage, vector_column)))
+        if file_paths is not None:
+            stmt = stmt.where(WebPage.file_path.in_(file_paths))
+        result = await session.execute(stmt)
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def save_files(session: AsyncSession, portfolio_id: int, files: List[Dict[str, str]]) -> List[WebPage]:
+        """
+        Write new versions for changed files. Returns only the pages that were
+        written; the caller commits.
+        """
+        # Last write wins if the model returned a file twice
+        contents = {f["filename"]: f["content"] for f in files if f.get("filename") and f.get("content")}
+        if not contents:
+            return []
+
+        # Two first writes of the same path have no row to lock and race to
+        # insert; the loser's savepoint is rolled back and it retries against
+        # the committed winner
+        for attempt in range(_SAVE_ATTEMPTS):
+            try:
+                async with session.begin_nested():
+                    written = await PageService._write_versions(session, portfolio_id, contents)
+                break
+            except IntegrityError:
+                if attempt == _SAVE_ATTEMPTS - 1:
+                    raise
+        if written and settings.WEBPAGE_KEEP_VERSIONS > 0:
+            await PageService.compact_versions(
+                session, portfolio_id, [p.file_path for p in written], settings.WEBPAGE_KEEP_VERSIONS
+            )
+        return written
+
+    @staticmethod
+    async def _write_versions(session: AsyncSession, portfolio_id: int, contents: Dict[str, str]) -> List[WebPage]:
+        # Lock the current versions so concurrent edits of a file serialize
+        stmt = (
+            select(WebPage)
+            .where(
+                WebPage.portfolio_id == portfolio_id,
+                WebPage.file_path.in_(list(contents)),
+                WebPage.is_active.is_(True)
+            )
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        current: Dict[str, List[WebPage]] = {}
+        for page in (await session.execute(stmt)).scalars().all():
+            current.setdefault(page.file_path, []).append(page)
+
+        changed = {}
+        for filename, content in contents.items():
+            content_hash = PageService.content_hash(content)
+            previous = current.get(filename, [])
+            if any(p.content_hash == content_hash or (p.content_hash is None and p.content == content) for p in previous):
+                continue
+            for page in previous:
+                page.is_active = False
+            changed[filename] = (content, content_hash, previous)
+        # Deactivate before inserting: the unique index is checked per statement
+        await session.flush()
+
+        written = []
+        for filename, (content, content_hash, previous) in changed.items():
+            page = WebPage(
+                portfolio_id=portfolio_id,
+                file_path=filename,
+                content=content,
+                content_hash=content_hash,
+                file_type=filename.split('.')[-1] if '.' in filename else None,
+                version=max((p.version or 1 for p in previous), default=0) + 1,
+                is_active=True
+            )
+            session.add(page)
+            written.append(page)
+        await session.flush()
+        return written
+
+    @staticmethod
+    async def compact_versions(session: AsyncSession, portfolio_id: int, file_paths: Optional[List[str]] = None,
+                               keep: int = 20) -> int:
+        """
+        Delete inactive versions beyond the newest `keep` per file.
+        """
+        ranked = (
+            select(
+                WebPage.id,
+                func.row_number().over(
+                    partition_by=WebPage.file_path, order_by=WebPage.version.desc()
+                ).label("rank")
+            )
+            .where(WebPage.portfolio_id == portfolio_id, WebPage.is_active.is_(False))
+        )
+        if file_paths:
+            ranked = ranked.where(WebPage.file_path.in_(file_paths))
+        ranked = ranked.subquery()
+
+        result = await session.execute(
+            delete(WebPage)
+            .where(WebPage.id.in_(select(ranked.c.id).where(ranked.c.rank > keep)))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+page_service = PageService()
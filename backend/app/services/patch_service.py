@@ -0,0 +1,208 @@
+import difflib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.prompts import REWRITE_SYSTEM_PROMPT
+from app.services.llm_service import llm_service
+from app.services.page_service import page_service
+
+
+@dataclass
+class PatchResult:
+    files: List[Dict[str, str]] = field(default_factory=list)  # {filename, content} ready to save
+    failed: List[str] = field(default_factory=list)  # files that need a full rewrite
+
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+def _first_indent(lines: List[str]) -> str:
+    return next((_indent(l) for l in lines if l.strip()), "")
+
+def _reindent(lines: List[str], found: str) -> List[str]:
+    """
+    Move the replacement block so its first line sits at the anchor's
+    indentation `found`, keeping each line's indentation relative to the
+    block's own first line (the model often dedents the whole block).
+    """
+    base = _first_indent(lines)
+    if base == found:
+        return lines
+    shifted = []
+    for l in lines:
+        indent = _indent(l)
+        if not l.strip():
+            shifted.append(l)
+        elif indent.startswith(base):
+            shifted.append(found + l[len(base):])
+        elif base.startswith(indent):
+            # Shallower than the first line (e.g. a closing brace)
+            cut = len(base) - len(indent)
+            shifted.append(found[:max(0, len(found) - cut)] + l.lstrip())
+        else:
+            shifted.append(l)  # tabs vs spaces; leave it alone
+    return shifted
+
+def _trim_blank(lines: List[str]) -> List[str]:
+    start, end = 0, len(lines)
+    while start < end and not lines[start].strip():
+        start += 1
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    return lines[start:end]
+
+
+class PatchService:
+    """
+    Applies the model's search/replace edits to active portfolio files.
+
+    Each `search` block is anchored in three steps: exact text match, then
+    a line match that ignores indentation and trailing whitespace, then the
+    most similar window of lines (difflib ratio >= PATCH_FUZZY_THRESHOLD).
+    Each step must find exactly one place: an anchor that matches several
+    (a repeated `</div>`) is ambiguous. A file whose edits cannot all be
+    anchored is left untouched and reported for a full rewrite.
+    """
+    @staticmethod
+    def locate(lines: List[str], search_lines: List[str], threshold: float) -> Optional[Tuple[int, int]]:
+        """[start, end) line range of `search_lines` in `lines`, or None if absent or ambiguous."""
+        n = len(search_lines)
+        if not n or n > len(lines):
+            return None
+
+        stripped = [l.strip() for l in lines]
+        wanted = [l.strip() for l in search_lines]
+        matches = [i for i in range(len(lines) - n + 1) if stripped[i:i + n] == wanted]
+        if matches:
+            return (matches[0], matches[0] + n) if len(matches) == 1 else None
+
+        target = "\n".join(wanted)
+        best, best_ratio, tied = None, threshold, False
+        # Allow the model to have dropped or added a line
+        for size in {max(1, n - 1), n, n + 1}:
+            for i in range(len(lines) - size + 1):
+                matcher = difflib.SequenceMatcher(None, "\n".join(stripped[i:i + size]), target, autojunk=False)
+                if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                    continue
+                ratio = matcher.ratio()
+                if best is None or ratio > best_ratio:
+                    best, best_ratio, tied = (i, i + size), ratio, False
+                elif ratio == best_ratio and (i >= best[1] or i + size <= best[0]):
+                    tied = True  # an equally good window elsewhere in the file
+        return None if tied else best
+
+    @staticmethod
+    def apply_edits(content: str, edits: List[Dict[str, Any]], threshold: Optional[float] = None) -> Optional[str]:
+        """
+        Apply edits in order. Returns the new content, or None if any edit
+        could not be anchored.
+        """
+        threshold = threshold if threshold is not None else settings.PATCH_FUZZY_THRESHOLD
+        newline = "\r\n" if "\r\n" in content else "\n"
+        content = content.replace("\r\n", "\n")
+
+        for edit in edits:
+            if not isinstance(edit, dict):
+                return None
+            search = (edit.get("search") or "").replace("\r\n", "\n")
+            replace = (edit.get("replace") or "").replace("\r\n", "\n")
+
+            if not search.strip():
+                # Empty anchor: append
+                content = content.rstrip("\n") + "\n" + replace.strip("\n") + "\n"
+                continue
+            occurrences = content.count(search)
+            if occurrences > 1:
+                return None  # ambiguous; the line and fuzzy steps would match the same places
+            if occurrences == 1:
+                content = content.replace(search, replace, 1)
+                continue
+
+            lines = content.split("\n")
+            search_lines = _trim_blank(search.split("\n"))
+            span = PatchService.locate(lines, search_lines, threshold)
+            if span is None:
+                return None
+            start, end = span
+            replace_lines = _reindent(
+                _trim_blank(replace.split("\n")) if replace.strip() else [],
+                _first_indent(lines[start:end])
+            )
+            content = "\n".join(lines[:start] + replace_lines + lines[end:])
+
+        return content.replace("\n", newline)
+
+    @staticmethod
+    def apply_items(current: Dict[str, str], items: List[Dict[str, Any]]) -> PatchResult:
+        """
+        Resolve the model's per-file output against `current` ({file_path: content}).
+        Items with `content` are new files or full rewrites; items with `edits`
+        are patched. Edits to unknown files and unanchored edits go to `failed`.
+        """
+        result = PatchResult()
+        for item in items:
+            filename = item.get("filename")
+            if not filename:
+                continue
+            if item.get("content"):
+                result.files.append({"filename": filename, "content": item["content"]})
+                continue
+            edits = item.get("edits")
+            if not isinstance(edits, list) or not edits:
+                continue
+            base = current.get(filename)
+            patched = PatchService.apply_edits(base, edits) if base is not None else None
+            if patched is None:
+                result.failed.append(filename)
+            else:
+                # Later items for the same file build on earlier ones
+                current[filename] = patched
+                result.files.append({"filename": filename, "content": patched})
+        return result
+
+    @staticmethod
+    async def rewrite_files(message: str, current: Dict[str, str], file_paths: List[str]) -> List[Dict[str, str]]:
+        """
+        Full-file fallback for files whose edits did not apply. Only the
+        listed files are sent and accepted back.
+        """
+        context = "".join(
+            f"Filename: {path}\nContent:\n{current.get(path, '')}\n\n" for path in file_paths
+        )
+        prompt = f"{message}\n\nReturn the complete updated content of: {', '.join(file_paths)}"
+        rewritten = await llm_service.generate_code(prompt, context=context, system_prompt=REWRITE_SYSTEM_PROMPT)
+        wanted = set(file_paths)
+        return [
+            {"filename": f["filename"], "content": f["content"]}
+            for f in rewritten
+            if f.get("filename") in wanted and f.get("content")
+        ]
+
+    @staticmethod
+    def edited_paths(items: List[Dict[str, Any]]) -> List[str]:
+        """Files the model wants to patch (their current content is needed)."""
+        return [item["filename"] for item in items if item.get("filename") and item.get("edits")]
+
+    @staticmethod
+    async def resolve(message: str, current: Dict[str, str], items: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """
+        Turn the model's edit output into full file contents, rewriting
+        files whose edits did not apply. Needs no DB session, so callers
+        can run it (and the rewrite call) outside any transaction.
+        """
+        result = PatchService.apply_items(current, items)
+        if result.failed:
+            print(f"Edits did not apply to {result.failed}, requesting full rewrite")
+            result.files.extend(await PatchService.rewrite_files(message, current, result.failed))
+        return result.files
+
+    @staticmethod
+    async def current_contents(session: AsyncSession, portfolio_id: int, file_paths: List[str]) -> Dict[str, str]:
+        """Active content of the files the model wants to edit."""
+        if not file_paths:
+            return {}
+        pages = await page_service.get_active_pages(session, portfolio_id, file_paths)
+        return {page.file_path: page.content or "" for page in pages}
+
+patch_service = PatchService()
@@ -0,0 +1,220 @@
+import hashlib
+import re
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.prompts import SYSTEM_PROMPT
+from app.core.telemetry import span
+from app.models.models import ResponseCacheEntry
+from app.services.embedding_registry import embedding_registry
+from app.services.llm_service import llm_service
+
+# Entries generated with a different system prompt are never reused
+VARIANT = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:16]
+_SUBJECT = "{user}"
+
+
+def _subject_pattern(subject: str, ignore_case: bool = True) -> "re.Pattern":
+    # GitHub usernames are [A-Za-z0-9-]; match whole names only
+    return re.compile(rf"(?<![\w-]){re.escape(subject)}(?![\w-])", re.IGNORECASE if ignore_case else 0)
+
+
+class ResponseCache:
+    """
+    Semantic cache of generated portfolio file sets.
+
+    A request is described by its template id and its custom prompt,
+    normalized (case, whitespace, the username replaced by a placeholder).
+    An exact match on the hash of that description is tried first; failing
+    that, the description is embedded and the closest entry for the same
+    template is reused if it is at least RESPONSE_CACHE_MIN_SIMILARITY
+    cosine-similar. Reused files are adapted by substituting the new
+    username for the one they were generated for (see reusable()).
+
+    Only hashes and embeddings are stored as keys, never the prompt text,
+    so an embedding model migration cannot re-embed entries: after a switch
+    older entries only serve exact hits until they age out.
+
+    The table is bounded: expired entries and, past RESPONSE_CACHE_MAX_ENTRIES,
+    the least-hit (then least recently hit) ones are deleted on each store.
+    """
+    def __init__(self):
+        self.counters: Dict[str, int] = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    @staticmethod
+    def normalize(prompt: Optional[str], subject: Optional[str] = None) -> str:
+        text = prompt or ""
+        if subject:
+            text = _subject_pattern(subject).sub(_SUBJECT, text)
+        return " ".join(text.lower().split())
+
+    @staticmethod
+    def key_hash(template_id: Optional[str], normalized: str) -> str:
+        key = f"{VARIANT}\x00{template_id or ''}\x00{normalized}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def embedding_text(template_id: Optional[str], normalized: str) -> str:
+        return f"template: {template_id or 'default'}\nrequest: {normalized or 'portfolio'}"
+
+    @staticmethod
+    def reusable(cached_subject: Optional[str], subject: Optional[str]) -> bool:
+        """
+        Whether files generated for `cached_subject` can be adapted for
+        `subject`. A lowercase all-letter username ("dev", "design") may also
+        be an ordinary word in the files, so such entries only serve the
+        same user.
+        """
+        if not cached_subject or not subject or cached_subject == subject:
+            return True
+        return not (cached_subject.isalpha() and cached_subject.islower())
+
+    @staticmethod
+    def adapt(files: List[Dict[str, Any]], cached_subject: Optional[str],
+              subject: Optional[str]) -> List[Dict[str, str]]:
+        """Cached files with the original username (exact case) replaced by the requester's."""
+        if not cached_subject or not subject or cached_subject == subject:
+            return [{"filename": f["filename"], "content": f["content"]} for f in files]
+        pattern = _subject_pattern(cached_subject, ignore_case=False)
+        return [
+            {"filename": f["filename"], "content": pattern.sub(lambda _: subject, f["content"])}
+            for f in files
+        ]
+
+    @staticmethod
+    def _fresh():
+        return ResponseCacheEntry.created_at >= func.now() - timedelta(hours=settings.RESPONSE_CACHE_TTL_HOURS)
+
+    async def lookup(
+        self,
+        session: AsyncSession,
+        template_id: Optional[str],
+        custom_prompt: Optional[str],
+        subject: Optional[str]
+    ) -> Optional[List[Dict[str, str]]]:
+        """Files of a matching earlier generation, or None on a miss."""
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return None
+        normalized = self.normalize(custom_prompt, subject)
+
+        with span("response_cache.lookup") as lookup_span:
+            result = await session.execute(
+                select(ResponseCacheEntry).where(
+                    ResponseCacheEntry.key_hash == self.key_hash(template_id, normalized),
+                    self._fresh()
+                )
+            )
+            entry = result.scalar_one_or_none()
+            kind = "exact_hits"
+
+            if entry is None:
+                state = embedding_registry.state("response_cache")
+                embedding = await llm_service.get_embedding(
+                    self.embedding_text(template_id, normalized), model=state.model
+                )
+                if not embedding:
+                    self.counters["misses"] += 1
+                    return None
+                vector = state.vector(ResponseCacheEntry)
+                dist = vector.cosine_distance(embedding)
+                result = await session.execute(
+                    select(ResponseCacheEntry, dist)
+                    .where(
+                        ResponseCacheEntry.variant == VARIANT,
+                        ResponseCacheEntry.template_id.is_not_distinct_from(template_id),
+                        vector.is_not(None),
+                        self._fresh()
+                    )
+                    .order_by(dist)
+                    .limit(1)
+                )
+                row = result.first()
+                if row is None or row[1] > 1.0 - settings.RESPONSE_CACHE_MIN_SIMILARITY:
+                    self.counters["misses"] += 1
+                    lookup_span.set_attribute("hit", False)
+                    return None
+                entry, kind = row[0], "semantic_hits"
+
+            if not self.reusable(entry.subject, subject):
+                self.counters["misses"] += 1
+                lookup_span.set_attribute("hit", False)
+                return None
+
+            self.counters[kind] += 1
+            lookup_span.set_attribute("hit", True)
+            await session.execute(
+                update(ResponseCacheEntry)
+                .where(ResponseCacheEntry.id == entry.id)
+                .values(hits=ResponseCacheEntry.hits + 1, last_hit_at=func.now())
+            )
+            return self.adapt(entry.files, entry.subject, subject)
+
+    async def store(
+        self,
+        session: AsyncSession,
+        template_id: Optional[str],
+        custom_prompt: Optional[str],
+        subject: Optional[str],
+        files: List[Dict[str, str]]
+    ):
+        """Cache a successful generation and evict past the size bound."""
+        if not settings.RESPONSE_CACHE_ENABLED or not files:
+            return
+        normalized = self.normalize(custom_prompt, subject)
+        # Usually an embedding-cache hit: lookup() embedded the same text
+        state = embedding_registry.state("response_cache")
+        embedding = await llm_service.get_embedding(self.embedding_text(template_id, normalized), model=state.model)
+        if not embedding:
+            return
+
+        values = {
+            "variant": VARIANT,
+            "template_id": template_id,
+            "subject": subject,
+            state.column: embedding,
+            "files": [{"filename": f["filename"], "content": f["content"]} for f in files],
+        }
+        stmt = insert(ResponseCacheEntry).values(key_hash=self.key_hash(template_id, normalized), **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ResponseCacheEntry.key_hash],
+            set_={**values, "created_at": func.now()}
+        )
+        await session.execute(stmt)
+        self.counters["stores"] += 1
+        await self.evict(session)
+
+    async def evict(self, session: AsyncSession) -> int:
+        """Delete expired entries, then the least used beyond the size bound."""
+        result = await session.execute(delete(ResponseCacheEntry).where(~self._fresh()))
+        removed = result.rowcount or 0
+
+        count = (await session.execute(select(func.count(ResponseCacheEntry.id)))).scalar_one()
+        excess = count - settings.RESPONSE_CACHE_MAX_ENTRIES
+        if excess > 0:
+            # LFU, ties broken by least recently hit
+            victims = (
+                select(ResponseCacheEntry.id)
+                .order_by(ResponseCacheEntry.hits, ResponseCacheEntry.last_hit_at)
+                .limit(excess)
+            )
+            result = await session.execute(delete(ResponseCacheEntry).where(ResponseCacheEntry.id.in_(victims)))
+            removed += result.rowcount or 0
+
+        self.counters["evictions"] += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["exact_hits"] + self.counters["semantic_hits"]
+        lookups = hits + self.counters["misses"]
+        return {**self.counters, "hit_ratio": round(hits / lookups, 3) if lookups else 0.0}
+
+response_cache = ResponseCache()
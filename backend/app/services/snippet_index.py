@@ -0,0 +1,267 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.models import CodeSnippet, IndexVersion
+from app.services.embedding_registry import embedding_registry
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+VERSION_NAME = "code_snippets"
+# Rows updated in a transaction that committed after a refresh started can
+# carry an earlier updated_at than the watermark; re-read this far back.
+_WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+async def bump_version(session: AsyncSession, name: str = VERSION_NAME):
+    """Mark `name` as changed; part of the caller's transaction."""
+    stmt = insert(IndexVersion).values(name=name, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IndexVersion.name],
+        set_={"version": IndexVersion.version + 1, "updated_at": func.now()}
+    )
+    await session.execute(stmt)
+
+async def current_version(session: AsyncSession, name: str = VERSION_NAME) -> int:
+    result = await session.execute(select(IndexVersion.version).where(IndexVersion.name == name))
+    return result.scalar_one_or_none() or 0
+
+
+class _Snapshot:
+    """
+    Immutable arrays for one index version; replaced wholesale on refresh.
+    Rows are grouped by category so a category filter is a slice (a view)
+    of the matrix rather than a gathered copy.
+    """
+    def __init__(self, snippets: List[CodeSnippet], matrix: "np.ndarray", version: int,
+                 watermark: Optional[datetime], column: str):
+        # Sort on the exact value (None before "") so each category is one contiguous run
+        order = sorted(range(len(snippets)), key=lambda i: (snippets[i].category is not None, snippets[i].category or ""))
+        self.snippets = [snippets[i] for i in order]  # detached rows (vector deferred)
+        self.matrix = np.ascontiguousarray(matrix[order]) if len(snippets) else matrix
+        self.version = version
+        self.watermark = watermark
+        self.column = column  # vector column (embedding model) the matrix was read from
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix) if len(snippets) else np.zeros(0, np.float32)
+        self.subcategories = np.array([s.subcategory for s in self.snippets], dtype=object)
+        self.frameworks = np.array([s.framework for s in self.snippets], dtype=object)
+        self.by_category: Dict[str, slice] = {}
+        start = 0
+        for end in range(1, len(self.snippets) + 1):
+            category = self.snippets[start].category
+            if end == len(self.snippets) or self.snippets[end].category != category:
+                self.by_category[category] = slice(start, end)
+                start = end
+
+
+class SnippetIndex:
+    """
+    In-memory exact nearest-neighbour index over CodeSnippet vectors.
+
+    All vectors live in one contiguous float32 matrix (rows unit-normalized
+    for the cosine metric); a search is one matrix-vector product plus
+    argpartition over the rows that pass the category/subcategory/framework
+    pre-filter. A background task polls the code_snippets version marker and,
+    when ingestion has bumped it, reloads only rows changed since the last
+    refresh and drops deleted ones. Searches read whichever snapshot is
+    current, so a refresh never blocks them.
+
+    `search()` returns None when it cannot answer (numpy missing, not loaded
+    yet, corpus above SNIPPET_INDEX_MAX_ROWS, tag filters, or loaded from a
+    different vector column than the caller's embedding model uses, as
+    right after a model migration switch), and the caller falls back to
+    pgvector.
+    """
+    def __init__(self, max_rows: int = 20000, refresh_interval: float = 30.0):
+        self.max_rows = max_rows
+        self.refresh_interval = refresh_interval
+        self.metric = settings.VECTOR_METRIC
+        self.enabled = settings.SNIPPET_INDEX_ENABLED and NUMPY_AVAILABLE
+        self._snapshot: Optional[_Snapshot] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        if settings.SNIPPET_INDEX_ENABLED and not NUMPY_AVAILABLE:
+            print("SNIPPET_INDEX_ENABLED is set but numpy is not installed; snippet search uses pgvector")
+
+    @property
+    def size(self) -> int:
+        return len(self._snapshot.snippets) if self._snapshot is not None else 0
+
+    def _to_matrix(self, vectors: list) -> "np.ndarray":
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        matrix = np.ascontiguousarray(np.array([np.asarray(v, dtype=np.float32) for v in vectors]))
+        if self.metric == "cosine":
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1.0, norms)
+        return matrix
+
+    def _build(self, snapshot: Optional[_Snapshot], rows: list, present: Optional[set],
+               incremental: bool, version: int, column: str) -> _Snapshot:
+        """The new snapshot from freshly read rows (runs in a worker thread)."""
+        watermark = max((r[2] for r in rows if r[2] is not None), default=None)
+        fresh = [r[0] for r in rows]
+        matrix = self._to_matrix([r[1] for r in rows])
+        if incremental:
+            # Keep unchanged rows that still exist, append re-read ones
+            reread = {s.id for s in fresh}
+            keep = np.array(
+                [i for i, s in enumerate(snapshot.snippets) if s.id in present and s.id not in reread],
+                dtype=np.int64
+            )
+            fresh = [snapshot.snippets[i] for i in keep] + fresh
+            parts = [snapshot.matrix[keep]] if len(keep) else []
+            if len(matrix):
+                parts.append(matrix)
+            matrix = np.ascontiguousarray(np.vstack(parts)) if parts else self._to_matrix([])
+            if snapshot.watermark is not None:
+                watermark = max(watermark, snapshot.watermark) if watermark else snapshot.watermark
+
+        return _Snapshot(fresh, matrix, version, watermark, column)
+
+    async def refresh(self, force: bool = False) -> bool:
+        """Reload if the version marker moved. Returns True if the snapshot changed."""
+        if not self.enabled:
+            return False
+        column = embedding_registry.state("snippets").column
+        async with self._lock, AsyncSessionLocal() as session:
+            version = await current_version(session)
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.column != column:
+                force = True
+            if snapshot is not None and snapshot.version == version and not force:
+                return False
+
+            start = time.perf_counter()
+            count = (await session.execute(select(func.count(CodeSnippet.id)))).scalar_one()
+            if count > self.max_rows:
+                if snapshot is not None or force:
+                    print(f"Snippet index disabled: {count} snippets exceeds SNIPPET_INDEX_MAX_ROWS={self.max_rows}")
+                self._snapshot = None
+                return snapshot is not None
+
+            changed_at = func.coalesce(CodeSnippet.updated_at, CodeSnippet.created_at)
+            vector = getattr(CodeSnippet, column)
+            stmt = select(CodeSnippet, vector, changed_at)
+            incremental = snapshot is not None and snapshot.watermark is not None and not force
+            if incremental:
+                stmt = stmt.where(changed_at >= snapshot.watermark - _WATERMARK_OVERLAP)
+            rows = (await session.execute(stmt.where(vector.is_not(None)))).all()
+            present = None
+            if incremental:
+                result = await session.execute(select(CodeSnippet.id).where(vector.is_not(None)))
+                present = set(result.scalars().all())
+
+        # Converting and stacking the vectors is CPU-bound; keep it off the event loop
+        self._snapshot = await asyncio.to_thread(
+            self._build, snapshot, rows, present, incremental, version, column
+        )
+        fresh = self._snapshot.snippets
+        print(
+            f"Snippet index v{version}: {len(fresh)} snippets "
+            f"({'incremental' if incremental else 'full'} load, {len(rows)} read, "
+            f"{(time.perf_counter() - start) * 1000:.0f} ms)"
+        )
+        return True
+
+    def search(
+        self,
+        embedding: List[float],
+        limit: int,
+        category: Optional[str] = None,
+        subcategory: Optional[str] = None,
+        framework: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        column: Optional[str] = None
+    ) -> Optional[List[CodeSnippet]]:
+        """
+        Exact top-`limit` snippets, closest first, or None to use pgvector.
+        `column` is the vector column matching the embedding's model.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or tags or (column and column != snapshot.column):
+            return None
+        if not snapshot.snippets or limit <= 0:
+            return []
+
+        rows = slice(None)
+        if category:
+            rows = snapshot.by_category.get(category)
+            if rows is None:
+                return []
+        if subcategory:
+            rows = self._narrow(rows, snapshot.subcategories, subcategory)
+        if framework:
+            rows = self._narrow(rows, snapshot.frameworks, framework)
+        if isinstance(rows, np.ndarray) and not len(rows):
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        if self.metric == "cosine":
+            norm = np.linalg.norm(query)
+            query = query / norm if norm else query
+        scores = snapshot.matrix[rows] @ query
+        if self.metric == "l2":
+            distances = snapshot.sq_norms[rows] - 2 * scores  # ||x - q||^2 minus the constant ||q||^2
+        else:
+            distances = -scores
+
+        k = min(limit, len(distances))
+        top = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(k)
+        top = top[np.argsort(distances[top], kind="stable")]
+        positions = np.arange(len(snapshot.snippets))[rows][top]
+        return [snapshot.snippets[i] for i in positions]
+
+    @staticmethod
+    def _narrow(rows, values: "np.ndarray", wanted: str) -> "np.ndarray":
+        """Row numbers within `rows` (a slice or an index array) whose value matches."""
+        if isinstance(rows, slice):
+            offset = rows.start or 0
+            return offset + np.flatnonzero(values[rows] == wanted)
+        return rows[values[rows] == wanted]
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Error refreshing snippet index: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, object]:
+        snapshot = self._snapshot
+        return {
+            "enabled": self.enabled,
+            "loaded": snapshot is not None,
+            "version": snapshot.version if snapshot else None,
+            "column": snapshot.column if snapshot else None,
+            "snippets": self.size,
+            "matrix_bytes": int(snapshot.matrix.nbytes) if snapshot else 0,
+        }
+
+snippet_index = SnippetIndex(
+    max_rows=settings.SNIPPET_INDEX_MAX_ROWS,
+    refresh_interval=settings.SNIPPET_INDEX_REFRESH_SECONDS
+)
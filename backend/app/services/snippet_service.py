@@ -1,10 +1,31 @@
+import re
+from functools import reduce
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update, delete, bindparam, literal_column
+from sqlalchemy.dialects.postgresql import insert
 from app.models.models import CodeSnippet
+from app.core.config import settings
+from app.core.telemetry import span
+from app.core.vector_index import apply_search_params, exact_scan, nearest_subquery, rerank_candidates
+from app.services.embedding_registry import EmbeddingState, embedding_registry
+from app.services.snippet_index import snippet_index, bump_version
+from app.services.usage_tracker import usage_tracker
 from app.services.llm_service import llm_service
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+SEARCH_MODES = ("hybrid", "vector", "lexical")
+
+_TERM_RE = re.compile(r"[\w@][\w.@/-]*")
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_$@][\w$@./-]*")
+_IDENTIFIER_MARK_RE = re.compile(r"[a-z][A-Z]|[_./-]")
+_MAX_QUERY_TERMS = 16
 
 class SnippetService:
+    @staticmethod
+    def build_embedding_text(name: str, description: str, code: str) -> str:
+        """Text that represents a snippet in embedding space."""
+        return f"{name}\n{description}\n{code}"
+
     @staticmethod
     async def ingest_snippet(
         session: AsyncSession,
@@ -20,8 +41,9 @@ class SnippetService:
         Ingest a code snippet with embedding generation.
         """
         # Generate embedding from code + description
-        embedding_text = f"{name}\n{description}\n{code}"
-        embedding = await llm_service.get_embedding(embedding_text)
+        state = embedding_registry.state("snippets")
+        embedding_text = SnippetService.build_embedding_text(name, description, code)
+        embedding = await llm_service.get_embedding(embedding_text, model=state.model)
         
         if not embedding:
             raise ValueError("Failed to generate embedding")
@@ -34,50 +56,311 @@ class SnippetService:
             description=description,
             tags=tags or [],
             framework=framework,
-            vector=embedding,
+            **{state.column: embedding},
             quality_score=0.5  # Default, can be updated based on usage
         )
         
         session.add(snippet)
+        await bump_version(session)
         await session.commit()
         await session.refresh(snippet)
         return snippet
-    
+
+    @staticmethod
+    async def upsert_snippets(session: AsyncSession, rows: List[Dict[str, Any]],
+                              state: Optional[EmbeddingState] = None) -> List[int]:
+        """
+        Insert or update many pre-embedded snippets with a single
+        INSERT ... ON CONFLICT (source_path) DO UPDATE ... RETURNING and one
+        commit. Each row must already carry its `vector`, embedded with
+        `state.model` (default: the collection's current state).
+        """
+        if not rows:
+            return []
+        state = state or embedding_registry.state("snippets")
+
+        values = [
+            {
+                "name": row["name"],
+                "category": row["category"],
+                "subcategory": row["subcategory"],
+                "code": row["code"],
+                "description": row["description"],
+                "tags": row.get("tags") or [],
+                "framework": row.get("framework", "nextjs"),
+                state.column: row["vector"],
+                "quality_score": row.get("quality_score", 0.5),
+                "source_path": row.get("source_path"),
+                "content_hash": row.get("content_hash"),
+                "source_mtime": row.get("source_mtime"),
+            }
+            for row in rows
+        ]
+        stmt = insert(CodeSnippet).values(values)
+        # Changed files are updated in place; usage stats and quality survive
+        updatable = ["name", "category", "subcategory", "code", "description", "tags",
+                     "framework", state.column, "content_hash", "source_mtime"]
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CodeSnippet.source_path],
+            set_={**{col: stmt.excluded[col] for col in updatable}, "updated_at": func.now()}
+        ).returning(CodeSnippet.id)
+        result = await session.execute(stmt)
+        ids = list(result.scalars().all())
+        await bump_version(session)
+        await session.commit()
+        return ids
+
+    @staticmethod
+    async def load_manifest(session: AsyncSession) -> Dict[str, Tuple[Optional[str], Optional[float]]]:
+        """
+        Map source_path -> (content_hash, source_mtime) for file-based snippets.
+        """
+        stmt = select(
+            CodeSnippet.source_path, CodeSnippet.content_hash, CodeSnippet.source_mtime
+        ).where(CodeSnippet.source_path.is_not(None))
+        result = await session.execute(stmt)
+        return {path: (content_hash, mtime) for path, content_hash, mtime in result.all()}
+
+    @staticmethod
+    async def touch_snippets(session: AsyncSession, mtimes: Dict[str, float]):
+        """
+        Record new mtimes for files whose content did not change.
+        """
+        if not mtimes:
+            return
+        # Core-level executemany: one prepared UPDATE, many parameter sets
+        table = CodeSnippet.__table__
+        stmt = (
+            update(table)
+            .where(table.c.source_path == bindparam("path"))
+            # Content is unchanged, so keep updated_at as-is
+            .values(source_mtime=bindparam("mtime"), updated_at=table.c.updated_at)
+        )
+        await session.execute(stmt, [{"path": path, "mtime": mtime} for path, mtime in mtimes.items()])
+        await session.commit()
+
+    @staticmethod
+    async def delete_missing_sources(session: AsyncSession, present: Set[str]) -> int:
+        """
+        Delete file-based snippets whose source file no longer exists.
+        """
+        manifest = await SnippetService.load_manifest(session)
+        missing = [path for path in manifest if path not in present]
+        if not missing:
+            return 0
+        await session.execute(delete(CodeSnippet).where(CodeSnippet.source_path.in_(missing)))
+        await bump_version(session)
+        await session.commit()
+        return len(missing)
+
+    @staticmethod
+    def build_filters(
+        category: Optional[str] = None,
+        subcategory: Optional[str] = None,
+        framework: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> list:
+        """
+        WHERE clauses for filtered search. Categories with a partial ANN index
+        are rendered as literals so the planner can match the index predicate.
+        """
+        filters = []
+        if category:
+            if category in settings.VECTOR_PARTIAL_INDEX_CATEGORIES:
+                filters.append(CodeSnippet.category == bindparam("category", category, literal_execute=True))
+            else:
+                filters.append(CodeSnippet.category == category)
+        if subcategory:
+            filters.append(CodeSnippet.subcategory == subcategory)
+        if framework:
+            filters.append(CodeSnippet.framework == framework)
+        if tags:
+            filters.append(CodeSnippet.tags.contains(tags))  # jsonb @>, GIN-indexed
+        return filters
+
+    @staticmethod
+    def effective_mode(query: str, mode: Optional[str] = None) -> str:
+        """The search mode `query` will run with ("lexical" when hybrid can skip the embedder)."""
+        mode = mode or settings.SNIPPET_SEARCH_MODE
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown snippet search mode '{mode}', expected one of {SEARCH_MODES}")
+        if mode == "hybrid" and (SnippetService.is_identifier(query) or not llm_service.embeddings_available):
+            return "lexical"
+        return mode
+
     @staticmethod
     async def search_snippets(
         session: AsyncSession,
         query: str,
         category: Optional[str] = None,
-        limit: int = 5
+        limit: int = 5,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        subcategory: Optional[str] = None,
+        framework: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        mode: Optional[str] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[CodeSnippet]:
         """
-        Semantic search for code snippets.
+        Search for code snippets.
+        `mode` (default SNIPPET_SEARCH_MODE): "vector" ranks by embedding
+        distance, "lexical" by full-text rank, "hybrid" fuses both rankings
+        with reciprocal rank fusion. Hybrid searches for identifier-like
+        queries ("framer-motion", "HeroSection"), and any search while the
+        embedder is down or failing, run lexical-only with no embedding call.
+        `query_embedding` (from the snippets collection's model) skips the
+        embedding call, so callers can embed before opening a session.
         """
-        # Generate query embedding
-        query_embedding = await llm_service.get_embedding(query)
-        if not query_embedding:
-            return []
-        
-        # Build query
-        stmt = select(CodeSnippet).order_by(
-            CodeSnippet.vector.l2_distance(query_embedding)
-        )
-        
-        # Filter by category if provided
-        if category:
-            stmt = stmt.where(CodeSnippet.category == category)
-        
-        stmt = stmt.limit(limit)
-        
-        result = await session.execute(stmt)
-        snippets = result.scalars().all()
+        mode = SnippetService.effective_mode(query, mode)
+        filters = SnippetService.build_filters(category, subcategory, framework, tags)
+
+        state = embedding_registry.state("snippets")
+        if mode != "lexical" and not query_embedding:
+            # Generate query embedding
+            with span("snippets.embed_query"):
+                query_embedding = await llm_service.get_embedding(query, model=state.model)
+            if not query_embedding:
+                mode = "lexical"
+
+        if mode == "lexical":
+            snippets = await SnippetService.lexical_search(session, query, filters, limit)
+        elif mode == "vector":
+            snippets = await SnippetService._vector_search(
+                session, query_embedding, limit, category, subcategory, framework, tags, filters, ef_search, probes, state
+            )
+        else:
+            candidates = max(limit, settings.SNIPPET_HYBRID_CANDIDATES)
+            by_vector = await SnippetService._vector_search(
+                session, query_embedding, candidates, category, subcategory, framework, tags, filters, ef_search, probes, state
+            )
+            by_text = await SnippetService.lexical_search(session, query, filters, candidates)
+            snippets = SnippetService.fuse_rankings([by_vector, by_text], limit)
         
-        # Update usage count
-        for snippet in snippets:
-            snippet.usage_count += 1
-        await session.commit()
+        # Usage counts are buffered and flushed in bulk off the hot path
+        usage_tracker.record(snippet.id for snippet in snippets)
         
         return snippets
+
+    @staticmethod
+    async def _vector_search(
+        session: AsyncSession,
+        query_embedding: List[float],
+        limit: int,
+        category: Optional[str],
+        subcategory: Optional[str],
+        framework: Optional[str],
+        tags: Optional[List[str]],
+        filters: list,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        state: Optional[EmbeddingState] = None
+    ) -> List[CodeSnippet]:
+        """
+        Nearest snippets by embedding distance. `query_embedding` must come
+        from `state.model` (default: the collection's current state).
+        `ef_search` (HNSW) / `probes` (IVFFlat) trade recall for latency.
+
+        Served from the in-process snippet index when it is loaded (exact,
+        no DB round trip). Otherwise filtered searches use iterative index
+        scans, and fall back to an exact scan over the matching rows if the
+        index still returns fewer than `limit` rows, so `limit` results are
+        returned whenever they exist. With VECTOR_QUANTIZATION set, the index
+        pass is coarse and its candidates are re-ranked at full precision.
+        """
+        state = state or embedding_registry.state("snippets")
+        with span("snippets.index_search", limit=limit):
+            snippets = snippet_index.search(
+                query_embedding, limit, category, subcategory, framework, tags, column=state.column
+            )
+        if snippets is not None:
+            return snippets
+
+        with span("snippets.vector_search", limit=limit, filtered=bool(filters)):
+            await apply_search_params(
+                session, ef_search=ef_search, probes=probes, filtered=bool(filters),
+                candidates=rerank_candidates(limit)
+            )
+            snippets = await SnippetService._nearest(session, query_embedding, filters, limit, state)
+        if filters and len(snippets) < limit:
+            with span("snippets.exact_search", limit=limit):
+                async with exact_scan(session):
+                    snippets = await SnippetService._nearest(session, query_embedding, filters, limit, state, exact=True)
+        return snippets
+
+    @staticmethod
+    def is_identifier(query: str) -> bool:
+        """A single camelCase, snake_case, kebab-case, dotted or scoped name."""
+        query = query.strip()
+        return bool(_IDENTIFIER_RE.fullmatch(query)) and bool(_IDENTIFIER_MARK_RE.search(query))
+
+    @staticmethod
+    def build_tsquery(query: str):
+        """
+        OR of the query's terms, each parsed with websearch_to_tsquery (so no
+        user input reaches tsquery syntax). Stop words drop out; documents
+        matching more terms rank higher. None if the query has no terms.
+        """
+        terms = [t.strip(".-") for t in _TERM_RE.findall(query.lower())]
+        terms = list(dict.fromkeys(t for t in terms if t))[:_MAX_QUERY_TERMS]
+        if not terms:
+            return None
+        config = literal_column(f"'{settings.SNIPPET_TEXT_SEARCH_CONFIG}'::regconfig")
+        return reduce(
+            lambda left, right: left.op("||")(right),
+            (func.websearch_to_tsquery(config, term) for term in terms)
+        )
+
+    @staticmethod
+    async def lexical_search(session: AsyncSession, query: str, filters: list, limit: int) -> List[CodeSnippet]:
+        """
+        Full-text search on the generated, GIN-indexed search_vector: ranked
+        by ts_rank_cd (cover density, weights name/tags > description >
+        code), with an exact name match first.
+        """
+        tsquery = SnippetService.build_tsquery(query)
+        if tsquery is None:
+            return []
+        with span("snippets.lexical_search", limit=limit):
+            q = select(tsquery.label("q")).subquery()
+            rank = func.ts_rank_cd(CodeSnippet.search_vector, q.c.q, 32)
+            stmt = (
+                select(CodeSnippet)
+                .join(q, CodeSnippet.search_vector.op("@@")(q.c.q))
+                .where(*filters)
+                .order_by((func.lower(CodeSnippet.name) == query.strip().lower()).desc(), rank.desc(), CodeSnippet.id)
+                .limit(limit)
+            )
+            result = await session.execute(stmt)
+            return list(result.scalars().all())
+
+    @staticmethod
+    def fuse_rankings(rankings: List[List[CodeSnippet]], limit: int, k: Optional[int] = None) -> List[CodeSnippet]:
+        """
+        Reciprocal rank fusion: score = sum over rankings of 1 / (k + rank).
+        Ties keep the order in which snippets were first seen.
+        """
+        k = settings.SNIPPET_RRF_K if k is None else k
+        scores: Dict[int, float] = {}
+        by_id: Dict[int, CodeSnippet] = {}
+        for ranking in rankings:
+            for rank, snippet in enumerate(ranking, start=1):
+                scores[snippet.id] = scores.get(snippet.id, 0.0) + 1.0 / (k + rank)
+                by_id.setdefault(snippet.id, snippet)
+        ordered = sorted(scores, key=lambda snippet_id: -scores[snippet_id])
+        return [by_id[snippet_id] for snippet_id in ordered[:limit]]
+
+    @staticmethod
+    async def _nearest(session: AsyncSession, query_embedding: List[float], filters: list, limit: int,
+                       state: EmbeddingState, exact: bool = False) -> List[CodeSnippet]:
+        # Iterative scans may return rows slightly out of order (relaxed_order),
+        # so take the top `limit` first, then re-sort by exact distance.
+        nearest = nearest_subquery(
+            CodeSnippet.id, state.vector(CodeSnippet), query_embedding, limit, filters, exact=exact, dim=state.dim
+        )
+        stmt = select(CodeSnippet).join(nearest, CodeSnippet.id == nearest.c.id).order_by(nearest.c.distance)
+        result = await session.execute(stmt)
+        return list(result.scalars().all())
     
     @staticmethod
     async def get_by_category(
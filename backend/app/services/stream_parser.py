@@ -0,0 +1,94 @@
+import json
+from typing import Any, Dict, List
+from app.services.output_parser import parse_object
+
+
+class JSONArrayStreamParser:
+    """
+    Incremental parser for a streamed JSON array of objects.
+
+    Feed it text chunks as they arrive; each call returns the top-level
+    objects that became complete in that chunk, e.g. one
+    `{"filename": ..., "content": ...}` per file. Anything before the opening
+    `[` (markdown fences, chatter) is skipped; a `[` only opens the array when
+    the next non-space character is `{`, so brackets in a preamble like
+    "Sure [2 files]:" or "returns [] when empty:" are ignored. An empty
+    array therefore never ends the stream early; if nothing follows it,
+    the stream simply yields no objects. Every character is scanned
+    once, and the buffer is trimmed after each emitted object.
+    """
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0  # next character to scan
+        self._depth = 0  # 1 = inside the top-level array
+        self._in_string = False
+        self._escaped = False
+        self._object_start = -1
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        """True once the closing `]` of the top-level array has been seen."""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        if self._done:
+            return []
+        self._buffer += chunk
+        objects = []
+        buffer = self._buffer
+        i = self._pos
+
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                if char == "[":
+                    j = i + 1
+                    while j < len(buffer) and buffer[j].isspace():
+                        j += 1
+                    if j == len(buffer):
+                        break  # decide once the next chunk arrives
+                    if buffer[j] == "{":
+                        self._depth = 1
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 1 and char == "{":
+                    self._object_start = i
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and char == "}" and self._object_start >= 0:
+                    objects.extend(self._decode(buffer[self._object_start:i + 1]))
+                    self._object_start = -1
+                elif self._depth == 0:
+                    self._done = True
+                    i += 1
+                    break
+            i += 1
+
+        # Drop everything that can no longer be part of a pending object
+        keep_from = self._object_start if self._object_start >= 0 else i
+        self._buffer = buffer[keep_from:]
+        self._pos = i - keep_from
+        if self._object_start >= 0:
+            self._object_start = 0
+        return objects
+
+    @staticmethod
+    def _decode(text: str) -> List[Dict[str, Any]]:
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as e:
+            value = parse_object(text)
+            if value is None:
+                print(f"Skipping malformed streamed object: {e}")
+                return []
+        return [value] if isinstance(value, dict) else []
@@ -0,0 +1,89 @@
+import asyncio
+from collections import Counter
+from typing import Iterable, Optional, Set
+from sqlalchemy import Integer, column, update, values
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.telemetry import span
+from app.models.models import CodeSnippet
+
+
+class UsageTracker:
+    """
+    Write-behind aggregator for CodeSnippet.usage_count.
+
+    Searches only bump an in-memory counter. A background task flushes the
+    accumulated increments every `flush_interval` seconds (or sooner once
+    `max_pending` distinct snippets are waiting) with a single
+    UPDATE ... FROM (VALUES ...) statement. `stop()` flushes what is left,
+    so increments survive a clean shutdown.
+    """
+    def __init__(self, flush_interval: float = 10.0, max_pending: int = 1000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Counter = Counter()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._early_flushes: Set[asyncio.Task] = set()
+
+    def record(self, snippet_ids: Iterable[int]):
+        """Count one use of each snippet. Never blocks or touches the DB."""
+        self._pending.update(snippet_ids)
+        if len(self._pending) >= self.max_pending and not self._early_flushes:
+            task = asyncio.get_running_loop().create_task(self.flush())
+            self._early_flushes.add(task)
+            task.add_done_callback(self._early_flushes.discard)
+
+    async def flush(self) -> int:
+        """Write buffered increments. Returns the number of snippets updated."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, Counter()
+
+            table = CodeSnippet.__table__
+            increments = values(
+                column("id", Integer), column("n", Integer), name="increments"
+            ).data(list(pending.items()))
+            stmt = (
+                update(table)
+                .where(table.c.id == increments.c.id)
+                # Usage is not a content change, so keep updated_at as-is
+                .values(usage_count=table.c.usage_count + increments.c.n, updated_at=table.c.updated_at)
+            )
+            try:
+                with span("usage.flush", snippets=len(pending)):
+                    async with AsyncSessionLocal() as session:
+                        await session.execute(stmt)
+                        await session.commit()
+            except Exception as e:
+                print(f"Error flushing usage counts: {e}")
+                # Put the increments back so the next flush retries them
+                self._pending.update(pending)
+                return 0
+            return len(pending)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Shielded so stop() can't cancel a write halfway through
+            await asyncio.shield(self.flush())
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+usage_tracker = UsageTracker(
+    flush_interval=settings.USAGE_FLUSH_INTERVAL_SECONDS,
+    max_pending=settings.USAGE_FLUSH_MAX_PENDING
+)
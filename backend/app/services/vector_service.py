@@ -1,45 +1,167 @@
+import os
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.models.models import CodeContext
+from sqlalchemy import delete, exists, func, select, union_all
+from typing import List, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.models.models import CodeContext, CodeContextChunk
+from app.core.telemetry import span
+from app.core.vector_index import apply_search_params, mean_vector, nearest_subquery, rerank_candidates
+from app.services.chunker import Chunk, chunk_file
+from app.services.embedding_registry import embedding_registry
 from app.services.llm_service import llm_service
 
 class VectorService:
+    @staticmethod
+    def file_type(metadata: Optional[dict]) -> Optional[str]:
+        """File type for the chunker: metadata "file_type", else the source path's extension."""
+        metadata = metadata or {}
+        if metadata.get("file_type"):
+            return metadata["file_type"]
+        path = metadata.get("source_path") or metadata.get("filename") or ""
+        return os.path.splitext(path)[1].lstrip(".").lower() or None
+
+    @staticmethod
+    def chunk(content: str, metadata: Optional[dict] = None) -> List[Chunk]:
+        return chunk_file(
+            content,
+            VectorService.file_type(metadata),
+            max_lines=settings.CONTEXT_CHUNK_MAX_LINES,
+            overlap_lines=settings.CONTEXT_CHUNK_OVERLAP_LINES,
+            max_chars=settings.CONTEXT_CHUNK_MAX_CHARS
+        )
+
     @staticmethod
     async def ingest_code(session: AsyncSession, content: str, metadata: dict = None):
         """
-        Ingest code content, create embedding, and save to DB.
+        Ingest code content: chunk it, embed each chunk, and save the
+        document with its chunks to DB.
         """
-        embedding = await llm_service.get_embedding(content)
-        if not embedding:
+        docs = await VectorService.ingest_chunked(session, [(content, metadata, VectorService.chunk(content, metadata))])
+        if not docs:
             return None
-
-        # Chunking strategy could be added here (omitted for brevity)
-        
-        doc = CodeContext(
-            content=content,
-            metadata_=metadata or {},
-            vector=embedding
-        )
-        session.add(doc)
         await session.commit()
-        return doc
+        return docs[0]
 
     @staticmethod
-    async def search_similar(session: AsyncSession, query: str, limit: int = 5):
+    async def ingest_chunked(
+        session: AsyncSession,
+        documents: Sequence[Tuple[str, Optional[dict], List[Chunk]]]
+    ) -> List[CodeContext]:
         """
-        Search for similar code snippets using cosine similarity.
+        Add already-chunked (content, metadata, chunks) documents in one
+        embedding call and one flush; the caller commits. A document's own
+        vector is the mean of its chunk vectors. Documents none of whose
+        chunks could be embedded are skipped.
         """
-        query_embedding = await llm_service.get_embedding(query)
+        texts = [c.content for _, _, chunks in documents for c in chunks]
+        if not texts:
+            return []
+        state = embedding_registry.state("context")
+        with span("vector.embed_chunks", chunks=len(texts)):
+            vectors = await llm_service.get_embeddings(texts, model=state.model)
+
+        docs: List[CodeContext] = []
+        doc_chunks: List[List[CodeContextChunk]] = []
+        offset = 0
+        for content, metadata, chunks in documents:
+            embedded = [(c, v) for c, v in zip(chunks, vectors[offset:offset + len(chunks)]) if v]
+            offset += len(chunks)
+            doc_vector = mean_vector([v for _, v in embedded])
+            if doc_vector is None:
+                continue
+            docs.append(CodeContext(content=content, metadata_=metadata or {}, **{state.column: doc_vector}))
+            doc_chunks.append([
+                CodeContextChunk(
+                    chunk_index=c.index,
+                    symbol=c.symbol,
+                    start_line=c.start_line,
+                    end_line=c.end_line,
+                    content=c.content,
+                    content_hash=c.content_hash,
+                    **{state.column: v}
+                )
+                for c, v in embedded
+            ])
+
+        session.add_all(docs)
+        await session.flush()
+        for doc, rows in zip(docs, doc_chunks):
+            for row in rows:
+                row.context_id = doc.id
+            session.add_all(rows)
+        await session.flush()
+        return docs
+
+    @staticmethod
+    async def delete_documents(session: AsyncSession, ids: Sequence[int]):
+        """Delete documents and their chunks; the caller commits."""
+        if not ids:
+            return
+        await session.execute(delete(CodeContextChunk).where(CodeContextChunk.context_id.in_(ids)))
+        await session.execute(delete(CodeContext).where(CodeContext.id.in_(ids)))
+
+    @staticmethod
+    async def search_similar(
+        session: AsyncSession,
+        query: str,
+        limit: int = 5,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
+    ):
+        """
+        Search for similar code using the configured metric
+        (settings.VECTOR_METRIC), served by the ANN indexes. With
+        VECTOR_QUANTIZATION set, quantized-index candidates are re-ranked
+        on the full-precision vectors.
+
+        Documents are scored by their closest chunk (max-sim): the nearest
+        limit * CONTEXT_CHUNK_CANDIDATES chunks are grouped by parent, along
+        with the nearest document-level vectors so rows ingested before
+        chunking (which have no chunks) are still found. A chunked
+        document's vector is the mean of its normalized chunks, which is only
+        comparable with chunk distances under cosine; with l2 or
+        inner_product, only unchunked documents compete on their own vector.
+        """
+        state = embedding_registry.state("context")
+        with span("vector.embed_query"):
+            query_embedding = await llm_service.get_embedding(query, model=state.model)
         if not query_embedding:
             return []
 
-        # pgvector l2_distance or cosine_distance
-        # Note: syntax depends on pgvector version, usually .l2_distance(vector)
-        stmt = select(CodeContext).order_by(
-            CodeContext.vector.l2_distance(query_embedding)
-        ).limit(limit)
+        with span("vector.search", limit=limit):
+            candidates = limit * max(1, settings.CONTEXT_CHUNK_CANDIDATES)
+            await apply_search_params(
+                session, ef_search=ef_search, probes=probes, candidates=rerank_candidates(candidates)
+            )
+
+            # 1. Nearest chunks, mapped to their parent document
+            chunk_hits = nearest_subquery(
+                CodeContextChunk.id, state.vector(CodeContextChunk), query_embedding, candidates, dim=state.dim
+            )
+            chunk_parents = (
+                select(CodeContextChunk.context_id.label("id"), chunk_hits.c.distance)
+                .join(chunk_hits, CodeContextChunk.id == chunk_hits.c.id)
+            )
+            # 2. Nearest whole documents
+            doc_filters = []
+            if settings.VECTOR_METRIC != "cosine":
+                doc_filters.append(~exists().where(CodeContextChunk.context_id == CodeContext.id))
+            doc_hits = nearest_subquery(
+                CodeContext.id, state.vector(CodeContext), query_embedding, limit, filters=doc_filters, dim=state.dim
+            )
+            hits = union_all(chunk_parents, select(doc_hits.c.id, doc_hits.c.distance)).subquery()
+
+            # 3. Best distance per document
+            best = (
+                select(hits.c.id, func.min(hits.c.distance).label("distance"))
+                .group_by(hits.c.id)
+                .order_by(func.min(hits.c.distance))
+                .limit(limit)
+                .subquery()
+            )
+            stmt = select(CodeContext).join(best, CodeContext.id == best.c.id).order_by(best.c.distance)
 
-        result = await session.execute(stmt)
-        return result.scalars().all()
+            result = await session.execute(stmt)
+            return result.scalars().all()
 
 vector_service = VectorService()